@@ -0,0 +1,447 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import cv2 as cv
+import numpy as np
+
+from facemesh_module import FaceMeshGenerator
+from microsleep_detector import MicrosleepDetector
+from utils.frame_pipeline import LatestFrameQueue
+from utils.http_client import PooledHttpClient
+from utils.inference_pool import FaceMeshProcessPool, PooledFaceMesh
+from utils.telemetry_sender import TelemetrySender
+
+
+def load_stream_config(path):
+    """
+    Load the stream list of a detection service.
+
+    The file is a JSON list with one object per camera:
+        {"source": 0 or "rtsp://...", "driver_name": "...", "armada": "...", "rute": "...",
+         "sensitivity": 0.8}
+    Only "source" is required.
+
+    Args:
+        path (str): JSON file
+
+    Returns:
+        list: Stream configuration dictionaries
+    """
+    with open(path, encoding='utf-8') as f:
+        streams = json.load(f)
+    if not isinstance(streams, list) or not all(isinstance(s, dict) and "source" in s for s in streams):
+        raise ValueError(f"{path} must contain a list of objects with a \"source\" field")
+    return streams
+
+
+class CameraStream:
+    """
+    One monitored camera and its driver.
+
+    Owns the capture device, a single-slot latest-frame queue and a headless
+    MicrosleepDetector holding the per-driver EAR smoothing, calibration,
+    classifier and alert state. Face mesh inference for the stream runs on the
+    service's shared workers.
+    """
+
+    def __init__(self, stream_id, source, detector):
+        """
+        Initialize the stream.
+
+        Args:
+            stream_id (str): Name used in logs and statistics
+            source (int or str): Camera index, video file or stream URL
+            detector (MicrosleepDetector): Headless detector holding the stream's state
+        """
+        self.stream_id = stream_id
+        self.source = source
+        self.detector = detector
+
+        self.cap = None
+        self.frames = LatestFrameQueue(maxsize=1)
+        self.thread = None
+        self.error = None
+
+        # Scheduling state, guarded by the service's condition
+        self.busy = False
+        self.last_served = 0.0
+
+        # Counters and recent timings in seconds
+        self.captured = 0
+        self.processed = 0
+        self.faces = 0
+        self.latencies = deque(maxlen=300)  # Capture to state update
+        self.queue_waits = deque(maxlen=300)  # Capture to dispatch on a worker
+        self.inference_times = deque(maxlen=300)  # Face mesh and EAR on the worker
+        self.processed_times = deque(maxlen=120)  # Completion times for the processing rate
+
+    def open(self):
+        """Open the capture device and pick up its frame rate."""
+        self.cap = cv.VideoCapture(self.source)
+        if not self.cap.isOpened():
+            raise IOError(f"Failed to open stream {self.stream_id} ({self.source})")
+
+        fps = self.cap.get(cv.CAP_PROP_FPS)
+        self.detector.set_fps(fps if fps and fps > 0 else 30)
+
+    @property
+    def is_file(self):
+        """bool: True for a recorded video, which is paced to its frame rate."""
+        return isinstance(self.source, str) and os.path.isfile(self.source)
+
+    def statistics(self):
+        """
+        Get the stream's counters and latency percentiles.
+
+        Returns:
+            dict: Frame counts, detection counts, alert state, processing rate and latencies
+        """
+        detector = self.detector
+        state_names = {v: k for k, v in MicrosleepDetector.ALERT_STATES.items()}
+
+        def percentiles(values):
+            if not values:
+                return None, None
+            p50, p95 = np.percentile(np.fromiter(values, dtype=np.float64), [50, 95])
+            return round(p50 * 1000, 2), round(p95 * 1000, 2)
+
+        latency_p50, latency_p95 = percentiles(list(self.latencies))
+        wait_p50, wait_p95 = percentiles(list(self.queue_waits))
+        inference_p50, inference_p95 = percentiles(list(self.inference_times))
+
+        times = list(self.processed_times)
+        fps = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+
+        return {
+            "source": str(self.source),
+            "driver_name": detector.driver_name,
+            "armada": detector.armada,
+            "captured": self.captured,
+            "processed": self.processed,
+            "dropped": self.frames.dropped,
+            "faces": self.faces,
+            "blinks": detector.blink_counter,
+            "microsleeps": detector.microsleep_counter,
+            "state": state_names[detector.alert_state],
+            "fps": round(fps, 1),
+            "latency_p50_ms": latency_p50,
+            "latency_p95_ms": latency_p95,
+            "queue_wait_p50_ms": wait_p50,
+            "queue_wait_p95_ms": wait_p95,
+            "inference_p50_ms": inference_p50,
+            "inference_p95_ms": inference_p95,
+            "error": self.error,
+        }
+
+
+class DetectionService:
+    """
+    Monitor many camera streams from one process.
+
+    Every stream has its own capture thread and detector state, while face
+    mesh inference runs on a fixed pool of worker threads that each own one
+    MediaPipe graph. Workers always serve the idle stream with a pending frame
+    that was served longest ago, so a busy or high-fps stream cannot starve the
+    others, and a stream is never processed by two workers at once, so its
+    frames reach the state machine in order. Each stream keeps only its newest
+    frame; a stream the pool cannot keep up with drops frames instead of
+    building up latency, and the drops and latencies are reported per stream.
+
+    Workers run the face mesh in static image mode: one graph serves frames of
+    different drivers, so tracking state from a previous frame would belong to
+    another face.
+
+    With the "processes" backend the graphs run in a FaceMeshProcessPool instead,
+    so inference scales past the GIL; each worker thread then hands its frame to
+    the pool through shared memory and runs only EAR and the state machine.
+    """
+
+    BACKENDS = ("threads", "processes")
+
+    # Detector options that configure the detector's own face mesh; the service runs face
+    # mesh on the worker graphs, so these would reconfigure one graph shared by every stream
+    GENERATOR_OPTIONS = ("landmark_trace", "adaptive_rate", "roi_tracking")
+
+    def __init__(self, streams, workers=None, server_url=None, backend="threads", **detector_kwargs):
+        """
+        Initialize the service.
+
+        Args:
+            streams (list): Stream configurations (see load_stream_config)
+            workers (int): Inference workers, default min(streams, CPU count)
+            server_url (str): Backend /vision endpoint shared by all streams, or None to disable uploads
+            backend (str): "threads" for one MediaPipe graph per worker thread, or "processes"
+                           for one per worker process
+            **detector_kwargs: MicrosleepDetector parameters applied to every stream
+                               (ear_threshold, consec_frames, microsleep_frames, sensitivity, ...);
+                               GENERATOR_OPTIONS are rejected
+        """
+        if not streams:
+            raise ValueError("At least one stream is required")
+
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}; expected one of {self.BACKENDS}")
+
+        unsupported = [key for key in self.GENERATOR_OPTIONS if detector_kwargs.get(key)]
+        if unsupported:
+            raise ValueError(f"Not supported by the detection service: {', '.join(unsupported)}")
+
+        worker_count = max(1, workers or min(len(streams), os.cpu_count() or 1))
+        self.pool = None
+        if backend == "processes":
+            self.pool = FaceMeshProcessPool(worker_count)
+            # Two threads per process, so a process gets its next frame while EAR runs on the last one
+            self.generators = [PooledFaceMesh(self.pool) for _ in range(2 * worker_count)]
+        else:
+            self.generators = [FaceMeshGenerator(mode=True) for _ in range(worker_count)]
+        self.worker_count = worker_count
+
+        # One sender and connection pool for every stream; the payload names the driver
+        self.http_client = None
+        self.telemetry = None
+        if server_url:
+            self.http_client = PooledHttpClient()
+            self.telemetry = TelemetrySender(server_url, self.http_client)
+
+        self.streams = []
+        for index, config in enumerate(streams):
+            kwargs = dict(detector_kwargs)
+            for key in ("driver_name", "armada", "rute", "sensitivity"):
+                if key in config:
+                    kwargs[key] = config[key]
+            # The detector never runs its generator here; sharing one avoids loading a graph per stream
+            detector = MicrosleepDetector(
+                headless=True, generator=self.generators[0], telemetry=self.telemetry, **kwargs
+            )
+            source = config["source"]
+            if isinstance(source, str) and source.isdigit():
+                source = int(source)
+            self.streams.append(CameraStream(config.get("id", f"stream-{index}"), source, detector))
+
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._workers = []
+        self.started = None
+
+    def start(self):
+        """Open every stream and start the capture threads and inference workers."""
+        if self.pool is not None:
+            self.pool.wait_ready()
+        for stream in self.streams:
+            stream.open()
+
+        self.started = time.time()
+        for stream in self.streams:
+            stream.thread = threading.Thread(
+                target=self._capture_loop, args=(stream,), name=f"capture-{stream.stream_id}", daemon=True
+            )
+            stream.thread.start()
+
+        for index, generator in enumerate(self.generators):
+            worker = threading.Thread(
+                target=self._worker_loop, args=(generator,), name=f"inference-{index}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def run(self, duration=None, report_interval=10.0, report_path=None):
+        """
+        Run until every stream has ended, the duration has passed or the process is interrupted.
+
+        Args:
+            duration (float): Seconds to run, or None to run until the streams end
+            report_interval (float): Seconds between statistics reports
+            report_path (str): JSON file rewritten with the statistics at every report, or None
+        """
+        self.start()
+        next_report = time.time() + report_interval
+        try:
+            while not self._stop_event.is_set():
+                if all(stream.frames.exhausted for stream in self.streams):
+                    break
+                if duration is not None and time.time() - self.started >= duration:
+                    break
+
+                time.sleep(0.2)
+                if time.time() >= next_report:
+                    next_report += report_interval
+                    self.report(report_path)
+        finally:
+            self.stop()
+            self.report(report_path)
+
+    def stop(self):
+        """Stop capture and inference and release every stream."""
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        for stream in self.streams:
+            stream.frames.close()
+
+        for worker in self._workers:
+            worker.join(timeout=2.0)
+        for stream in self.streams:
+            if stream.thread is not None:
+                stream.thread.join(timeout=2.0)
+            if stream.cap is not None:
+                stream.cap.release()
+            stream.detector.release_resources()
+        self._workers = []
+
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+        if self.telemetry is not None:
+            self.telemetry.close()
+            self.telemetry = None
+            self.http_client.close()
+
+    def statistics(self):
+        """
+        Get per-stream statistics and the totals.
+
+        Returns:
+            dict: "streams" mapped by stream id, plus service-wide totals
+        """
+        streams = {stream.stream_id: stream.statistics() for stream in self.streams}
+        uptime = time.time() - self.started if self.started else 0.0
+        processed = sum(stats["processed"] for stats in streams.values())
+        return {
+            "uptime_s": round(uptime, 1),
+            "workers": self.worker_count,
+            "processed": processed,
+            "dropped": sum(stats["dropped"] for stats in streams.values()),
+            "throughput_fps": round(processed / uptime, 1) if uptime > 0 else 0.0,
+            "streams": streams,
+        }
+
+    def report(self, path=None):
+        """
+        Print a statistics table and optionally write the statistics as JSON.
+
+        Args:
+            path (str): JSON file to rewrite atomically, or None
+        """
+        stats = self.statistics()
+        print(f"\n[{stats['uptime_s']:.0f}s] {stats['processed']} frames, {stats['dropped']} dropped, "
+              f"{stats['throughput_fps']} fps on {stats['workers']} workers")
+        print(f"{'stream':<14}{'driver':<16}{'state':<12}{'fps':>6}{'drop':>7}{'lat p50':>9}{'lat p95':>9}"
+              f"{'blinks':>8}{'micro':>7}")
+        for stream_id, s in stats["streams"].items():
+            latency_p50 = f"{s['latency_p50_ms']:.0f}" if s['latency_p50_ms'] is not None else "-"
+            latency_p95 = f"{s['latency_p95_ms']:.0f}" if s['latency_p95_ms'] is not None else "-"
+            print(f"{stream_id:<14}{str(s['driver_name'])[:15]:<16}{s['state']:<12}{s['fps']:>6}{s['dropped']:>7}"
+                  f"{latency_p50:>9}{latency_p95:>9}{s['blinks']:>8}{s['microsleeps']:>7}")
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(path + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump(stats, f, indent=2)
+            os.replace(path + ".tmp", path)
+
+    def _capture_loop(self, stream):
+        """Read a stream's frames into its latest-frame slot and wake a worker."""
+        fps = stream.detector.fps
+        pace = stream.is_file
+        start = time.time()
+        try:
+            while not self._stop_event.is_set() and stream.cap.isOpened():
+                ret, frame = stream.cap.read()
+                if not ret:
+                    break
+
+                capture_time = time.time()
+                stream.frames.put((stream.captured, capture_time, frame))
+                stream.captured += 1
+                with self._cond:
+                    self._cond.notify()
+
+                # Recorded videos are read at their own frame rate, like a live camera
+                if pace:
+                    delay = start + stream.captured / fps - time.time()
+                    if delay > 0:
+                        self._stop_event.wait(delay)
+        except Exception as e:
+            stream.error = str(e)
+            print(f"Error in {stream.stream_id} capture: {e}")
+        finally:
+            stream.frames.close()
+            with self._cond:
+                self._cond.notify_all()
+
+    def _next_job(self):
+        """
+        Wait for the next frame to process.
+
+        Returns:
+            tuple: (stream, (frame_index, capture_time, frame)), or None when the service stops
+        """
+        with self._cond:
+            while not self._stop_event.is_set():
+                # Least recently served idle stream first
+                for stream in sorted(self.streams, key=lambda s: s.last_served):
+                    if stream.busy:
+                        continue
+                    item = stream.frames.get(timeout=0)
+                    if item is not None:
+                        stream.busy = True
+                        stream.last_served = time.monotonic()
+                        return stream, item
+
+                if all(stream.frames.exhausted for stream in self.streams):
+                    return None
+                self._cond.wait(0.1)
+        return None
+
+    def _worker_loop(self, generator):
+        """Inference worker: process frames of whichever stream is due next."""
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+
+            stream, (frame_index, capture_time, frame) = job
+            try:
+                self._process(stream, generator, frame, capture_time)
+            except Exception as e:
+                stream.error = str(e)
+                print(f"Error in {stream.stream_id} inference: {e}")
+            finally:
+                with self._cond:
+                    stream.busy = False
+                    self._cond.notify()
+
+    def _process(self, stream, generator, frame, capture_time):
+        """
+        Run face mesh, EAR and the stream's state machine on one frame.
+
+        Args:
+            stream (CameraStream): Stream the frame belongs to
+            generator (FaceMeshGenerator or PooledFaceMesh): The worker's face mesh graph
+            frame (np.ndarray): Captured frame
+            capture_time (float): Capture time of the frame
+        """
+        detector = stream.detector
+        start = time.time()
+        stream.queue_waits.append(start - capture_time)
+
+        _, landmarks = generator.create_face_mesh(frame, draw=False, timestamp=capture_time)
+        ear = smoothed_ear = None
+        if landmarks:
+            _, _, ear, smoothed_ear = detector.eye_analyzer.calculate_ear(landmarks)
+        stream.inference_times.append(time.time() - start)
+
+        if ear is not None:
+            stream.faces += 1
+            detector.update_state(ear, smoothed_ear, timestamp=capture_time)
+
+        done = time.time()
+        stream.processed += 1
+        stream.latencies.append(done - capture_time)
+        stream.processed_times.append(done)
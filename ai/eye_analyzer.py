@@ -1,5 +1,8 @@
 import numpy as np
 
+from utils.landmarks import FaceLandmarks
+from utils.ring_buffer import RingBuffer
+
 class EyeAspectRatioAnalyzer:
     """
     A class to analyze eye aspect ratio (EAR) using facial landmarks
@@ -15,6 +18,9 @@ class EyeAspectRatioAnalyzer:
     # These correspond to the vertical and horizontal points used in the EAR formula
     RIGHT_EYE_EAR = [33, 159, 158, 133, 153, 145]  # Top, bottom, and side points
     LEFT_EYE_EAR = [362, 386, 385, 263, 374, 380]  # Top, bottom, and side points
+    
+    # Both EAR point sets as one (2, 6) index array: row 0 right eye, row 1 left eye
+    EAR_INDICES = np.array([RIGHT_EYE_EAR, LEFT_EYE_EAR])
 
     def __init__(self):
         """Initialize the EyeAspectRatioAnalyzer with enhanced detection parameters."""
@@ -26,7 +32,11 @@ class EyeAspectRatioAnalyzer:
         
         # Smoothing parameters for filtering noise
         self.smoothing_window = 3  # Number of frames to average for smoothing
-        self.ear_history = []  # Store recent EAR values for smoothing
+        self.ear_history = RingBuffer(self.smoothing_window)  # Store recent EAR values for smoothing
+        
+        # Rolling window of average EAR values for PERCLOS and closure runs (30 s at 30fps)
+        self.perclos_window = 900
+        self.closure_window = RingBuffer(self.perclos_window)
         
         # Enhanced detection parameters
         self.min_blink_frames = 2  # Minimum frames for a valid blink
@@ -37,82 +47,134 @@ class EyeAspectRatioAnalyzer:
         self.threshold_min = 0.15    # Minimum threshold to prevent detection issues
         self.threshold_max = 0.3     # Maximum threshold
 
-    def calculate_ear(self, landmarks):
+    def calculate_ear(self, landmarks, track=True):
         """
         Calculate the eye aspect ratio for both eyes and the average with improved accuracy.
         
         Args:
-            landmarks (dict): Dictionary of facial landmarks with coordinate values
+            landmarks (FaceLandmarks or dict): Facial landmarks with coordinate values
+            track (bool): Feed the average into smoothing and the closure window; callers
+                          that interpolate skipped frames pass False and call track_ear
+                          themselves in frame order
             
         Returns:
-            tuple: (right_ear, left_ear, average_ear, smoothed_ear)
+            tuple: (right_ear, left_ear, average_ear, smoothed_ear); smoothed_ear is
+                   None when track is False
         """
-        # Check if we have all required landmarks
-        if not all(p in landmarks for p in self.RIGHT_EYE_EAR + self.LEFT_EYE_EAR):
-            return None, None, None, None
-            
-        # Calculate EAR for right eye
-        right_ear = self._calculate_single_ear(self.RIGHT_EYE_EAR, landmarks)
+        # Gather the (2, 6, 2) EAR points of both eyes
+        if isinstance(landmarks, FaceLandmarks):
+            if not landmarks.has_all(self.EAR_INDICES):
+                return None, None, None, None
+            eye_points = landmarks.gather(self.EAR_INDICES)
+        else:
+            if not all(p in landmarks for p in self.RIGHT_EYE_EAR + self.LEFT_EYE_EAR):
+                return None, None, None, None
+            eye_points = np.array([[landmarks[p] for p in eye] for eye in self.EAR_INDICES.tolist()])
         
-        # Calculate EAR for left eye
-        left_ear = self._calculate_single_ear(self.LEFT_EYE_EAR, landmarks)
+        # Calculate EAR for both eyes and the average with the batch numerics
+        right_ear, left_ear, avg_ear, _ = (float(v) for v in self._ears_from_eye_points(eye_points))
         
-        # Calculate average EAR
-        avg_ear = (right_ear + left_ear) / 2.0
+        smoothed_ear = self.track_ear(avg_ear) if track else None
         
-        # Apply smoothing to reduce noise
-        self.ear_history.append(avg_ear)
-        if len(self.ear_history) > self.smoothing_window:
-            self.ear_history.pop(0)
+        return right_ear, left_ear, avg_ear, smoothed_ear
+
+    def track_ear(self, avg_ear):
+        """
+        Feed one average EAR value into smoothing, the baseline and the closure window.
         
-        # Simple moving average smoothing
-        smoothed_ear = sum(self.ear_history) / len(self.ear_history)
+        calculate_ear calls this for every frame; replay of a precomputed EAR
+        trace (e.g. from calculate_ear_batch) calls it directly.
+        
+        Args:
+            avg_ear (float): Average EAR of both eyes for the frame
+            
+        Returns:
+            float: Smoothed EAR value
+        """
+        # Apply smoothing to reduce noise (simple moving average from the running sum)
+        self.ear_history.append(avg_ear)
+        smoothed_ear = self.ear_history.mean
         
         # Update baseline if needed
         self._update_baseline(smoothed_ear)
         
-        return right_ear, left_ear, avg_ear, smoothed_ear
+        # Track eye closure against the current adaptive threshold
+        self.closure_window.set_threshold(self.get_adaptive_threshold())
+        self.closure_window.append(avg_ear)
+        
+        return smoothed_ear
 
-    def _calculate_single_ear(self, eye_landmarks, landmarks):
+    def calculate_ear_batch(self, landmarks):
         """
-        Calculate EAR for a single eye with improved accuracy.
+        Calculate the eye aspect ratios of many frames in one vectorized pass.
+        
+        Intended for offline re-analysis of recorded sessions: whole clips, or
+        several drivers stacked along extra leading axes. Smoothing and the
+        adaptive baseline are not touched.
         
         Args:
-            eye_landmarks (list): Indices of landmarks for one eye
-            landmarks (dict): Dictionary of facial landmarks with coordinate values
+            landmarks (np.ndarray): (..., N, 2) landmark coordinates, e.g. (T, N, 2)
+                                    for a clip of T frames. Frames without a face
+                                    can be filled with NaN and yield NaN EARs.
             
         Returns:
-            float: Calculated eye aspect ratio
+            tuple: (right_ear, left_ear, average_ear, weighted_ear) arrays of shape (...).
+                   weighted_ear averages both eyes weighted by eye width, so the
+                   eye facing the camera dominates when the head is turned.
         """
-        # Get landmark coordinates
-        p1 = np.array(landmarks[eye_landmarks[0]])
-        p2 = np.array(landmarks[eye_landmarks[1]])
-        p3 = np.array(landmarks[eye_landmarks[2]])
-        p4 = np.array(landmarks[eye_landmarks[3]])
-        p5 = np.array(landmarks[eye_landmarks[4]])
-        p6 = np.array(landmarks[eye_landmarks[5]])
+        landmarks = np.asarray(landmarks)
+        if landmarks.ndim < 2 or landmarks.shape[-1] != 2:
+            raise ValueError(f"Expected landmarks with shape (..., N, 2), got {landmarks.shape}")
+        if landmarks.shape[-2] <= self.EAR_INDICES.max():
+            raise ValueError(f"Expected at least {self.EAR_INDICES.max() + 1} landmarks, got {landmarks.shape[-2]}")
         
-        # Calculate euclidean distances
-        A = np.linalg.norm(p2 - p6)  # Vertical distance 1
-        B = np.linalg.norm(p3 - p5)  # Vertical distance 2
-        C = np.linalg.norm(p1 - p4)  # Horizontal distance
+        # Gather the EAR points of both eyes: (..., 2, 6, 2)
+        eye_points = landmarks[..., self.EAR_INDICES, :]
         
-        # Avoid division by zero
-        if C == 0:
-            return 0.0
+        return self._ears_from_eye_points(eye_points)
+
+    def _ears_from_eye_points(self, eye_points):
+        """
+        Calculate EAR for each eye with improved accuracy, plus both averages.
+        
+        Args:
+            eye_points (np.ndarray): (..., 2, 6, 2) EAR landmark coordinates, right eye
+                                     first, each ordered p1..p6 as in RIGHT_EYE_EAR
+            
+        Returns:
+            tuple: (right_ear, left_ear, average_ear, weighted_ear) arrays of shape (...)
+        """
+        eye_points = eye_points.astype(np.float64, copy=False)
+        
+        # Calculate euclidean distances
+        A = np.linalg.norm(eye_points[..., 1, :] - eye_points[..., 5, :], axis=-1)  # Vertical distance 1
+        B = np.linalg.norm(eye_points[..., 2, :] - eye_points[..., 4, :], axis=-1)  # Vertical distance 2
+        C = np.linalg.norm(eye_points[..., 0, :] - eye_points[..., 3, :], axis=-1)  # Horizontal distance
         
         # Calculate EAR with additional weighting to improve sensitivity
         # We put slightly more emphasis on the smaller of the two vertical distances
         # to make the detection more sensitive to eye closure
-        min_vertical = min(A, B)
-        max_vertical = max(A, B)
+        min_vertical = np.minimum(A, B)
+        max_vertical = np.maximum(A, B)
         
         # Weighted EAR calculation gives more weight to the smaller distance
         # This makes it more sensitive to partial blinks
         weighted_vertical = (min_vertical * 0.6) + (max_vertical * 0.4)
-        ear = weighted_vertical / C
         
-        return ear
+        # Avoid division by zero: a degenerate eye width gives an EAR of 0
+        ears = np.zeros_like(C)
+        np.divide(weighted_vertical, C, out=ears, where=C != 0)
+        
+        right_ear = ears[..., 0]
+        left_ear = ears[..., 1]
+        avg_ear = (right_ear + left_ear) / 2.0
+        
+        # Width-weighted average: sum(ear * width) / sum(width)
+        total_width = C.sum(axis=-1)
+        weighted_ear = np.zeros_like(total_width)
+        np.divide((ears * C).sum(axis=-1), total_width, out=weighted_ear, where=total_width != 0)
+        
+        return right_ear, left_ear, avg_ear, weighted_ear
 
     def _update_baseline(self, ear):
         """
@@ -229,14 +291,15 @@ class EyeAspectRatioAnalyzer:
         
         return blink_indices
 
-    def calculate_perclos(self, ear_values, threshold=None, window_size=900):
+    def calculate_perclos(self, ear_values=None, threshold=None, window_size=900):
         """
         Calculate PERCLOS (PERcentage of eye CLOSure) with improved accuracy.
         
         Args:
-            ear_values (list): Sequence of EAR values
+            ear_values (list): Sequence of EAR values, or None to use the EAR values
+                               seen by calculate_ear (last perclos_window frames, O(1))
             threshold (float): Threshold for eye closure, or None to use adaptive threshold
-            window_size (int): Number of frames to consider
+            window_size (int): Number of frames to consider for an explicit sequence
             
         Returns:
             float: PERCLOS value (0-1 range)
@@ -244,48 +307,51 @@ class EyeAspectRatioAnalyzer:
         # Use adaptive threshold if available, otherwise use provided threshold
         if threshold is None:
             threshold = self.get_adaptive_threshold()
+        
+        if ear_values is None:
+            self.closure_window.set_threshold(threshold)
+            return self.closure_window.perclos
             
         # Use only the most recent frames if we have more than window_size
-        if len(ear_values) > window_size:
-            ear_values = ear_values[-window_size:]
+        ear_values = np.asarray(ear_values, dtype=np.float64)[-window_size:]
         
         # Count frames where eyes are below threshold
-        closed_frames = sum(1 for ear in ear_values if ear < threshold)
+        closed_frames = np.count_nonzero(ear_values < threshold)
         
         # Calculate percentage
-        perclos = closed_frames / len(ear_values) if ear_values else 0
+        perclos = closed_frames / len(ear_values) if len(ear_values) else 0
         
         return perclos
 
-    def is_microsleep_candidate(self, ear_values, threshold=None, min_frames=15):
+    def is_microsleep_candidate(self, ear_values=None, threshold=None, min_frames=15):
         """
         Determine if a sequence of EAR values indicates a potential microsleep.
         
         Args:
-            ear_values (list): Sequence of EAR values
+            ear_values (list): Sequence of EAR values, or None to use the EAR values
+                               seen by calculate_ear (last perclos_window frames, O(1))
             threshold (float): Threshold for eye closure, or None to use adaptive threshold
             min_frames (int): Minimum consecutive frames for microsleep
             
         Returns:
             bool: True if pattern indicates microsleep, False otherwise
         """
-        if not ear_values or len(ear_values) < min_frames:
-            return False
-            
         # Use adaptive threshold if available, otherwise use provided threshold
         if threshold is None:
             threshold = self.get_adaptive_threshold()
-            
-        # Count consecutive frames below threshold
-        max_consecutive = 0
-        current_consecutive = 0
         
-        for ear in ear_values:
-            if ear < threshold:
-                current_consecutive += 1
-                max_consecutive = max(max_consecutive, current_consecutive)
-            else:
-                current_consecutive = 0
+        if ear_values is None:
+            self.closure_window.set_threshold(threshold)
+            return self.closure_window.longest_run() >= min_frames
+        
+        if len(ear_values) < min_frames:
+            return False
+            
+        # Count consecutive frames below threshold: longest run between open frames
+        closed = np.asarray(ear_values, dtype=np.float64) < threshold
+        edges = np.diff(np.concatenate(([0], closed.view(np.int8), [0])))
+        run_lengths = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+        max_consecutive = run_lengths.max() if len(run_lengths) else 0
                 
         # Check if max consecutive frames exceeds minimum for microsleep
         return max_consecutive >= min_frames
\ No newline at end of file
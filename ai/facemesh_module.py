@@ -1,7 +1,11 @@
+import time
+
 import cv2 as cv
 import mediapipe as mp
 import numpy as np
 
+from utils.landmarks import FaceLandmarks
+
 class FaceMeshGenerator:
     """
     A class to detect and create face mesh landmarks using MediaPipe.
@@ -10,7 +14,8 @@ class FaceMeshGenerator:
     which are then used for eye aspect ratio calculations and microsleep detection.
     """
     
-    def __init__(self, mode=False, max_faces=1, min_detection_con=0.5, min_track_con=0.5):
+    def __init__(self, mode=False, max_faces=1, min_detection_con=0.5, min_track_con=0.5, trace_writer=None,
+                 input_scale=1.0, roi_tracking=False, roi_margin=0.25, roi_size=256):
         """
         Initialize the FaceMeshGenerator with specified parameters.
         
@@ -19,6 +24,15 @@ class FaceMeshGenerator:
             max_faces (int): Maximum number of faces to detect
             min_detection_con (float): Minimum detection confidence threshold
             min_track_con (float): Minimum tracking confidence threshold
+            trace_writer (LandmarkTraceWriter): Optional writer that persists the landmarks,
+                                                detection flag and timestamp of every frame
+            input_scale (float): Factor the frame is downscaled by before inference; landmarks
+                                 are still returned in full-frame pixel coordinates
+            roi_tracking (bool): Run inference only on the face region found in the previous
+                                 frame, falling back to the full frame when the face is lost
+            roi_margin (float): Margin added around the previous face on each side, as a
+                                fraction of the face size
+            roi_size (int): Side of the square the face region is scaled to before inference
         """
         self.mode = mode
         self.max_faces = max_faces
@@ -40,50 +54,223 @@ class FaceMeshGenerator:
         
         # Initialize results container
         self.results = None
+        
+        # Landmark buffers, allocated on the first detection and reused every frame
+        self._normalized = None
+        self._scaled = None
+        self._points = None
+        self._no_face = FaceLandmarks(np.empty((0, 2), dtype=np.int32))
+        
+        # Landmark trace for re-analysis without running face mesh again
+        self.trace_writer = trace_writer
+        
+        # Inference resolution, lowered by the adaptive rate controller on slow hardware
+        self.input_scale = input_scale
+        
+        # Face region tracking: (x0, y0, x1, y1) of the region the next frame is cropped to
+        self.roi_tracking = roi_tracking
+        self.roi_margin = roi_margin
+        self.roi_size = roi_size
+        self.roi = None
+        self.roi_frames = 0
+        self.full_frames = 0
+        self._roi_face_mesh = None
+        
+        # Resize and RGB conversion targets, reallocated only when the input size changes
+        self._buffers = {}
 
-    def create_face_mesh(self, frame, draw=True):
+    def create_face_mesh(self, frame, draw=True, timestamp=None, input_scale=None):
         """
         Process a frame and create face mesh landmarks.
         
         Args:
             frame (np.ndarray): Input video frame
             draw (bool): Whether to draw the landmarks on the frame
+            timestamp (float): Frame time recorded in the landmark trace, or None for the wall clock
+            input_scale (float): Downscale factor for this frame only, or None for the generator's input_scale
             
         Returns:
-            tuple: (processed_frame, landmarks_dict)
-                   landmarks_dict is a dictionary mapping landmark indices to (x,y) coordinates
+            tuple: (processed_frame, landmarks)
+                   processed_frame is a copy with the mesh drawn on it when draw is
+                   True, and the input frame itself otherwise.
+                   landmarks is a FaceLandmarks with one (x, y) pixel row per landmark
+                   (empty if no face was found). It also behaves like the old
+                   {index: (x, y)} dictionary. Its array is reused by the next
+                   call; use landmarks.copy() to keep it longer.
         """
-        # Create a copy of the frame
-        img = frame.copy()
+        # Only drawing needs a copy; inference reads the frame through reused buffers
+        img = frame.copy() if draw else frame
         
-        # Convert to RGB for MediaPipe
-        img_rgb = cv.cvtColor(img, cv.COLOR_BGR2RGB)
+        landmarks = self._no_face
+        face_landmarks = None
+        scale = self.input_scale if input_scale is None else input_scale
+        
+        # Track the face region of the previous frame; a lost face is searched for in the whole frame
+        if self.roi is not None:
+            face_landmarks, region = self._process_region(img, self.roi, scale)
+            if face_landmarks is None:
+                self.roi = None
+        if face_landmarks is None:
+            face_landmarks, region = self._process_region(img, None, scale)
+        
+        # If facial landmarks are detected
+        if face_landmarks is not None:
+            landmarks = self._to_pixel_landmarks(face_landmarks, region[2] - region[0], region[3] - region[1],
+                                                 region[0], region[1])
+            if self.roi_tracking:
+                self.roi = self._face_region(landmarks.points, img.shape)
+            
+            # Draw the landmarks if requested; MediaPipe maps them onto the processed region
+            if draw:
+                self._draw_landmarks(img[region[1]:region[3], region[0]:region[2]], face_landmarks)
+        
+        if self.trace_writer is not None:
+            self.trace_writer.append(landmarks.points, time.time() if timestamp is None else timestamp)
+        
+        return img, landmarks
+
+    def reset_tracking(self):
+        """Forget the tracked face region, so the next frame is searched in full."""
+        self.roi = None
+
+    def _process_region(self, img, roi, scale):
+        """
+        Run face mesh inference on a region of the frame.
+        
+        Args:
+            img (np.ndarray): Input frame
+            roi (tuple): (x0, y0, x1, y1) region, or None for the whole frame
+            scale (float): Factor the region is downscaled by before inference
+            
+        Returns:
+            tuple: (face_landmarks, region) with the first face's MediaPipe landmarks
+                   normalized to the region, or (None, region) if no face was found
+        """
+        img_h, img_w = img.shape[:2]
+        if roi is None:
+            region = (0, 0, img_w, img_h)
+            crop = img
+            if scale < 1.0:
+                size = (max(1, round(img_w * scale)), max(1, round(img_h * scale)))
+            else:
+                size = None
+            interpolation = cv.INTER_LINEAR
+            self.full_frames += 1
+        else:
+            # Face regions are always brought to the same square size, so their buffers are reused
+            region = roi
+            crop = img[roi[1]:roi[3], roi[0]:roi[2]]
+            side = max(1, round(self.roi_size * scale))
+            size = (side, side)
+            interpolation = cv.INTER_AREA
+            self.roi_frames += 1
+            
+            # Video mode keeps tracking state in the coordinates of its input, so face
+            # regions get their own graph instead of mixing them with full frames
+            if self._roi_face_mesh is None:
+                self._roi_face_mesh = self.mp_face_mesh.FaceMesh(
+                    static_image_mode=self.mode,
+                    max_num_faces=self.max_faces,
+                    min_detection_confidence=self.min_detection_con,
+                    min_tracking_confidence=self.min_track_con
+                )
+        
+        # Convert to RGB for MediaPipe, at the reduced inference resolution if one is set.
+        # MediaPipe landmarks are normalized, so they map back onto the region unchanged.
+        if size is not None and size != (crop.shape[1], crop.shape[0]):
+            small = self._buffer(("resized", roi is None), (size[1], size[0], 3))
+            cv.resize(crop, size, dst=small, interpolation=interpolation)
+            crop = small
+        img_rgb = self._buffer(("rgb", roi is None), crop.shape)
+        cv.cvtColor(crop, cv.COLOR_BGR2RGB, dst=img_rgb)
         
         # Process the image
-        self.results = self.face_mesh.process(img_rgb)
+        face_mesh = self.face_mesh if roi is None else self._roi_face_mesh
+        self.results = face_mesh.process(img_rgb)
         
-        # Initialize empty landmarks dictionary
-        landmarks_dict = {}
+        if not self.results.multi_face_landmarks:
+            return None, region
         
-        # If facial landmarks are detected
-        if self.results.multi_face_landmarks:
-            # Get the first face (we only support one face at a time for microsleep detection)
-            face_landmarks = self.results.multi_face_landmarks[0]
+        # Get the first face (we only support one face at a time for microsleep detection)
+        return self.results.multi_face_landmarks[0], region
+
+    def _face_region(self, points, shape):
+        """
+        Compute the region the next frame is cropped to from this frame's landmarks.
+        
+        Args:
+            points (np.ndarray): (N, 2) landmark pixel coordinates
+            shape (tuple): Frame shape
             
-            # Get image dimensions
-            img_h, img_w, _ = img.shape
+        Returns:
+            tuple: Square (x0, y0, x1, y1) region around the face inside the frame,
+                   or None if the face is too small to track
+        """
+        x_min, y_min = points.min(axis=0)
+        x_max, y_max = points.max(axis=0)
+        size = max(x_max - x_min, y_max - y_min)
+        if size < 20:
+            return None
+        
+        # A square region keeps the face's aspect ratio when it is scaled; near the
+        # frame edges it is shifted inside the frame rather than clipped
+        img_h, img_w = shape[:2]
+        side = min(int(size * (1 + 2 * self.roi_margin)), img_w, img_h)
+        x0 = min(max(0, int((x_min + x_max - side) / 2)), img_w - side)
+        y0 = min(max(0, int((y_min + y_max - side) / 2)), img_h - side)
+        return x0, y0, x0 + side, y0 + side
+
+    def _buffer(self, name, shape):
+        """
+        Get a reusable uint8 buffer, allocating it only when the requested shape changes.
+        
+        Args:
+            name (hashable): Buffer key
+            shape (tuple): Required shape
             
-            # Extract landmark coordinates and store in dictionary
-            for idx, landmark in enumerate(face_landmarks.landmark):
-                # Convert normalized coordinates to pixel coordinates
-                x, y = int(landmark.x * img_w), int(landmark.y * img_h)
-                landmarks_dict[idx] = (x, y)
+        Returns:
+            np.ndarray: Buffer of that shape; its contents are overwritten by the caller
+        """
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = self._buffers[name] = np.empty(shape, dtype=np.uint8)
+        return buffer
+
+    def _to_pixel_landmarks(self, face_landmarks, img_w, img_h, offset_x=0, offset_y=0):
+        """
+        Convert normalized MediaPipe landmarks to pixel coordinates in the reused buffers.
+        
+        Args:
+            face_landmarks: MediaPipe face landmarks
+            img_w (int): Width of the processed region
+            img_h (int): Height of the processed region
+            offset_x (int): Left edge of the region in the frame
+            offset_y (int): Top edge of the region in the frame
             
-            # Draw the landmarks if requested
-            if draw:
-                self._draw_landmarks(img, face_landmarks)
+        Returns:
+            FaceLandmarks: Landmarks backed by the generator's (N, 2) buffer
+        """
+        landmark_list = face_landmarks.landmark
+        count = len(landmark_list)
         
-        return img, landmarks_dict
+        if self._points is None or len(self._points) != count:
+            self._normalized = np.empty((count, 2), dtype=np.float64)
+            self._scaled = np.empty((count, 2), dtype=np.float64)
+            self._points = np.empty((count, 2), dtype=np.int32)
+        
+        # The protobuf list has to be read element by element; everything after is vectorized
+        self._normalized.reshape(-1)[:] = np.fromiter(
+            (value for landmark in landmark_list for value in (landmark.x, landmark.y)),
+            dtype=np.float64, count=2 * count
+        )
+        
+        # Scale to pixels in one multiply; the integer cast truncates like int()
+        np.multiply(self._normalized, (img_w, img_h), out=self._scaled)
+        if offset_x or offset_y:
+            self._scaled += (offset_x, offset_y)
+        self._points[...] = self._scaled
+        
+        return FaceLandmarks(self._points)
 
     def _draw_landmarks(self, img, face_landmarks):
         """
@@ -130,7 +317,7 @@ class FaceMeshGenerator:
         
         Args:
             frame (np.ndarray): Input frame
-            landmarks (dict): Dictionary of facial landmarks
+            landmarks (FaceLandmarks or dict): Facial landmarks
             eye_landmarks (list): List of landmark indices for the eye
             padding (int): Padding around the eye region
             
@@ -138,18 +325,20 @@ class FaceMeshGenerator:
             np.ndarray: Cropped eye region
         """
         # Check if all required landmarks are present
-        if not all(lm in landmarks for lm in eye_landmarks):
-            return None
-            
-        # Get coordinates
-        x_coords = [landmarks[lm][0] for lm in eye_landmarks]
-        y_coords = [landmarks[lm][1] for lm in eye_landmarks]
+        if isinstance(landmarks, FaceLandmarks):
+            if not landmarks.has_all(eye_landmarks):
+                return None
+            coords = landmarks.gather(eye_landmarks)
+        else:
+            if not all(lm in landmarks for lm in eye_landmarks):
+                return None
+            coords = np.array([landmarks[lm] for lm in eye_landmarks])
         
         # Calculate bounding box with padding
-        x_min = max(0, min(x_coords) - padding)
-        y_min = max(0, min(y_coords) - padding)
-        x_max = min(frame.shape[1], max(x_coords) + padding)
-        y_max = min(frame.shape[0], max(y_coords) + padding)
+        x_min = max(0, int(coords[:, 0].min()) - padding)
+        y_min = max(0, int(coords[:, 1].min()) - padding)
+        x_max = min(frame.shape[1], int(coords[:, 0].max()) + padding)
+        y_max = min(frame.shape[0], int(coords[:, 1].max()) + padding)
         
         # Extract region
         eye_region = frame[y_min:y_max, x_min:x_max]
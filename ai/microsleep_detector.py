@@ -5,6 +5,7 @@ import matplotlib.pyplot as plt
 from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
 import time
 import os
+import bisect
 from datetime import datetime
 from collections import deque
 import threading
@@ -13,12 +14,19 @@ import serial
 import os
 from dotenv import load_dotenv
 
-import requests
 os.system("say 'Blink detected'")
 
 from facemesh_module import FaceMeshGenerator
 from eye_analyzer import EyeAspectRatioAnalyzer
-from utils.drawing_utils import DrawingUtils
+from utils.drawing_utils import DrawingUtils, HudCompositor
+from utils.ear_plot import OpenCVEarPlot, plot_limits
+from utils.frame_pipeline import LatestFrameQueue, CaptureThread
+from utils.instrumentation import Instrumentation
+from utils.landmark_trace import LandmarkTraceWriter
+from utils.rate_controller import AdaptiveRateController
+from utils.ring_buffer import RingBuffer
+from utils.telemetry_sender import TelemetrySender
+from utils.http_client import PooledHttpClient
 from models.microsleep_classifier import MicrosleepClassifier
 
 class MicrosleepDetector:
@@ -56,9 +64,15 @@ class MicrosleepDetector:
     def __init__(self, camera_id=0, ear_threshold=0.24, consec_frames=3, 
                 microsleep_frames=15, save_video=False, display_plot=True,
                 enable_audio=True, sensitivity=0.7, driver_name="Default Driver", 
-                armada="Default Armada", rute="Default Rute", server_url="http://127.0.0.1:5001/vision"):
+                armada="Default Armada", rute="Default Rute", server_url="http://127.0.0.1:5001/vision",
+                threaded_pipeline=True, headless=False, clock=None, landmark_trace=None,
+                instrument=False, metrics_path=None, metrics_interval=10.0, metrics_format="json",
+                plot_backend="matplotlib", adaptive_rate=False, generator=None, telemetry=None,
+                roi_tracking=False):
         # Parameter lama
-        self.generator = FaceMeshGenerator()
+        # A multi-stream service passes a shared generator so every stream does not load its own graph.
+        # With roi_tracking the face mesh only sees the face region found in the previous frame.
+        self.generator = generator or FaceMeshGenerator(roi_tracking=roi_tracking)
         self.eye_analyzer = EyeAspectRatioAnalyzer()
         self.microsleep_classifier = MicrosleepClassifier()
         self.microsleep_classifier.set_sensitivity(sensitivity)
@@ -71,6 +85,11 @@ class MicrosleepDetector:
         self.save_video = save_video
         self.display_plot = display_plot
         self.enable_audio = enable_audio
+        
+        # EAR chart renderer: "matplotlib" figure or "opencv" native drawing (much cheaper)
+        if plot_backend not in ("matplotlib", "opencv"):
+            raise ValueError(f"Unknown plot backend: {plot_backend}")
+        self.plot_backend = plot_backend
         self.sensitivity = sensitivity
         
         # Parameter baru
@@ -79,10 +98,49 @@ class MicrosleepDetector:
         self.rute = rute
         self.server_url = server_url
         
+        # Run capture, inference and rendering on separate stages
+        self.threaded_pipeline = threaded_pipeline
+        
+        # Headless mode (offline replay): no camera, window, plot, audio, serial or uploads.
+        # The caller feeds frames or EAR values and sets fps to match its source.
+        self.headless = headless
+        if headless:
+            self.display_plot = False
+            self.enable_audio = False
+        
+        # Time source of the alert state machine; replay injects trace time for determinism
+        self.clock = clock or time.time
+        
+        # Guards detection state shared between the inference and render stages
+        self._state_lock = threading.Lock()
+        
         # Initialize capture and output
         self.cap = None
         self.out = None
-        self._init_video_capture()
+        if headless:
+            self.fps = 30
+        else:
+            self._init_video_capture()
+        
+        # Optionally persist the face mesh landmarks of every frame for offline re-analysis
+        self.landmark_trace = None
+        if landmark_trace:
+            frame_size = None if headless else (self.frame_width, self.frame_height)
+            self.landmark_trace = LandmarkTraceWriter(landmark_trace, fps=self.fps, frame_size=frame_size)
+            self.generator.trace_writer = self.landmark_trace
+        
+        # Span timers around every stage of the frame loop; a shared no-op unless the
+        # debug overlay (instrument) or the periodic metrics dump (metrics_path) asks for them
+        self.show_instrumentation = instrument
+        self.instrumentation = Instrumentation(
+            enabled=instrument or metrics_path is not None,
+            frame_budget_ms=1000.0 / self.fps
+        )
+        if metrics_path:
+            self.instrumentation.start_periodic_dump(metrics_path, metrics_interval, metrics_format)
+        
+        # Optionally lower the face mesh stride and resolution when frames take too long
+        self.rate_controller = AdaptiveRateController(self.fps) if adaptive_rate else None
         
         # Tracking variables
         self._init_tracking_variables()
@@ -90,6 +148,16 @@ class MicrosleepDetector:
         # Initialize plotting if enabled
         if self.display_plot:
             self._init_plot()
+        
+        # Status labels are drawn from cached sprites; only changed values are rasterized again
+        self.hud = HudCompositor()
+        
+        # Reused frame buffers: the captured frame, the plot in BGR, the frame and
+        # plot stacked, and the scaled window image
+        self._capture_buffer = None
+        self._plot_bgr = None
+        self._canvas = None
+        self._display = None
             
         # Initialize audio alert
         self.audio_thread = None
@@ -99,6 +167,35 @@ class MicrosleepDetector:
         # Initialize last sent data time
         self.last_data_sent_time = 0
         self.data_send_interval = 1.0  # seconds between data sends
+        
+        if headless:
+            # Headless streams of a multi-stream service can share the service's sender
+            self.http_client = None
+            self.telemetry = telemetry
+            self._owns_telemetry = False
+            self.serial_port = None
+            return
+        
+        # Upload configuration is read once at startup
+        load_dotenv()
+        self.ubidots_token = os.getenv("UBIDOTS_TOKEN")
+        self.device_label = os.getenv("DEVICE_LABEL", "esp32-cam")
+        if not self.ubidots_token:
+            print("⚠️ Token Ubidots tidak ditemukan di environment variables")
+        if not self.server_url or self.server_url == "dummy_url":
+            print("⚠️ Server URL tidak valid. Melewati pengiriman ke server.")
+        
+        # Background delivery of status samples (batched, retried, spilled to disk)
+        # over kept-alive connections owned by the detector
+        self.http_client = PooledHttpClient()
+        self._owns_telemetry = True
+        self.telemetry = TelemetrySender(
+            self.server_url,
+            self.http_client,
+            ubidots_token=self.ubidots_token,
+            device_label=self.device_label,
+            instrumentation=self.instrumentation
+        )
 
         try:
             self.serial_port = serial.Serial('COM3', 9600, timeout=1)  # Ganti port sesuai sistem kamu
@@ -124,6 +221,24 @@ class MicrosleepDetector:
         if self.save_video:
             self._init_video_writer()
 
+    def set_fps(self, fps):
+        """
+        Switch to the frame rate of a source opened after construction
+        
+        Everything derived from the frame rate follows: the instrumentation frame
+        budget, the landmark trace header and the adaptive rate controller, which
+        restarts at the best quality level.
+        
+        Args:
+            fps (float): Frame rate of the source
+        """
+        self.fps = fps
+        self.instrumentation.frame_budget_ms = 1000.0 / fps
+        if self.landmark_trace is not None:
+            self.landmark_trace.fps = fps
+        if self.rate_controller is not None:
+            self.rate_controller = AdaptiveRateController(fps)
+
     def _init_video_writer(self):
         """Initialize video writer for saving output"""
         # Create output directory if it doesn't exist
@@ -154,8 +269,19 @@ class MicrosleepDetector:
         self.last_state = self.ALERT_STATES['NORMAL']
         self.state_stability = 0  # Counter for stable state detection
         
+        # Eye-closure timing in seconds, measured on frame timestamps
+        self.frame_time = self.clock()  # Timestamp of the frame being processed
+        self.closure_start_time = None  # First closed frame of the current closure
+        self.blink_start_time = None  # Frame at which the current closure counted as a blink
+        
+        # Adaptive inference: frames skipped since the last inference wait for an interpolated EAR
+        self._pending_frame_times = []
+        self._last_inferred = None  # (timestamp, average EAR) of the last inferred frame
+        self._last_overlay = None  # (landmarks, ear, smoothed_ear) redrawn on skipped frames
+        self._last_frame_inferred = True
+        
         # Data for analysis and plotting
-        self.ear_values = deque(maxlen=180)  # Store last 180 EAR values (about 6 seconds at 30fps)
+        self.ear_values = RingBuffer(180)  # Store last 180 EAR values (about 6 seconds at 30fps)
         self.smoothed_ear_values = deque(maxlen=180)  # Store smoothed EAR values
         self.frame_numbers = deque(maxlen=180)  # Corresponding frame numbers
         self.blink_frames = []  # Store frame numbers where blinks occurred
@@ -168,15 +294,24 @@ class MicrosleepDetector:
         self.adaptive_threshold = None
         
         # Timing data
-        self.last_blink_time = time.time()
+        self.last_blink_time = self.clock()
         self.blink_interval_times = deque(maxlen=20)  # Store last 20 blink intervals
         
         # Performance monitoring
         self.processing_times = deque(maxlen=30)  # Store recent frame processing times
         self.last_frame_time = None
+        self.pipeline_latencies = deque(maxlen=30)  # Capture-to-display latency per frame
+        self.dropped_frames = 0  # Frames superseded by newer ones in the pipeline
 
     def _init_plot(self):
-        """Initialize the matplotlib plot for EAR visualization"""
+        """Initialize the EAR plot with the selected backend"""
+        if self.plot_backend == "opencv":
+            # Render at the video width so the chart can be stacked without resizing
+            width = getattr(self, 'frame_width', 1000)
+            self.plot_renderer = OpenCVEarPlot(width, int(width * 0.4))
+            self._plot_image = None
+            return
+        
         plt.style.use('dark_background')
         plt.ioff()  # Turn off interactive mode
         
@@ -326,33 +461,36 @@ class MicrosleepDetector:
                 
                 print(f"Calibration complete. Adaptive threshold: {self.adaptive_threshold:.4f}")
                 
-                # Update the plot with adaptive threshold
-                if self.display_plot:
-                    self.adaptive_line, = self.ax.plot(
-                        list(range(180)),
-                        [self.adaptive_threshold] * 180,
-                        color=self.COLORS['YELLOW']['hex'],
-                        label="Adaptive Threshold",
-                        linewidth=2,
-                        linestyle=':'
-                    )
-                    
-                    # Update legend
-                    handles = [self.EAR_curve, self.smoothed_EAR_curve, self.threshold_line, self.adaptive_line]
-                    self.legend = self.ax.legend(
-                        handles=handles,
-                        loc='upper left',
-                        fontsize=8,
-                        facecolor='black',
-                        edgecolor='white',
-                        labelcolor='white',
-                        framealpha=0.8
-                    )
+                # The adaptive threshold line is added by the render stage on its next
+                # plot update, so matplotlib is only ever touched from one thread
             
             return progress
         
         return 100  # Calibration already complete
 
+    def _add_adaptive_line(self):
+        """Add the adaptive threshold line and refresh the legend once calibration completes"""
+        self.adaptive_line, = self.ax.plot(
+            list(range(180)),
+            [self.adaptive_threshold] * 180,
+            color=self.COLORS['YELLOW']['hex'],
+            label="Adaptive Threshold",
+            linewidth=2,
+            linestyle=':'
+        )
+        
+        # Update legend
+        handles = [self.EAR_curve, self.smoothed_EAR_curve, self.threshold_line, self.adaptive_line]
+        self.legend = self.ax.legend(
+            handles=handles,
+            loc='upper left',
+            fontsize=8,
+            facecolor='black',
+            edgecolor='white',
+            labelcolor='white',
+            framealpha=0.8
+        )
+
     def _update_plot(self, ear, smoothed_ear):
         """
         Update the plot with new EAR values
@@ -366,41 +504,59 @@ class MicrosleepDetector:
             
         # Determine color based on alert state
         colors = {
-            self.ALERT_STATES['NORMAL']: self.COLORS['GREEN']['hex'],
-            self.ALERT_STATES['BLINK']: self.COLORS['BLUE']['hex'],
-            self.ALERT_STATES['DROWSY']: self.COLORS['YELLOW']['hex'],
-            self.ALERT_STATES['MICROSLEEP']: self.COLORS['RED']['hex']
+            self.ALERT_STATES['NORMAL']: self.COLORS['GREEN'],
+            self.ALERT_STATES['BLINK']: self.COLORS['BLUE'],
+            self.ALERT_STATES['DROWSY']: self.COLORS['YELLOW'],
+            self.ALERT_STATES['MICROSLEEP']: self.COLORS['RED']
         }
         
-        color = colors[self.alert_state]
+        # Take a consistent snapshot of the detection state; the inference stage
+        # keeps appending to these buffers while the plot is being rendered
+        with self._state_lock:
+            color = colors[self.alert_state]
+            frame_numbers = list(self.frame_numbers)
+            ear_values = self.ear_values.values()
+            smoothed_ear_values = list(self.smoothed_ear_values)
+            
+            # Frame numbers are appended in increasing order, so the events inside
+            # the plotted window can be located by bisection instead of a full scan
+            first_frame = frame_numbers[0] if frame_numbers else 0
+            blink_frames = self.blink_frames[bisect.bisect_left(self.blink_frames, first_frame):]
+            microsleep_frames = self.microsleep_frames[bisect.bisect_left(self.microsleep_frames, first_frame):]
+        
+        if self.plot_backend == "opencv":
+            self._plot_image = self.plot_renderer.render(
+                frame_numbers, ear_values, smoothed_ear_values, color['bgr'],
+                self.EAR_THRESHOLD, self.adaptive_threshold, blink_frames, microsleep_frames
+            )
+            return
+        
+        # Add the adaptive threshold line once calibration has produced one
+        if self.adaptive_threshold and self.adaptive_line is None:
+            self._add_adaptive_line()
         
         # Update data
-        self.EAR_curve.set_xdata(self.frame_numbers)
-        self.EAR_curve.set_ydata(self.ear_values)
-        self.EAR_curve.set_color(color)
+        self.EAR_curve.set_xdata(frame_numbers)
+        self.EAR_curve.set_ydata(ear_values)
+        self.EAR_curve.set_color(color['hex'])
         
         # Update smoothed EAR curve
-        self.smoothed_EAR_curve.set_xdata(self.frame_numbers)
-        self.smoothed_EAR_curve.set_ydata(self.smoothed_ear_values)
+        self.smoothed_EAR_curve.set_xdata(frame_numbers)
+        self.smoothed_EAR_curve.set_ydata(smoothed_ear_values)
         
         # Update threshold line
-        self.threshold_line.set_xdata(self.frame_numbers)
-        self.threshold_line.set_ydata([self.EAR_THRESHOLD] * len(self.frame_numbers))
+        self.threshold_line.set_xdata(frame_numbers)
+        self.threshold_line.set_ydata([self.EAR_THRESHOLD] * len(frame_numbers))
         
         # Update adaptive threshold line if it exists
         if self.adaptive_threshold and self.adaptive_line:
-            self.adaptive_line.set_xdata(self.frame_numbers)
-            self.adaptive_line.set_ydata([self.adaptive_threshold] * len(self.frame_numbers))
+            self.adaptive_line.set_xdata(frame_numbers)
+            self.adaptive_line.set_ydata([self.adaptive_threshold] * len(frame_numbers))
         
-        # Update x-axis limits to slide with the data
-        if len(self.frame_numbers) > 1:
-            x_min = min(self.frame_numbers)
-            x_max = max(self.frame_numbers)
-            x_range = x_max - x_min
-            
-            # Ensure there's a margin and handle initial cases
-            margin = max(5, int(x_range * 0.1))
-            self.ax.set_xlim(x_min - margin, x_max + margin)
+        # Slide the x-axis with the data and fit the y-axis to the observed EAR values
+        x_limits, y_limits = plot_limits(frame_numbers, ear_values)
+        self.ax.set_xlim(*x_limits)
+        self.ax.set_ylim(*y_limits)
         
         # Clear previous microsleep spans
         for span in self.microsleep_spans:
@@ -413,38 +569,16 @@ class MicrosleepDetector:
         self.blink_markers = []
         
         # Add blink markers
-        for frame in self.blink_frames:
-            if frame in self.frame_numbers:
-                marker = self.ax.plot([frame], [0.2], 'o', color='blue', markersize=6, alpha=0.7)[0]
-                self.blink_markers.append(marker)
+        for frame in blink_frames:
+            marker = self.ax.plot([frame], [0.2], 'o', color='blue', markersize=6, alpha=0.7)[0]
+            self.blink_markers.append(marker)
         
         # Highlight microsleep regions if any
-        if self.microsleep_frames:
-            for frame in self.microsleep_frames:
-                if frame in self.frame_numbers:
-                    span = self.ax.axvspan(frame-5, frame+5, color='red', alpha=0.3)
-                    self.microsleep_spans.append(span)
-        
-        # Adjust y-axis limits based on observed EAR values
-        if len(self.ear_values) > 0:
-            ear_min = min(self.ear_values)
-            ear_max = max(self.ear_values)
-            margin = (ear_max - ear_min) * 0.1
-            
-            # Ensure reasonable limits
-            y_min = max(0.1, ear_min - margin)
-            y_max = min(0.5, ear_max + margin)
-            
-            # Ensure minimum range to prevent extreme zoom
-            if y_max - y_min < 0.1:
-                y_center = (y_min + y_max) / 2
-                y_min = y_center - 0.05
-                y_max = y_center + 0.05
-                
-            self.ax.set_ylim(y_min, y_max)
+        for frame in microsleep_frames:
+            span = self.ax.axvspan(frame-5, frame+5, color='red', alpha=0.3)
+            self.microsleep_spans.append(span)
         
-        # Redraw canvas
-        self.fig.canvas.draw()
+        # The canvas is rendered once, by plot_to_image
 
     def plot_to_image(self):
         """
@@ -455,38 +589,63 @@ class MicrosleepDetector:
         """
         if not self.display_plot:
             return None
+        
+        # The OpenCV backend already drew the chart in _update_plot
+        if self.plot_backend == "opencv":
+            return self._plot_image
             
         self.canvas.draw()
         
         buffer = self.canvas.buffer_rgba()
         img_array = np.asarray(buffer)
         
-        # Convert RGBA to BGR (OpenCV format)
-        img_rgb = cv.cvtColor(img_array, cv.COLOR_RGBA2RGB)
-        img_bgr = cv.cvtColor(img_rgb, cv.COLOR_RGB2BGR)
-        
-        return img_bgr
+        # Convert RGBA to BGR (OpenCV format) in a single pass, into the reused plot image
+        if self._plot_bgr is None or self._plot_bgr.shape[:2] != img_array.shape[:2]:
+            self._plot_bgr = np.empty(img_array.shape[:2] + (3,), dtype=np.uint8)
+        return cv.cvtColor(img_array, cv.COLOR_RGBA2BGR, dst=self._plot_bgr)
 
-    def process_frame(self, frame):
+    def process_frame(self, frame, capture_time=None):
         """
         Process a single frame to detect eyes and analyze for microsleep
         
         Args:
             frame (np.ndarray): Input video frame
+            capture_time (float): Time the frame was captured, or None for the detector clock
             
         Returns:
             tuple: Processed frame and EAR values
         """
+        spans = self.instrumentation
+        
         # Get face mesh landmarks
-        frame, face_landmarks = self.generator.create_face_mesh(frame, draw=False)
+        with spans.span("face_mesh"):
+            frame, face_landmarks = self.generator.create_face_mesh(
+                frame, draw=False, timestamp=self.clock() if capture_time is None else capture_time
+            )
         
         if not face_landmarks:
             # No face detected
             return frame, None, None
             
         # Calculate EAR using the eye analyzer
-        right_ear, left_ear, avg_ear, smoothed_ear = self.eye_analyzer.calculate_ear(face_landmarks)
+        with spans.span("ear"):
+            right_ear, left_ear, avg_ear, smoothed_ear = self.eye_analyzer.calculate_ear(face_landmarks)
+        
+        # Draw eye landmarks and status
+        self._draw_status(frame, face_landmarks, avg_ear, smoothed_ear)
+        
+        return frame, avg_ear, smoothed_ear
+
+    def _draw_status(self, frame, landmarks, ear, smoothed_ear):
+        """
+        Draw eye landmarks and status in the color of the current alert state
         
+        Args:
+            frame (np.ndarray): Frame to draw on
+            landmarks (FaceLandmarks): Facial landmarks
+            ear (float): Eye aspect ratio
+            smoothed_ear (float): Smoothed eye aspect ratio
+        """
         # Determine the threshold to use
         threshold = self.adaptive_threshold if self.calibration_complete else self.EAR_THRESHOLD
         
@@ -500,10 +659,8 @@ class MicrosleepDetector:
         
         color = colors[self.alert_state]
         
-        # Draw eye landmarks and status
-        self._draw_frame_elements(frame, face_landmarks, avg_ear, smoothed_ear, threshold, color)
-        
-        return frame, avg_ear, smoothed_ear
+        with self.instrumentation.span("drawing"):
+            self._draw_frame_elements(frame, landmarks, ear, smoothed_ear, threshold, color)
 
     def _draw_frame_elements(self, frame, landmarks, ear, smoothed_ear, threshold, color):
         """
@@ -511,7 +668,7 @@ class MicrosleepDetector:
         
         Args:
             frame (np.ndarray): Input frame
-            landmarks (dict): Facial landmarks
+            landmarks (FaceLandmarks): Facial landmarks
             ear (float): Eye aspect ratio
             smoothed_ear (float): Smoothed eye aspect ratio
             threshold (float): Current threshold for eye closure
@@ -530,35 +687,35 @@ class MicrosleepDetector:
         )
         
         # Draw EAR values
-        DrawingUtils.draw_text_with_bg(
-            frame, f"EAR: {ear:.4f}", (10, 30),
+        self.hud.draw_label(
+            frame, "ear", f"EAR: {ear:.4f}", (10, 30),
             font_scale=0.7, thickness=2,
             bg_color=color, text_color=(0, 0, 0)
         )
         
-        DrawingUtils.draw_text_with_bg(
-            frame, f"Smoothed: {smoothed_ear:.4f}", (10, 60),
+        self.hud.draw_label(
+            frame, "smoothed_ear", f"Smoothed: {smoothed_ear:.4f}", (10, 60),
             font_scale=0.7, thickness=2,
             bg_color=color, text_color=(0, 0, 0)
         )
         
         # Draw blink counter
-        DrawingUtils.draw_text_with_bg(
-            frame, f"Blinks: {self.blink_counter}", (10, 90),
+        self.hud.draw_label(
+            frame, "blinks", f"Blinks: {self.blink_counter}", (10, 90),
             font_scale=0.7, thickness=2,
             bg_color=color, text_color=(0, 0, 0)
         )
         
         # Draw microsleep counter
-        DrawingUtils.draw_text_with_bg(
-            frame, f"Microsleeps: {self.microsleep_counter}", (10, 120),
+        self.hud.draw_label(
+            frame, "microsleeps", f"Microsleeps: {self.microsleep_counter}", (10, 120),
             font_scale=0.7, thickness=2,
             bg_color=color, text_color=(0, 0, 0)
         )
         
         # Draw threshold
-        DrawingUtils.draw_text_with_bg(
-            frame, f"Threshold: {threshold:.4f}", (10, 150),
+        self.hud.draw_label(
+            frame, "threshold", f"Threshold: {threshold:.4f}", (10, 150),
             font_scale=0.7, thickness=2,
             bg_color=color, text_color=(0, 0, 0)
         )
@@ -567,8 +724,8 @@ class MicrosleepDetector:
         state_names = {v: k for k, v in self.ALERT_STATES.items()}
         state_text = state_names[self.alert_state]
         
-        DrawingUtils.draw_text_with_bg(
-            frame, f"State: {state_text}", (10, 180),
+        self.hud.draw_label(
+            frame, "state", f"State: {state_text}", (10, 180),
             font_scale=0.7, thickness=2,
             bg_color=color, text_color=(0, 0, 0)
         )
@@ -578,12 +735,21 @@ class MicrosleepDetector:
             avg_time = sum(self.processing_times) / len(self.processing_times)
             fps = 1.0 / avg_time if avg_time > 0 else 0
             
-            DrawingUtils.draw_text_with_bg(
-                frame, f"FPS: {fps:.1f}", (frame.shape[1] - 100, 30),
+            self.hud.draw_label(
+                frame, "fps", f"FPS: {fps:.1f}", (frame.shape[1] - 100, 30),
                 font_scale=0.7, thickness=2,
                 bg_color=(100, 100, 100), text_color=(255, 255, 255)
             )
         
+        # Draw the inference rate chosen by the adaptive controller
+        if self.rate_controller is not None:
+            self.hud.draw_label(
+                frame, "stride", f"Stride: {self.rate_controller.stride} @ {self.rate_controller.scale:.2f}x",
+                (frame.shape[1] - 210, frame.shape[0] - 20),
+                font_scale=0.6, thickness=1,
+                bg_color=(100, 100, 100), text_color=(255, 255, 255)
+            )
+        
         # Draw microsleep alert
         if self.alert_state == self.ALERT_STATES['MICROSLEEP']:
             # Draw large warning text
@@ -621,14 +787,18 @@ class MicrosleepDetector:
             cv.rectangle(frame, (10, frame.shape[0] - 50), (10 + filled_width, frame.shape[0] - 30), (0, 255, 0), cv.FILLED)
             
             # Draw text
-            cv.putText(frame, f"Calibrating: {progress:.1f}%", (10, frame.shape[0] - 60),
-                      cv.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            self.hud.draw_label(frame, "calibration", f"Calibrating: {progress:.1f}%", (10, frame.shape[0] - 60),
+                                font_scale=0.7, thickness=2, bg_color=None, text_color=(255, 255, 255),
+                                line_type=cv.LINE_8)
 
     def _send_data_to_server(self, status_alert):
         """
-        Send detection data to server and fallback to Ubidots if failed.
+        Queue detection data for the server and Ubidots without blocking the frame loop.
         """
-        current_time = time.time()
+        if self.telemetry is None:
+            return
+        
+        current_time = self.clock()
         if current_time - self.last_data_sent_time < self.data_send_interval:
             return
 
@@ -651,80 +821,9 @@ class MicrosleepDetector:
         print(f"[{payload['timestamp']}] Sopir: {payload['nama_sopir']} | "
             f"Armada: {payload['armada']} | Rute: {payload['rute']} | Status: {payload['status_alert']}")
 
-        if not self.server_url or self.server_url == "dummy_url":
-            print("⚠️ Server URL tidak valid. Melewati pengiriman ke server.")
-            self._send_to_ubidots(status_alert, payload)
-            return
-
-        try:
-            response = requests.post(self.server_url, json=payload, timeout=3)
-            if 200 <= response.status_code < 300:
-                print(f"✅ Data berhasil dikirim ke server. Response: {response.text[:100]}...")
-            else:
-                print(f"❌ Gagal kirim ke server. Status: {response.status_code}")
-                self._send_to_ubidots(status_alert, payload)
-
-            print(f"🔄 Mempersiapkan pengiriman data...")
-            success = self._send_to_ubidots(status_alert, payload)
-            
-            if success:
-                print("✅ Prioritas: Server utama")
-            else:
-                print("✅ Fallback: Ubidots")
-
-        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
-            print(f"❌ Tidak dapat menghubungi server: {e}")
-            self._send_to_ubidots(status_alert, payload)
-        except Exception as e:
-            print(f"❌ Error saat mengirim ke server: {e}")
-            self._send_to_ubidots(status_alert, payload)
-
-
-    def _send_to_ubidots(self, status_alert, payload):
-        """Mengirim data ke Ubidots dengan format yang benar"""
-        try:
-            from dotenv import load_dotenv
-            load_dotenv()
-            
-            ubidots_token = os.getenv("UBIDOTS_TOKEN")
-            device_label = os.getenv("DEVICE_LABEL", "esp32-cam")
-
-            if not ubidots_token:
-                print("⚠️ Token Ubidots tidak ditemukan di environment variables")
-                return
-
-            # Format payload sesuai spesifikasi Ubidots
-            ubidots_payload = {
-                "driver_name": payload.get("nama_sopir", "Unknown"),
-                "armada": payload.get("armada", "Unknown"),
-                "rute": payload.get("rute", "Unknown"),
-                "status_alert": 1 if status_alert in ["DROWSY", "MICROSLEEP"] else 0,
-                "timestamp": int(time.time() * 1000)  # Ubidots menggunakan timestamp dalam milidetik
-            }
-
-            headers = {
-                "X-Auth-Token": ubidots_token,
-                "Content-Type": "application/json"
-            }
-
-            # Endpoint yang benar untuk Ubidots
-            url = f"https://industrial.api.ubidots.com/api/v1.6/devices/{device_label}"
-            
-            print(f"🔄 Mengirim data ke Ubidots: {ubidots_payload}")
-            response = requests.post(url, headers=headers, json=ubidots_payload, timeout=5)
-            response.raise_for_status()  # Akan memunculkan exception untuk status code 4xx/5xx
-
-            print(f"✅ Data berhasil dikirim ke Ubidots. Response: {response.json()}")
-            return True
-            
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Gagal mengirim ke Ubidots: {str(e)}")
-            if hasattr(e, 'response') and e.response:
-                print(f"Detail error: {e.response.text}")
-            return False
-        except Exception as e:
-            print(f"❌ Error tidak terduga: {str(e)}")
-            return False
+        # Delivery to the server and Ubidots happens on the telemetry thread
+        with self.instrumentation.span("telemetry"):
+            self.telemetry.enqueue(payload, status_alert)
 
     def _update_blink_detection(self, ear, smoothed_ear):
         """
@@ -739,6 +838,16 @@ class MicrosleepDetector:
         self.smoothed_ear_values.append(smoothed_ear)
         self.frame_numbers.append(self.frame_number)
         
+        # Durations are measured on frame timestamps, so they stay correct in seconds when
+        # frames are dropped or inferred at a stride. Each frame stands for one frame period;
+        # the small tolerance absorbs float rounding of the timestamps.
+        now = self.frame_time
+        frame_period = 1.0 / self.fps
+        tolerance = 1e-6
+        
+        # Keep the classifier's streaming features current on every frame
+        self.microsleep_classifier.observe(ear, timestamp=now)
+        
         # Use the adaptive threshold if calibration is complete
         threshold = self.adaptive_threshold if self.calibration_complete else self.EAR_THRESHOLD
         
@@ -748,14 +857,18 @@ class MicrosleepDetector:
         # Microsleep detection logic
         if smoothed_ear < threshold:
             self.frame_counter += 1
+            if self.closure_start_time is None:
+                self.closure_start_time = now
+            closed_duration = now - self.closure_start_time + frame_period
             
-            # If eyes have been closed for enough frames, consider it a blink
-            if self.frame_counter == self.CONSEC_FRAMES:
+            # If eyes have been closed for CONSEC_FRAMES frame periods, consider it a blink
+            if self.blink_start_time is None and closed_duration >= self.CONSEC_FRAMES * frame_period - tolerance:
+                self.blink_start_time = now
                 self.blink_counter += 1
                 self.blink_frames.append(self.frame_number)
                 
                 # Calculate time since last blink
-                current_time = time.time()
+                current_time = now
                 blink_interval = current_time - self.last_blink_time
                 self.last_blink_time = current_time
                 
@@ -767,22 +880,21 @@ class MicrosleepDetector:
                 self.alert_state = self.ALERT_STATES['BLINK']
             
             # If eyes have been closed for a longer period, consider potential microsleep
-            if self.frame_counter >= self.CONSEC_FRAMES:
+            if self.blink_start_time is not None:
                 self.microsleep_frame_counter += 1
                 
+                # Microsleep duration in seconds, counted from the frame the blink was detected
+                microsleep_duration = now - self.blink_start_time + frame_period
+                
                 # If microsleep criteria met, update state
-                if self.microsleep_frame_counter >= self.MICROSLEEP_FRAMES:
-                    # Check if this is actually microsleep using classifier
-                    recent_ears = list(self.ear_values)[-30:]  # Get last 30 EAR values
-                    
-                    # Calculate microsleep duration in seconds
-                    microsleep_duration = self.microsleep_frame_counter / self.fps
+                if microsleep_duration >= self.MICROSLEEP_FRAMES * frame_period - tolerance:
                     
                     # Only use classifier if we have enough data
-                    if len(recent_ears) >= 10:
-                        # Get microsleep prediction
+                    if len(self.ear_values) >= 10:
+                        # Check if this is actually microsleep using classifier; the
+                        # EAR values were already observed above
                         is_microsleep = self.microsleep_classifier.predict(
-                            recent_ears, 
+                            None, 
                             list(self.blink_interval_times),
                             microsleep_duration
                         )
@@ -804,7 +916,7 @@ class MicrosleepDetector:
                             self.alert_state = self.ALERT_STATES['DROWSY']
                     else:
                         # Not enough data for classification, but still consider drowsy
-                        if self.microsleep_frame_counter >= self.MICROSLEEP_FRAMES * 1.5:
+                        if microsleep_duration >= self.MICROSLEEP_FRAMES * 1.5 * frame_period - tolerance:
                             self.alert_state = self.ALERT_STATES['MICROSLEEP']
                             
                             # First time we detect this microsleep (fallback detection)
@@ -819,11 +931,13 @@ class MicrosleepDetector:
                             self.alert_state = self.ALERT_STATES['DROWSY']
         else:
             # Eyes are open
-            if self.frame_counter >= self.CONSEC_FRAMES:
+            if self.blink_start_time is not None:
                 # Eyes were closed and now open
                 # Reset counters
                 self.frame_counter = 0
                 self.microsleep_frame_counter = 0
+                self.closure_start_time = None
+                self.blink_start_time = None
                 
                 # Reset alert state to normal (with some state stability)
                 if self.alert_state == self.ALERT_STATES['MICROSLEEP']:
@@ -838,10 +952,11 @@ class MicrosleepDetector:
                 # Eyes were open and still open
                 self.frame_counter = 0
                 self.microsleep_frame_counter = 0
+                self.closure_start_time = None
                 self.alert_state = self.ALERT_STATES['NORMAL']
         
         # Send data to server if state changed or periodically
-        if self.alert_state != previous_state or time.time() - self.last_data_sent_time >= self.data_send_interval:
+        if self.alert_state != previous_state or self.clock() - self.last_data_sent_time >= self.data_send_interval:
             # Convert alert state enum to string
             state_names = {v: k for k, v in self.ALERT_STATES.items()}
             status_alert = state_names[self.alert_state]
@@ -857,7 +972,7 @@ class MicrosleepDetector:
 
     def _play_alert(self):
         """Play an alert sound when microsleep is detected"""
-        current_time = time.time()
+        current_time = self.clock()
         if current_time - self.last_alert_time >= self.alert_cooldown:
             self.last_alert_time = current_time
 
@@ -897,83 +1012,334 @@ class MicrosleepDetector:
                 print(f"❌ Failed to write to serial port: {e}")
 
 
+    def _infer_frame(self, frame, capture_time=None):
+        """
+        Run face mesh, EAR and the alert state machine on a single frame
+        
+        Args:
+            frame (np.ndarray): Captured video frame
+            capture_time (float): Time the frame was captured, or None for the detector clock
+            
+        Returns:
+            tuple: (annotated_frame, ear, smoothed_ear); EAR values are None without a face
+        """
+        if self.rate_controller is not None:
+            return self._infer_frame_adaptive(frame, self.clock() if capture_time is None else capture_time)
+        
+        # Process the frame
+        frame, ear, smoothed_ear = self.process_frame(frame, capture_time)
+        
+        if ear is not None and smoothed_ear is not None:
+            with self.instrumentation.span("classification"):
+                self.update_state(ear, smoothed_ear, timestamp=capture_time)
+        
+        return frame, ear, smoothed_ear
+
+    def _infer_frame_adaptive(self, frame, capture_time):
+        """
+        Process a frame at the stride and resolution chosen by the rate controller
+        
+        Skipped frames are not inferred; they are redrawn with the last landmarks and
+        remembered. At the next inference their EAR is linearly interpolated between
+        the two inferred frames around them, and every frame is fed to the smoothing
+        and the state machine in capture order with its own timestamp, so blinks and
+        closures keep their timing even though only every stride-th frame is inferred.
+        
+        Args:
+            frame (np.ndarray): Captured video frame
+            capture_time (float): Time the frame was captured
+            
+        Returns:
+            tuple: (annotated_frame, ear, smoothed_ear); EAR values are None without a face
+        """
+        controller = self.rate_controller
+        self._last_frame_inferred = controller.should_infer()
+        
+        if not self._last_frame_inferred:
+            if self._last_inferred is None:
+                return frame, None, None
+            self._pending_frame_times.append(capture_time)
+            landmarks, ear, smoothed_ear = self._last_overlay
+            self._draw_status(frame, landmarks, ear, smoothed_ear)
+            return frame, ear, smoothed_ear
+        
+        spans = self.instrumentation
+        
+        start_time = time.perf_counter()
+        with spans.span("face_mesh"):
+            frame, face_landmarks = self.generator.create_face_mesh(
+                frame, draw=False, timestamp=capture_time, input_scale=controller.scale
+            )
+        controller.record_inference(time.perf_counter() - start_time)
+        
+        avg_ear = None
+        if face_landmarks:
+            with spans.span("ear"):
+                _, _, avg_ear, _ = self.eye_analyzer.calculate_ear(face_landmarks, track=False)
+        
+        if avg_ear is None:
+            # Nothing to interpolate across a frame without a face
+            self._pending_frame_times.clear()
+            self._last_inferred = None
+            return frame, None, None
+        
+        with spans.span("classification"):
+            if self._last_inferred is not None:
+                last_time, last_ear = self._last_inferred
+                interval = capture_time - last_time
+                for frame_time in self._pending_frame_times:
+                    weight = (frame_time - last_time) / interval if interval > 0 else 1.0
+                    ear = last_ear + (avg_ear - last_ear) * weight
+                    self.update_state(ear, self.eye_analyzer.track_ear(ear), timestamp=frame_time)
+            self._pending_frame_times.clear()
+            
+            smoothed_ear = self.eye_analyzer.track_ear(avg_ear)
+            self.update_state(avg_ear, smoothed_ear, timestamp=capture_time)
+        
+        self._last_inferred = (capture_time, avg_ear)
+        self._last_overlay = (face_landmarks.copy(), avg_ear, smoothed_ear)
+        
+        self._draw_status(frame, face_landmarks, avg_ear, smoothed_ear)
+        return frame, avg_ear, smoothed_ear
+
+    def update_state(self, ear, smoothed_ear, timestamp=None):
+        """
+        Advance calibration and the alert state machine by one frame
+        
+        Args:
+            ear (float): Current EAR value
+            smoothed_ear (float): Smoothed EAR value
+            timestamp (float): Capture time of the frame, or None for the detector clock
+        """
+        with self._state_lock:
+            self.frame_time = self.clock() if timestamp is None else timestamp
+            
+            # Perform calibration if needed
+            if not self.calibration_complete:
+                self.calibrate_threshold(ear)
+            
+            # Update blink detection
+            self._update_blink_detection(ear, smoothed_ear)
+
+    def _render_output(self, frame, ear, smoothed_ear):
+        """
+        Compose the display image, show it and write the frame to the recording
+        
+        Args:
+            frame (np.ndarray): Annotated video frame
+            ear (float): Current EAR value, or None if no face was detected
+            smoothed_ear (float): Smoothed EAR value, or None if no face was detected
+        """
+        # Per-stage timings and frame budget shares for on-device profiling
+        if self.show_instrumentation:
+            self.instrumentation.draw_overlay(frame)
+        
+        if ear is not None and smoothed_ear is not None:
+            # Update the plot
+            if self.display_plot:
+                with self.instrumentation.span("plot"):
+                    self._update_plot(ear, smoothed_ear)
+                    
+                    # Convert plot to image
+                    plot_img = self.plot_to_image()
+                
+                if plot_img is not None:
+                    cv.imshow('Microsleep Detection', self._compose_display(frame, plot_img))
+                else:
+                    cv.imshow('Microsleep Detection', frame)
+            else:
+                cv.imshow('Microsleep Detection', frame)
+        else:
+            # No face detected
+            cv.putText(frame, "No face detected", (30, 30), 
+                      cv.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+            cv.imshow('Microsleep Detection', frame)
+        
+        # Save the frame if recording
+        if self.save_video and self.out is not None:
+            with self.instrumentation.span("write"):
+                self.out.write(frame)
+
+    def _compose_display(self, frame, plot_img, scale=0.8):
+        """
+        Stack the frame above the plot and scale the result for the window
+        
+        Both steps write into buffers kept across frames, which are only
+        reallocated when the frame or plot size changes.
+        
+        Args:
+            frame (np.ndarray): Annotated video frame
+            plot_img (np.ndarray): Rendered EAR plot
+            scale (float): Size of the window image relative to the stacked image
+            
+        Returns:
+            np.ndarray: Window image, overwritten by the next call
+        """
+        frame_h, frame_w = frame.shape[:2]
+        plot_h = plot_img.shape[0]
+        if plot_img.shape[1] != frame_w:
+            # Resize plot to match frame width
+            plot_h = int(plot_h * frame_w / plot_img.shape[1])
+        
+        shape = (frame_h + plot_h, frame_w, 3)
+        if self._canvas is None or self._canvas.shape != shape:
+            self._canvas = np.empty(shape, dtype=np.uint8)
+            self._display = np.empty((round(shape[0] * scale), round(shape[1] * scale), 3), dtype=np.uint8)
+        
+        # Stack images vertically in the canvas
+        self._canvas[:frame_h] = frame
+        if plot_img.shape[:2] == (plot_h, frame_w):
+            self._canvas[frame_h:] = plot_img
+        else:
+            cv.resize(plot_img, (frame_w, plot_h), dst=self._canvas[frame_h:])
+        
+        cv.resize(self._canvas, (self._display.shape[1], self._display.shape[0]), dst=self._display)
+        return self._display
+
     def run(self):
         """Main loop to continuously process video frames"""
         try:
-            while self.cap.isOpened():
-                # Record start time for FPS calculation
-                start_time = time.time()
+            if self.threaded_pipeline:
+                self._run_pipelined()
+            else:
+                self._run_sequential()
+                    
+        except Exception as e:
+            print(f"Error in microsleep detection: {e}")
+            import traceback
+            traceback.print_exc()
+
+    def _run_sequential(self):
+        """Capture, infer and render every frame one after another on the calling thread"""
+        while self.cap.isOpened():
+            # Record start time for FPS calculation
+            start_time = time.time()
+            
+            # Read a frame
+            # Decode into the previous frame's array; it has been shown and written by now
+            with self.instrumentation.span("capture"):
+                ret, frame = self.cap.read(self._capture_buffer)
+            if not ret:
+                break
+            self._capture_buffer = frame
+            capture_time = self.clock()
+            
+            frame, ear, smoothed_ear = self._infer_frame(frame, capture_time)
+            self._render_output(frame, ear, smoothed_ear)
                 
-                # Read a frame
-                ret, frame = self.cap.read()
-                if not ret:
+            # Calculate processing time for this frame
+            end_time = time.time()
+            process_time = end_time - start_time
+            self.processing_times.append(process_time)
+            if self.rate_controller is not None:
+                self.rate_controller.record_frame(process_time, self._last_frame_inferred)
+            
+            # Use dynamic delay to maintain consistent frame rate
+            # Only wait if processing was faster than frame rate
+            target_frame_time = 1.0 / self.fps
+            remaining_time = target_frame_time - process_time
+            if remaining_time > 0:
+                wait_ms = int(remaining_time * 1000)
+                if cv.waitKey(wait_ms) & 0xFF == ord('q'):
+                    break
+            else:
+                # Processing is slower than frame rate, check for key press without waiting
+                if cv.waitKey(1) & 0xFF == ord('q'):
                     break
+
+    def _run_pipelined(self):
+        """
+        Run capture, inference and rendering as separate stages.
+        
+        The capture thread and the inference thread hand frames over through
+        single-slot latest-frame-wins queues, so a slow plot redraw or a stalled
+        upload never delays the next camera read or the alert state machine; stale
+        frames are dropped instead of queued. Rendering stays on the calling thread
+        because OpenCV's HighGUI must run on the main thread on some platforms.
+        """
+        stop_event = threading.Event()
+        captured = LatestFrameQueue(maxsize=1)
+        inferred = LatestFrameQueue(maxsize=1)
+        
+        # Rendered frames go back to the capture thread to be decoded into again
+        recycled = deque()
+        capture_thread = CaptureThread(self.cap, captured, stop_event, instrumentation=self.instrumentation,
+                                       recycled=recycled)
+        inference_thread = threading.Thread(
+            target=self._inference_loop,
+            args=(captured, inferred, stop_event),
+            name="microsleep-inference",
+            daemon=True
+        )
+        
+        capture_thread.start()
+        inference_thread.start()
+        
+        try:
+            while not stop_event.is_set():
+                item = inferred.get(timeout=0.05)
                 
-                # Process the frame
-                frame, ear, smoothed_ear = self.process_frame(frame)
+                if item is None:
+                    if inferred.exhausted:
+                        break
+                    # Keep the window responsive while waiting for the next frame
+                    if cv.waitKey(1) & 0xFF == ord('q'):
+                        break
+                    continue
                 
-                if ear is not None and smoothed_ear is not None:
-                    # Perform calibration if needed
-                    if not self.calibration_complete:
-                        self.calibrate_threshold(ear)
-                    
-                    # Update blink detection
-                    self._update_blink_detection(ear, smoothed_ear)
-                    
-                    # Update the plot
-                    if self.display_plot:
-                        self._update_plot(ear, smoothed_ear)
-                        
-                        # Convert plot to image
-                        plot_img = self.plot_to_image()
-                        
-                        if plot_img is not None:
-                            # Resize plot to match frame width
-                            plot_height = int(plot_img.shape[0] * frame.shape[1] / plot_img.shape[1])
-                            plot_img_resized = cv.resize(plot_img, (frame.shape[1], plot_height))
-                            
-                            # Stack images vertically
-                            stacked_frame = cv.vconcat([frame, plot_img_resized])
-                            
-                            # Show resized output
-                            display_img = cv.resize(stacked_frame, (0, 0), fx=0.8, fy=0.8)
-                            cv.imshow('Microsleep Detection', display_img)
-                        else:
-                            cv.imshow('Microsleep Detection', frame)
-                    else:
-                        cv.imshow('Microsleep Detection', frame)
-                else:
-                    # No face detected
-                    cv.putText(frame, "No face detected", (30, 30), 
-                              cv.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-                    cv.imshow('Microsleep Detection', frame)
+                frame_index, capture_time, frame, ear, smoothed_ear = item
+                self._render_output(frame, ear, smoothed_ear)
+                self.pipeline_latencies.append(time.time() - capture_time)
+                recycled.append(frame)
                 
-                # Save the frame if recording
-                if self.save_video and self.out is not None:
-                    self.out.write(frame)
-                    
-                # Calculate processing time for this frame
-                end_time = time.time()
-                process_time = end_time - start_time
+                if cv.waitKey(1) & 0xFF == ord('q'):
+                    break
+        finally:
+            stop_event.set()
+            captured.close()
+            inference_thread.join(timeout=2.0)
+            capture_thread.join(timeout=2.0)
+            
+            self.dropped_frames = captured.dropped + inferred.dropped
+            if self.pipeline_latencies:
+                avg_latency = sum(self.pipeline_latencies) / len(self.pipeline_latencies)
+                print(f"Pipeline stopped. Frames dropped: {self.dropped_frames}, "
+                      f"avg capture-to-display latency: {avg_latency * 1000:.1f} ms")
+
+    def _inference_loop(self, input_queue, output_queue, stop_event):
+        """
+        Inference stage of the pipelined run loop
+        
+        Args:
+            input_queue (LatestFrameQueue): Frames from the capture stage
+            output_queue (LatestFrameQueue): Annotated frames for the render stage
+            stop_event (threading.Event): Event signalling the pipeline to stop
+        """
+        try:
+            while not stop_event.is_set():
+                item = input_queue.get(timeout=0.1)
+                if item is None:
+                    if input_queue.exhausted:
+                        break
+                    continue
+                
+                frame_index, capture_time, frame = item
+                start_time = time.time()
+                
+                frame, ear, smoothed_ear = self._infer_frame(frame, capture_time)
+                process_time = time.time() - start_time
                 self.processing_times.append(process_time)
+                if self.rate_controller is not None:
+                    self.rate_controller.record_frame(process_time, self._last_frame_inferred)
                 
-                # Use dynamic delay to maintain consistent frame rate
-                # Only wait if processing was faster than frame rate
-                target_frame_time = 1.0 / self.fps
-                remaining_time = target_frame_time - process_time
-                if remaining_time > 0:
-                    wait_ms = int(remaining_time * 1000)
-                    if cv.waitKey(wait_ms) & 0xFF == ord('q'):
-                        break
-                else:
-                    # Processing is slower than frame rate, check for key press without waiting
-                    if cv.waitKey(1) & 0xFF == ord('q'):
-                        break
-                    
+                output_queue.put((frame_index, capture_time, frame, ear, smoothed_ear))
         except Exception as e:
-            print(f"Error in microsleep detection: {e}")
+            print(f"Error in inference stage: {e}")
             import traceback
             traceback.print_exc()
+            stop_event.set()
+        finally:
+            output_queue.close()
 
     def release_resources(self):
         """Release video capture and writer resources"""
@@ -982,15 +1348,39 @@ class MicrosleepDetector:
         
         if self.out is not None:
             self.out.release()
+        
+        # Write the final metrics snapshot
+        self.instrumentation.stop_periodic_dump()
+        
+        if self.landmark_trace is not None:
+            self.landmark_trace.close()
+            print(f"Landmark trace saved: {self.landmark_trace.directory} ({len(self.landmark_trace)} frames)")
+        
+        # Flush pending telemetry; anything undelivered is kept in the outbox
+        if self.telemetry is not None and self._owns_telemetry:
+            self.telemetry.close()
+            for destination, stats in self.get_upload_statistics().items():
+                latency = f", avg latency {stats['avg_latency_ms']:.0f} ms" if 'avg_latency_ms' in stats else ""
+                print(f"📡 {destination}: {stats['requests']} requests, {stats['errors']} errors{latency}")
+            self.http_client.close()
             
         # Close plot
-        if self.display_plot and plt.fignum_exists(self.fig.number):
+        if self.display_plot and self.plot_backend == "matplotlib" and plt.fignum_exists(self.fig.number):
             plt.close(self.fig)
         if self.serial_port and self.serial_port.is_open:
             self.serial_port.close()
             print("🔌 Serial port closed.")
 
             
+    def get_upload_statistics(self):
+        """
+        Get latency and error counters for each upload destination.
+        
+        Returns:
+            dict: Destination name ("server", "ubidots") mapped to its statistics
+        """
+        return self.http_client.get_statistics()
+
     def adjust_sensitivity(self, sensitivity):
         """
         Adjust the sensitivity of microsleep detection.
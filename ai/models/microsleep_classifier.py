@@ -2,6 +2,9 @@ import numpy as np
 from collections import deque
 import time
 
+from utils.ring_buffer import RingBuffer
+from utils.rolling_stats import RollingStats, OscillationTracker
+
 class MicrosleepClassifier:
     """
     An improved classifier for detecting microsleep events based on eye aspect ratio patterns
@@ -30,7 +33,6 @@ class MicrosleepClassifier:
         # Initialize history tracking
         self.blink_history = deque(maxlen=20)  # Store recent blink characteristics
         self.microsleep_history = deque(maxlen=10)  # Store recent microsleep events
-        self.ear_history = deque(maxlen=120)  # Store recent EAR values for pattern analysis
         
         # Initialize time tracking
         self.last_blink_time = time.time()
@@ -44,46 +46,81 @@ class MicrosleepClassifier:
         self.estimated_fps = 30  # Default, will be updated based on actual data
         self.frame_times = deque(maxlen=30)  # Recent frame timestamps
         
-        # Enhanced pattern recognition
-        self.pattern_buffer = deque(maxlen=300)  # Store a longer history for pattern recognition
+        # Temporal smoothing
         self.detection_buffer = deque(maxlen=10)  # Recent detection results for temporal smoothing
+        
+        # Streaming feature accumulators, updated once per frame by observe()
+        self.pattern_window = 30  # Frames covered by the EAR pattern statistics
+        self.perclos_threshold = 0.2
+        self.perclos_window = 90  # Frames covered by the PERCLOS-like metric
+        self.oscillation_window = 90  # Frames searched for oscillations (about 3 seconds at 30fps)
+        
+        self.pattern_stats = RollingStats(self.pattern_window)
+        self.diff_stats = RollingStats(self.pattern_window - 1)  # Frame-to-frame EAR changes
+        self.recent_stats = RollingStats(10)  # Minimum EAR of the last 10 frames
+        self.perclos_buffer = RingBuffer(self.perclos_window, threshold=self.perclos_threshold)
+        self.oscillation = OscillationTracker(self.oscillation_window, edge=10)
+        self.last_ear = None
 
     def update_fps_estimate(self):
         """Update the FPS estimate based on actual frame timing."""
         if len(self.frame_times) < 2:
             return
             
-        # Calculate average time between frames
-        diffs = [self.frame_times[i] - self.frame_times[i-1] for i in range(1, len(self.frame_times))]
-        avg_diff = np.mean(diffs)
+        # Average time between frames; the sum of consecutive differences telescopes
+        avg_diff = (self.frame_times[-1] - self.frame_times[0]) / (len(self.frame_times) - 1)
         if avg_diff > 0:
             self.estimated_fps = 1.0 / avg_diff
 
+    def observe(self, ear, timestamp=None):
+        """
+        Feed one EAR value into the streaming feature accumulators.
+        
+        Call once per frame; every update is O(1) regardless of window length.
+        
+        Args:
+            ear (float): Eye aspect ratio of the frame
+            timestamp (float): Frame time in seconds, or None to use the wall clock
+        """
+        # Record timestamp for FPS estimation
+        self.frame_times.append(time.time() if timestamp is None else timestamp)
+        self.update_fps_estimate()
+        
+        if self.last_ear is not None:
+            self.diff_stats.push(ear - self.last_ear)
+        self.last_ear = ear
+        
+        self.pattern_stats.push(ear)
+        self.recent_stats.push(ear)
+        self.perclos_buffer.append(ear)
+        self.oscillation.push(ear)
+
     def predict(self, ear_values, blink_intervals, closed_duration):
         """
         Predict whether a sequence of EAR values indicates a microsleep event.
         Enhanced version with multiple detection methods.
         
+        The EAR features come from the streaming accumulators. Callers that feed
+        every frame through observe() pass ear_values=None; otherwise the newest
+        value of ear_values is observed here, so calling predict once per frame
+        with a sliding window gives the same result.
+        
         Args:
-            ear_values (list): Recent eye aspect ratio values
+            ear_values (list): Recent eye aspect ratio values, or None if already observed
             blink_intervals (list): Recent time intervals between blinks (seconds)
             closed_duration (float): Duration of current eye closure (seconds)
             
         Returns:
             bool: True if microsleep is detected, False otherwise
         """
-        # Record timestamp for FPS estimation
-        current_time = time.time()
-        self.frame_times.append(current_time)
-        self.update_fps_estimate()
+        # Add current EAR to the accumulators
+        if ear_values is not None and len(ear_values) > 0:
+            self.observe(ear_values[-1])
         
-        # Add current EAR to history
-        if ear_values and len(ear_values) > 0:
-            self.ear_history.append(ear_values[-1])
-            self.pattern_buffer.append(ear_values[-1])
+        current_time = self.frame_times[-1] if self.frame_times else time.time()
         
         # Check if we have enough data to make a prediction
-        if len(ear_values) < 5:
+        if len(self.pattern_stats) < 5:
             return False
             
         # Apply multiple detection methods and combine results
@@ -94,7 +131,7 @@ class MicrosleepClassifier:
         methods_results.append(duration_result)
         
         # Method 2: Pattern-based detection
-        pattern_result = self._detect_by_pattern(ear_values)
+        pattern_result = self._detect_by_pattern()
         methods_results.append(pattern_result)
         
         # Method 3: Blink rate analysis
@@ -104,11 +141,11 @@ class MicrosleepClassifier:
         methods_results.append(blink_rate_result)
         
         # Method 4: PERCLOS-like metric
-        perclos_result = self._detect_by_perclos(ear_values)
+        perclos_result = self._detect_by_perclos()
         methods_results.append(perclos_result)
         
         # Method 5: Wavelet-based detection for oscillatory patterns
-        wavelet_result = self._detect_by_wavelet(list(self.pattern_buffer))
+        wavelet_result = self._detect_by_wavelet()
         methods_results.append(wavelet_result)
         
         # Combine results with weights based on reliability
@@ -128,7 +165,7 @@ class MicrosleepClassifier:
             self.microsleep_history.append({
                 'timestamp': current_time,
                 'duration': closed_duration,
-                'ear_min': min(ear_values[-10:]) if ear_values else None,
+                'ear_min': self.recent_stats.min,
                 'confidence': weighted_score
             })
             self.detection_count += 1
@@ -168,27 +205,19 @@ class MicrosleepClassifier:
             score = 1.0 - ((closed_duration - 3.0) / 27.0)
             return max(0.1, min(1.0, score))
 
-    def _detect_by_pattern(self, ear_values):
+    def _detect_by_pattern(self):
         """
-        Detect microsleep based on patterns in EAR values.
-        
-        Args:
-            ear_values (list): Recent eye aspect ratio values
+        Detect microsleep based on patterns in the last pattern_window EAR values.
             
         Returns:
             float: Score between 0.0 and 1.0 indicating microsleep probability
         """
-        if len(ear_values) < 10:
+        if len(self.pattern_stats) < 10:
             return 0.0
             
         # Get statistics on recent EAR values
-        ear_mean = np.mean(ear_values)
-        ear_std = np.std(ear_values)
-        ear_min = np.min(ear_values)
-        ear_max = np.max(ear_values)
-        
-        # Calculate rate of change
-        ear_diffs = np.diff(ear_values)
+        ear_std = self.pattern_stats.std
+        ear_min = self.pattern_stats.min
         
         # Criteria for microsleep pattern:
         # 1. Low minimum EAR (eyes closed)
@@ -198,9 +227,9 @@ class MicrosleepClassifier:
         # 2. Low variation in EAR during closure (stable closure, not fluctuating)
         stability_score = 1.0 - min(1.0, ear_std * 10)
         
-        # 3. Rapid closure pattern
-        if len(ear_diffs) >= 5:
-            closure_diff = np.min(ear_diffs)
+        # 3. Rapid closure pattern (largest frame-to-frame drop)
+        if len(self.diff_stats) >= 5:
+            closure_diff = self.diff_stats.min
             closure_score = min(1.0, abs(closure_diff) * 10)
         else:
             closure_score = 0.0
@@ -261,26 +290,18 @@ class MicrosleepClassifier:
         
         return final_score
 
-    def _detect_by_perclos(self, ear_values, threshold=0.2, window_size=90):
+    def _detect_by_perclos(self):
         """
-        Detect microsleep using a PERCLOS-like metric.
-        
-        Args:
-            ear_values (list): Recent eye aspect ratio values
-            threshold (float): Threshold for eye closure
-            window_size (int): Window size in frames
+        Detect microsleep using a PERCLOS-like metric over the last perclos_window frames.
             
         Returns:
             float: Score between 0.0 and 1.0 indicating microsleep probability
         """
-        if len(ear_values) < window_size / 2:
+        if len(self.perclos_buffer) < self.perclos_window / 2:
             return 0.0
-            
-        # Use most recent values
-        values = ear_values[-min(len(ear_values), window_size):]
         
         # Calculate percentage of frames with eyes closed
-        closed_percentage = sum(1 for ear in values if ear < threshold) / len(values)
+        closed_percentage = self.perclos_buffer.perclos
         
         # PERCLOS score
         # Over 80% = very likely microsleep
@@ -294,7 +315,7 @@ class MicrosleepClassifier:
         else:
             return 0.0
 
-    def _detect_by_wavelet(self, ear_values, min_oscillations=3):
+    def _detect_by_wavelet(self, min_oscillations=3):
         """
         Detect microsleep by looking for oscillatory patterns in EAR.
         
@@ -302,36 +323,31 @@ class MicrosleepClassifier:
         as they struggle to keep eyes open, creating a characteristic pattern.
         
         Args:
-            ear_values (list): Recent eye aspect ratio values
             min_oscillations (int): Minimum oscillations to detect
             
         Returns:
             float: Score between 0.0 and 1.0 indicating microsleep probability
         """
-        if len(ear_values) < 30:
+        # Uses the most recent oscillation_window frames (about 3 seconds at 30fps)
+        if len(self.oscillation) < 30:
             return 0.0
         
-        # Use the most recent 90 frames (about 3 seconds at 30fps)
-        values = ear_values[-min(len(ear_values), 90):]
-        
         # Detect oscillation pattern (alternating increasing/decreasing)
-        diffs = np.diff(values)
-        sign_changes = np.sum(np.diff(np.signbit(diffs)) != 0)
+        sign_changes = self.oscillation.sign_changes
         
         # Calculate oscillation score
         oscillation_score = min(1.0, sign_changes / (2 * min_oscillations))
         
         # Require evidence of overall decreasing trend
-        if len(values) >= 30:
-            start_mean = np.mean(values[:10])
-            end_mean = np.mean(values[-10:])
-            
-            decreasing_trend = start_mean > end_mean
-            trend_magnitude = min(1.0, (start_mean - end_mean) * 5)
-            
-            if decreasing_trend and trend_magnitude > 0.2:
-                # Boost oscillation score if there's a decreasing trend
-                oscillation_score *= (1 + trend_magnitude)
+        start_mean = self.oscillation.head_mean
+        end_mean = self.oscillation.tail_mean
+        
+        decreasing_trend = start_mean > end_mean
+        trend_magnitude = min(1.0, (start_mean - end_mean) * 5)
+        
+        if decreasing_trend and trend_magnitude > 0.2:
+            # Boost oscillation score if there's a decreasing trend
+            oscillation_score *= (1 + trend_magnitude)
                 
         return min(1.0, oscillation_score)
 
@@ -339,11 +355,16 @@ class MicrosleepClassifier:
         """Reset the classifier state for a new session."""
         self.blink_history.clear()
         self.microsleep_history.clear()
-        self.ear_history.clear()
-        self.pattern_buffer.clear()
         self.detection_buffer.clear()
         self.frame_times.clear()
         
+        self.pattern_stats.clear()
+        self.diff_stats.clear()
+        self.recent_stats.clear()
+        self.perclos_buffer.clear()
+        self.oscillation.clear()
+        self.last_ear = None
+        
         self.last_blink_time = time.time()
         self.awake_duration = 0
         self.detection_count = 0
@@ -0,0 +1,173 @@
+import sys
+import unittest
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+# Modul level ai (models/, utils/) bisa diimpor saat file ini dijalankan langsung
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from models.microsleep_classifier import MicrosleepClassifier
+
+FPS = 30
+BLINK_INTERVALS = [4.0, 4.5, 4.0, 4.5, 4.0, 4.5]
+
+
+def ear_sequence():
+    """Fixed EAR trace: alert with blinks, drowsy oscillation, a 2 second closure, then recovery."""
+    rng = np.random.default_rng(0)
+    alert = rng.normal(0.30, 0.01, 120)
+    for start in (20, 55, 95):
+        alert[start:start + 4] = [0.2, 0.12, 0.1, 0.21]
+    drowsy = 0.27 - np.linspace(0.0, 0.08, 90) + 0.03 * np.sin(np.arange(90) * 1.3)
+    closure = rng.normal(0.1, 0.01, 60)
+    recovery = rng.normal(0.29, 0.015, 90)
+    return np.concatenate((alert, drowsy, closure, recovery))
+
+
+def closed_durations(ears, threshold=0.2):
+    """Duration of the closure ending at every frame, in seconds."""
+    durations, run = [], 0
+    for ear in ears:
+        run = run + 1 if ear < threshold else 0
+        durations.append(run / FPS)
+    return durations
+
+
+def pattern_score(values):
+    """_detect_by_pattern of the original classifier, on an explicit window."""
+    if len(values) < 10:
+        return 0.0
+    ear_diffs = np.diff(values)
+    min_ear_score = max(0.0, min(1.0, 1.0 - (np.min(values) / 0.25)))
+    stability_score = 1.0 - min(1.0, np.std(values) * 10)
+    closure_score = min(1.0, abs(np.min(ear_diffs)) * 10) if len(ear_diffs) >= 5 else 0.0
+    return (min_ear_score * 0.6) + (stability_score * 0.3) + (closure_score * 0.1)
+
+
+def perclos_score(values, threshold=0.2, window_size=90):
+    """_detect_by_perclos of the original classifier, on an explicit window."""
+    if len(values) < window_size / 2:
+        return 0.0
+    values = values[-min(len(values), window_size):]
+    closed_percentage = np.mean(np.asarray(values) < threshold)
+    if closed_percentage > 0.8:
+        return 1.0
+    if closed_percentage > 0.4:
+        return (closed_percentage - 0.4) / 0.4
+    return 0.0
+
+
+def wavelet_score(values, min_oscillations=3):
+    """_detect_by_wavelet of the original classifier, on an explicit window."""
+    if len(values) < 30:
+        return 0.0
+    values = values[-min(len(values), 90):]
+    sign_changes = np.sum(np.diff(np.signbit(np.diff(values))) != 0)
+    oscillation_score = min(1.0, sign_changes / (2 * min_oscillations))
+    start_mean = np.mean(values[:10])
+    end_mean = np.mean(values[-10:])
+    trend_magnitude = min(1.0, (start_mean - end_mean) * 5)
+    if start_mean > end_mean and trend_magnitude > 0.2:
+        oscillation_score *= (1 + trend_magnitude)
+    return min(1.0, oscillation_score)
+
+
+def weighted_score(classifier, closed_duration, pattern, perclos, wavelet):
+    """Weighted method score as combined by predict()."""
+    methods_results = [
+        classifier._detect_by_duration(closed_duration),
+        pattern,
+        classifier._detect_by_blink_rate(BLINK_INTERVALS),
+        perclos,
+        wavelet,
+    ]
+    return sum(r * w for r, w in zip(methods_results, [0.35, 0.25, 0.15, 0.15, 0.1]))
+
+
+class Smoother:
+    """Temporal smoothing of predict(), applied to reference scores."""
+
+    def __init__(self, sensitivity):
+        self.threshold = 0.5 - (sensitivity * 0.3)
+        self.buffer = deque(maxlen=10)
+
+    def __call__(self, score):
+        self.buffer.append(score >= self.threshold)
+        return sum(self.buffer) >= (len(self.buffer) * 0.6)
+
+
+class MicrosleepClassifierTest(unittest.TestCase):
+    """Replay a fixed EAR trace and compare with brute-force NumPy on the same windows."""
+
+    def setUp(self):
+        self.ears = ear_sequence()
+        self.durations = closed_durations(self.ears)
+
+    def test_streamed_features_match_numpy_over_the_full_window(self):
+        classifier = MicrosleepClassifier()
+        smoother = Smoother(classifier.sensitivity)
+        results = []
+
+        for index, ear in enumerate(self.ears):
+            classifier.observe(ear, timestamp=index / FPS)
+            history = self.ears[:index + 1]
+
+            with self.subTest(frame=index):
+                self.assertAlmostEqual(classifier.perclos_buffer.perclos,
+                                       np.mean(history[-90:] < 0.2), places=12)
+                self.assertAlmostEqual(classifier._detect_by_perclos(), perclos_score(history), places=12)
+                self.assertAlmostEqual(classifier._detect_by_wavelet(), wavelet_score(history), places=9)
+                self.assertAlmostEqual(classifier._detect_by_pattern(), pattern_score(history[-30:]), places=9)
+
+                expected = False
+                if index + 1 >= 5:
+                    expected = smoother(weighted_score(
+                        classifier, self.durations[index], pattern_score(history[-30:]),
+                        perclos_score(history), wavelet_score(history)
+                    ))
+                results.append(classifier.predict(None, BLINK_INTERVALS, self.durations[index]))
+                self.assertEqual(results[-1], expected)
+
+        # Only the closure (frames 210-269) and its smoothing tail are detected
+        self.assertFalse(any(results[:210]))
+        self.assertTrue(all(results[240:270]))
+        self.assertAlmostEqual(classifier.estimated_fps, FPS, places=6)
+
+    def test_sliding_window_callers_only_gain_the_perclos_term(self):
+        # The original detector called predict() with the last 30 values, so its 90-frame
+        # PERCLOS check never ran while the oscillation check saw every predicted frame
+        classifier = MicrosleepClassifier()
+        old_smoother = Smoother(classifier.sensitivity)
+        perclos_active = deque(maxlen=10)  # Covers the frames in the smoothing window
+        perclos_frames = unaffected_frames = 0
+
+        for index in range(len(self.ears)):
+            history = self.ears[:index + 1]
+            recent_ears = history[-30:].tolist()
+            new_result = classifier.predict(recent_ears, BLINK_INTERVALS, self.durations[index])
+            if len(recent_ears) < 5:
+                continue
+
+            old_score = weighted_score(classifier, self.durations[index], pattern_score(recent_ears),
+                                       perclos_score(recent_ears), wavelet_score(history))
+            old_result = old_smoother(old_score)
+            new_score = old_score + 0.15 * perclos_score(history)
+            perclos_active.append(perclos_score(history) > 0.0)
+
+            with self.subTest(frame=index):
+                self.assertEqual(perclos_score(recent_ears), 0.0)
+                self.assertEqual(classifier.detection_buffer[-1], new_score >= old_smoother.threshold)
+                if any(perclos_active):
+                    perclos_frames += 1
+                else:
+                    unaffected_frames += 1
+                    self.assertEqual(new_result, old_result)
+
+        # The trace exercises both the unchanged states and the new PERCLOS contribution
+        self.assertGreater(unaffected_frames, 200)
+        self.assertGreater(perclos_frames, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
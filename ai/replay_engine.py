@@ -0,0 +1,341 @@
+import json
+import os
+import time
+
+import cv2 as cv
+import numpy as np
+
+from microsleep_detector import MicrosleepDetector
+from utils.inference_pool import FaceMeshProcessPool, PooledFaceMesh
+from utils.landmark_trace import LandmarkTraceReader
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+TRACE_EXTENSIONS = ('.npz', '.npy', '.csv')
+
+
+def load_trace(path):
+    """
+    Load a recorded landmark or EAR trace.
+
+    Supported formats:
+        .npz: array "landmarks" (T, N, 2) or "ear" (T,), optional "timestamps" (T,) and "fps"
+        .npy: a (T, N, 2) landmark array or a (T,) EAR array
+        .csv: header row with an "ear" column and an optional "timestamp" column
+
+    Frames without a face are NaN rows (landmarks) or NaN values (EAR).
+
+    Args:
+        path (str): Trace file
+
+    Returns:
+        dict: "landmarks" or "ear", plus "timestamps" and "fps" (None when absent)
+    """
+    trace = {"landmarks": None, "ear": None, "timestamps": None, "fps": None}
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == '.npz':
+        with np.load(path) as data:
+            for key in ("landmarks", "ear", "timestamps"):
+                if key in data:
+                    trace[key] = data[key]
+            if "fps" in data:
+                trace["fps"] = float(data["fps"])
+    elif extension == '.npy':
+        array = np.load(path)
+        trace["landmarks" if array.ndim == 3 else "ear"] = array
+    elif extension == '.csv':
+        table = np.genfromtxt(path, delimiter=',', names=True)
+        trace["ear"] = np.atleast_1d(table["ear"])
+        if "timestamp" in table.dtype.names:
+            trace["timestamps"] = np.atleast_1d(table["timestamp"])
+    else:
+        raise ValueError(f"Unsupported trace format: {path}")
+
+    if trace["landmarks"] is None and trace["ear"] is None:
+        raise ValueError(f"Trace {path} contains neither landmarks nor EAR values")
+    return trace
+
+
+class ReplayEngine:
+    """
+    Headless replay of recorded sessions through the full detection pipeline.
+
+    Drives FaceMeshGenerator, EyeAspectRatioAnalyzer, MicrosleepClassifier and
+    the alert state machine of a headless MicrosleepDetector from a video file,
+    an image directory, a chunked landmark trace directory (LandmarkTraceWriter)
+    or a landmark/EAR trace file. Frames are processed as fast as
+    the CPU allows; the detector's clock follows the recording (frame index /
+    fps, or the trace timestamps), so the same input and parameters always give
+    the same event log.
+    """
+
+    def __init__(self, source, fps=None, event_log=None, save_trace=None, workers=None, **detector_kwargs):
+        """
+        Initialize the replay engine.
+
+        Args:
+            source (str): Video file, directory of images, landmark trace directory,
+                          or trace file (.npz/.npy/.csv)
+            fps (float): Frame rate of the recording, or None to read it from the source (default 30)
+            event_log (str): Path of the JSON lines event log to write, or None
+            save_trace (str): Directory to cache the face mesh landmarks of a video or image
+                              replay in, so later replays can skip face mesh inference
+            workers (int): Run face mesh inference of a video or image replay on this many
+                           worker processes (static image mode), or None to run it in-process
+            **detector_kwargs: MicrosleepDetector parameters (ear_threshold, consec_frames,
+                               microsleep_frames, sensitivity, ...)
+        """
+        self.source = source
+        self.fps = fps
+        self.event_log = event_log
+        self.events = []
+
+        # Recording time of the current frame, read by the detector's clock
+        self._now = 0.0
+        self.pool = None
+        generator = None
+        if workers and not self._is_trace_source():
+            self.pool = FaceMeshProcessPool(workers)
+            generator = PooledFaceMesh(self.pool)
+        self.detector = MicrosleepDetector(
+            headless=True, clock=lambda: self._now, landmark_trace=save_trace, generator=generator,
+            **detector_kwargs
+        )
+
+        self._state_names = {v: k for k, v in MicrosleepDetector.ALERT_STATES.items()}
+
+    def run(self, max_frames=None):
+        """
+        Replay the source and collect the events.
+
+        Args:
+            max_frames (int): Stop after this many frames, or None for the whole source
+
+        Returns:
+            dict: Summary with frame, face, blink and microsleep counts and the replay speed
+        """
+        self.events = []
+        frames = 0
+        faces = 0
+        last_time = 0.0
+        start = time.perf_counter()
+
+        for index, (timestamp, ear, smoothed_ear) in enumerate(self._iter_ears()):
+            if max_frames is not None and index >= max_frames:
+                break
+
+            frames += 1
+            last_time = timestamp
+            self._now = timestamp
+            if ear is None:
+                continue
+
+            faces += 1
+            self._step(index, timestamp, ear, smoothed_ear)
+
+        elapsed = time.perf_counter() - start
+        detector = self.detector
+        summary = {
+            "source": self.source,
+            "frames": frames,
+            "frames_with_face": faces,
+            "duration_s": round(last_time, 3),
+            "blinks": detector.blink_counter,
+            "microsleeps": detector.microsleep_counter,
+            "adaptive_threshold": detector.adaptive_threshold,
+            "elapsed_s": round(elapsed, 3),
+            "replay_fps": round(frames / elapsed, 1) if elapsed > 0 else None,
+        }
+
+        if self.event_log:
+            self._write_event_log()
+
+        return summary
+
+    def release(self):
+        """Release the detector resources and the inference workers."""
+        self.detector.release_resources()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def _step(self, index, timestamp, ear, smoothed_ear):
+        """
+        Advance the alert state machine by one frame and record what changed.
+
+        Args:
+            index (int): Frame index in the source
+            timestamp (float): Recording time of the frame in seconds
+            ear (float): Average EAR
+            smoothed_ear (float): Smoothed EAR
+        """
+        detector = self.detector
+        blinks = detector.blink_counter
+        microsleeps = detector.microsleep_counter
+        state = detector.alert_state
+        calibrated = detector.calibration_complete
+
+        with detector.instrumentation.span("classification"):
+            detector.update_state(ear, smoothed_ear)
+
+        def record(event, **extra):
+            self.events.append({
+                "frame": index,
+                "time": round(timestamp, 3),
+                "event": event,
+                "state": self._state_names[detector.alert_state],
+                "ear": round(ear, 4),
+                "smoothed_ear": round(smoothed_ear, 4),
+                **extra
+            })
+
+        if not calibrated and detector.calibration_complete:
+            record("CALIBRATED", threshold=round(detector.adaptive_threshold, 4))
+        if detector.blink_counter != blinks:
+            record("BLINK")
+        if detector.microsleep_counter != microsleeps:
+            record("MICROSLEEP")
+        if detector.alert_state != state:
+            record("STATE", previous=self._state_names[state])
+
+    def _iter_ears(self):
+        """
+        Yield (timestamp, ear, smoothed_ear) for every frame of the source.
+
+        EAR values are None for frames without a face.
+        """
+        if LandmarkTraceReader.is_trace(self.source):
+            return self._iter_landmark_trace_ears()
+        if os.path.isdir(self.source):
+            return self._iter_frame_ears(self._iter_images())
+        if self.source.lower().endswith(TRACE_EXTENSIONS):
+            return self._iter_trace_ears()
+        return self._iter_frame_ears(self._iter_video())
+
+    def _is_trace_source(self):
+        """Check whether the source is replayed without face mesh inference."""
+        return LandmarkTraceReader.is_trace(self.source) or (
+            not os.path.isdir(self.source) and self.source.lower().endswith(TRACE_EXTENSIONS)
+        )
+
+    def _iter_video(self):
+        """Yield (timestamp, frame) from a video file."""
+        cap = cv.VideoCapture(self.source)
+        if not cap.isOpened():
+            raise IOError(f"Failed to open video {self.source}")
+
+        fps = self.fps or cap.get(cv.CAP_PROP_FPS) or 30
+        self._set_fps(fps)
+        try:
+            index = 0
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield index / fps, frame
+                index += 1
+        finally:
+            cap.release()
+
+    def _iter_images(self):
+        """Yield (timestamp, frame) from the images of a directory in name order."""
+        names = sorted(n for n in os.listdir(self.source) if n.lower().endswith(IMAGE_EXTENSIONS))
+        fps = self.fps or 30
+        self._set_fps(fps)
+        for index, name in enumerate(names):
+            frame = cv.imread(os.path.join(self.source, name))
+            if frame is not None:
+                yield index / fps, frame
+
+    def _iter_frame_ears(self, frames):
+        """Run face mesh and EAR analysis on decoded frames."""
+        generator = self.detector.generator
+        analyzer = self.detector.eye_analyzer
+        spans = self.detector.instrumentation
+        for timestamp, landmarks in self._iter_landmarks(generator, frames, spans):
+            if not landmarks:
+                yield timestamp, None, None
+                continue
+
+            with spans.span("ear"):
+                _, _, ear, smoothed_ear = analyzer.calculate_ear(landmarks)
+            yield timestamp, ear, smoothed_ear
+
+    def _iter_landmarks(self, generator, frames, spans):
+        """
+        Yield (timestamp, landmarks) for decoded frames in order.
+
+        With worker processes several frames are in flight at once; the face_mesh
+        span then measures the wait for each result rather than the inference.
+        """
+        if self.pool is not None:
+            results = generator.map(frames)
+            while True:
+                with spans.span("face_mesh"):
+                    result = next(results, None)
+                if result is None:
+                    return
+                yield result
+        else:
+            for timestamp, frame in frames:
+                with spans.span("face_mesh"):
+                    _, landmarks = generator.create_face_mesh(frame, draw=False, timestamp=timestamp)
+                yield timestamp, landmarks
+
+    def _iter_trace_ears(self):
+        """Replay a landmark or EAR trace; landmark EARs are computed in one batch."""
+        trace = load_trace(self.source)
+        analyzer = self.detector.eye_analyzer
+
+        if trace["landmarks"] is not None:
+            _, _, ears, _ = analyzer.calculate_ear_batch(trace["landmarks"])
+        else:
+            ears = np.asarray(trace["ear"], dtype=np.float64)
+
+        fps = self.fps or trace["fps"] or 30
+        self._set_fps(fps)
+        timestamps = trace["timestamps"]
+        if timestamps is None:
+            timestamps = np.arange(len(ears)) / fps
+        else:
+            timestamps = np.asarray(timestamps, dtype=np.float64) - timestamps[0]
+
+        for timestamp, ear in zip(timestamps.tolist(), ears.tolist()):
+            if np.isnan(ear):
+                yield timestamp, None, None
+                continue
+            yield timestamp, ear, analyzer.track_ear(ear)
+
+    def _iter_landmark_trace_ears(self):
+        """Replay a chunked landmark trace, one memory-mapped chunk at a time."""
+        reader = LandmarkTraceReader(self.source)
+        analyzer = self.detector.eye_analyzer
+        self._set_fps(self.fps or reader.fps or 30)
+
+        origin = None
+        for chunk in reader.iter_chunks():
+            # EAR of the whole chunk in one vectorized pass, straight from the memory map
+            _, _, ears, _ = analyzer.calculate_ear_batch(chunk.landmarks)
+            timestamps = np.asarray(chunk.timestamps)
+            if origin is None and len(timestamps):
+                origin = timestamps[0]
+
+            for timestamp, detected, ear in zip((timestamps - origin).tolist(), chunk.detected.tolist(), ears.tolist()):
+                if not detected:
+                    yield timestamp, None, None
+                    continue
+                yield timestamp, ear, analyzer.track_ear(ear)
+
+    def _set_fps(self, fps):
+        """Use the recording frame rate for durations measured in frames."""
+        self.fps = fps
+        self.detector.set_fps(fps)
+
+    def _write_event_log(self):
+        """Write the collected events as JSON lines."""
+        directory = os.path.dirname(self.event_log)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.event_log, 'w', encoding='utf-8') as f:
+            for event in self.events:
+                f.write(json.dumps(event) + "\n")
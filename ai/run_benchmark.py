@@ -0,0 +1,423 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+import cv2 as cv
+import numpy as np
+
+from eye_analyzer import EyeAspectRatioAnalyzer
+from microsleep_detector import MicrosleepDetector
+from models.microsleep_classifier import MicrosleepClassifier
+from utils.landmarks import FaceLandmarks
+
+# Stages in pipeline order
+STAGES = [
+    "bgr_to_rgb",
+    "face_mesh_process",
+    "landmark_extraction",
+    "ear",
+    "classifier",
+    "state_machine",
+    "overlay",
+    "plot_render",
+    "encode_jpeg",
+]
+
+# Stages whose cost depends on a face being found; a clip without faces (such as the
+# synthetic one) only measures face mesh rejecting the frame and never extracts landmarks
+FACE_STAGES = ["face_mesh_process", "landmark_extraction"]
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Microsleep Detector Stage Benchmark")
+    parser.add_argument("--source", type=str, default=None,
+                        help="Video file to replay (default: synthetic clip without a real face)")
+    parser.add_argument("--frames", type=int, default=300,
+                        help="Number of measured frames (default: 300)")
+    parser.add_argument("--warmup", type=int, default=20,
+                        help="Frames processed before measuring (default: 20)")
+    parser.add_argument("--width", type=int, default=640,
+                        help="Synthetic clip width (default: 640)")
+    parser.add_argument("--height", type=int, default=480,
+                        help="Synthetic clip height (default: 480)")
+    parser.add_argument("--no_plot", action="store_true",
+                        help="Skip the plot rendering stage")
+    parser.add_argument("--plot_backend", type=str, default="matplotlib", choices=["matplotlib", "opencv"],
+                        help="EAR plot backend to measure (default: matplotlib)")
+    parser.add_argument("--no_alloc", action="store_true",
+                        help="Skip the allocation measurement pass")
+    parser.add_argument("--output", type=str, default="DATA/BENCHMARKS/benchmark.json",
+                        help="Result file (default: DATA/BENCHMARKS/benchmark.json)")
+    parser.add_argument("--compare", type=str, default=None,
+                        help="Earlier result file to compare the latencies against")
+
+    return parser.parse_args()
+
+
+def load_clip(source, frames, width, height):
+    """
+    Load the benchmark clip into memory so decoding is not measured.
+
+    Args:
+        source (str): Video file, or None for a deterministic synthetic clip
+        frames (int): Maximum number of frames
+        width (int): Synthetic frame width
+        height (int): Synthetic frame height
+
+    Returns:
+        list: BGR frames
+    """
+    if source:
+        cap = cv.VideoCapture(source)
+        if not cap.isOpened():
+            raise IOError(f"Failed to open video {source}")
+        clip = []
+        while len(clip) < frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            clip.append(frame)
+        cap.release()
+        if not clip:
+            raise IOError(f"No frames decoded from {source}")
+        return clip
+
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 60, (height, width, 3), dtype=np.uint8)
+    clip = []
+    for i in range(frames):
+        frame = background.copy()
+        center = (width // 2 + int(20 * np.sin(i / 15)), height // 2)
+        cv.ellipse(frame, center, (width // 6, height // 4), 0, 0, 360, (150, 170, 200), cv.FILLED)
+        clip.append(frame)
+    return clip
+
+
+def synthetic_landmarks(index, width, height, num_landmarks=468):
+    """
+    Build plausible landmarks for frames without a detected face, so the
+    stages after face mesh are still measured on synthetic clips.
+
+    Args:
+        index (int): Frame index, drives a periodic blink
+        width (int): Frame width
+        height (int): Frame height
+        num_landmarks (int): Landmarks per face
+
+    Returns:
+        FaceLandmarks: Landmarks with eyes opening and closing over time
+    """
+    rng = np.random.default_rng(index)
+    points = np.column_stack((
+        rng.integers(width // 3, 2 * width // 3, num_landmarks),
+        rng.integers(height // 4, 3 * height // 4, num_landmarks),
+    )).astype(np.int32)
+
+    opening = 8 if index % 90 > 6 else 1
+    y = height // 2 - 40
+    eyes = ((EyeAspectRatioAnalyzer.RIGHT_EYE_EAR, width // 2 - 60), (EyeAspectRatioAnalyzer.LEFT_EYE_EAR, width // 2 + 20))
+    for (p1, p2, p3, p4, p5, p6), x0 in eyes:
+        points[p1] = (x0, y)
+        points[p4] = (x0 + 40, y)
+        points[p2] = (x0 + 13, y - opening)
+        points[p3] = (x0 + 27, y - opening)
+        points[p5] = (x0 + 27, y + opening)
+        points[p6] = (x0 + 13, y + opening)
+    return FaceLandmarks(points)
+
+
+class StageRecorder:
+    """
+    Run pipeline stages and record their latency or their memory allocations.
+
+    Timing and allocation tracking are separate passes: tracemalloc slows every
+    allocation down and would distort the latencies.
+    """
+
+    def __init__(self, trace_allocations=False):
+        """
+        Initialize the recorder.
+
+        Args:
+            trace_allocations (bool): Record traced memory instead of latency
+        """
+        self.trace_allocations = trace_allocations
+        self.enabled = True
+        self.latencies = {stage: [] for stage in STAGES}
+        self.peak_bytes = {stage: [] for stage in STAGES}
+        self.retained_bytes = {stage: [] for stage in STAGES}
+
+    def __call__(self, stage, func, *args):
+        """
+        Run one stage.
+
+        Args:
+            stage (str): Stage name
+            func (callable): Stage function
+            *args: Arguments of the stage function
+
+        Returns:
+            Whatever the stage function returns
+        """
+        if not self.enabled:
+            return func(*args)
+
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            result = func(*args)
+            current, peak = tracemalloc.get_traced_memory()
+            self.peak_bytes[stage].append(peak - before)
+            self.retained_bytes[stage].append(current - before)
+            return result
+
+        start = time.perf_counter_ns()
+        result = func(*args)
+        self.latencies[stage].append(time.perf_counter_ns() - start)
+        return result
+
+
+class BenchmarkPipeline:
+    """The detector's per-frame work split into individually measurable stages."""
+
+    def __init__(self, fps=30, plot=True, plot_backend="matplotlib"):
+        """
+        Initialize the pipeline on a headless detector.
+
+        Args:
+            fps (float): Frame rate used for the detector's clock
+            plot (bool): Whether to include the plot rendering stage
+            plot_backend (str): EAR plot backend, "matplotlib" or "opencv"
+        """
+        self.fps = fps
+        self.plot = plot
+        self.frame_index = 0
+        self.faces_detected = 0
+
+        self.detector = MicrosleepDetector(
+            headless=True, clock=lambda: self.frame_index / self.fps, plot_backend=plot_backend
+        )
+        self.detector.set_fps(fps)
+        if plot:
+            # Headless mode switches the plot off; render it off-screen for the plot stage
+            self.detector.display_plot = True
+            self.detector._init_plot()
+
+        # Standalone classifier so its cost is measured on every frame, not only during closures
+        self.classifier = MicrosleepClassifier()
+        self.blink_intervals = [2.5, 3.0, 3.4, 4.1]
+
+    def process(self, frame, record):
+        """
+        Run every stage on one frame.
+
+        Args:
+            frame (np.ndarray): BGR frame
+            record (StageRecorder): Recorder that runs the stages
+        """
+        detector = self.detector
+        generator = detector.generator
+        img_h, img_w = frame.shape[:2]
+
+        rgb = record("bgr_to_rgb", cv.cvtColor, frame, cv.COLOR_BGR2RGB)
+        results = record("face_mesh_process", generator.face_mesh.process, rgb)
+
+        if results.multi_face_landmarks:
+            self.faces_detected += 1
+            landmarks = record("landmark_extraction", generator._to_pixel_landmarks,
+                               results.multi_face_landmarks[0], img_w, img_h)
+        else:
+            landmarks = synthetic_landmarks(self.frame_index, img_w, img_h)
+
+        _, _, ear, smoothed_ear = record("ear", detector.eye_analyzer.calculate_ear, landmarks)
+        record("classifier", self._classify, ear)
+        record("state_machine", detector.update_state, ear, smoothed_ear)
+
+        output = frame.copy()
+        threshold = detector.adaptive_threshold if detector.calibration_complete else detector.EAR_THRESHOLD
+        color = detector.COLORS['GREEN']['bgr']
+        record("overlay", detector._draw_frame_elements, output, landmarks, ear, smoothed_ear, threshold, color)
+
+        if self.plot:
+            record("plot_render", self._render_plot, ear, smoothed_ear)
+
+        record("encode_jpeg", cv.imencode, ".jpg", output)
+        self.frame_index += 1
+
+    def _classify(self, ear):
+        """Feed the standalone classifier and ask for a prediction."""
+        self.classifier.observe(ear, timestamp=self.frame_index / self.fps)
+        return self.classifier.predict(None, self.blink_intervals, 0.5)
+
+    def _render_plot(self, ear, smoothed_ear):
+        """Redraw the EAR plot and convert it to an image."""
+        self.detector._update_plot(ear, smoothed_ear)
+        return self.detector.plot_to_image()
+
+
+def summarize(recorder, alloc_recorder=None):
+    """
+    Reduce the recorded samples to per-stage statistics.
+
+    Args:
+        recorder (StageRecorder): Timing pass
+        alloc_recorder (StageRecorder): Allocation pass, or None
+
+    Returns:
+        dict: Stage name mapped to its statistics; stages that never ran are omitted
+    """
+    stages = {}
+    for stage in STAGES:
+        samples = np.array(recorder.latencies[stage], dtype=np.float64) / 1e6
+        if len(samples) == 0:
+            continue
+
+        mean_ms = float(samples.mean())
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        stats = {
+            "calls": len(samples),
+            "throughput_per_s": round(1000.0 / mean_ms, 1) if mean_ms > 0 else None,
+            "mean_ms": round(mean_ms, 4),
+            "p50_ms": round(float(p50), 4),
+            "p95_ms": round(float(p95), 4),
+            "p99_ms": round(float(p99), 4),
+            "max_ms": round(float(samples.max()), 4),
+        }
+
+        if alloc_recorder is not None and alloc_recorder.peak_bytes[stage]:
+            stats["alloc_peak_kb"] = round(float(np.mean(alloc_recorder.peak_bytes[stage])) / 1024, 2)
+            stats["alloc_retained_kb"] = round(float(np.mean(alloc_recorder.retained_bytes[stage])) / 1024, 2)
+
+        stages[stage] = stats
+    return stages
+
+
+def environment_info():
+    """
+    Describe the code and machine the benchmark ran on.
+
+    Returns:
+        dict: Commit, platform and library versions
+    """
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        commit = None
+
+    return {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv.__version__,
+    }
+
+
+def compare(result, baseline_path):
+    """
+    Print the latency change of every stage against an earlier result.
+
+    Args:
+        result (dict): Current result
+        baseline_path (str): Earlier result file
+    """
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    # Face stages measured on a clip without faces say nothing about the real face path
+    absent = set(result.get("absent_stages", [])) | set(baseline.get("absent_stages", []))
+
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('environment', {}).get('commit')}):")
+    for stage, stats in result["stages"].items():
+        old = baseline.get("stages", {}).get(stage)
+        if not old:
+            continue
+        if stage in absent:
+            print(f"  {stage:<20} not compared (no face detected)")
+            continue
+        changes = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if old.get(key):
+                changes.append(f"{key[:3]} {100.0 * (stats[key] - old[key]) / old[key]:+6.1f}%")
+        print(f"  {stage:<20} " + "  ".join(changes))
+
+
+def main():
+    """Benchmark every detector stage and write the results"""
+    args = parse_arguments()
+
+    clip = load_clip(args.source, args.warmup + args.frames, args.width, args.height)
+    pipeline = BenchmarkPipeline(plot=not args.no_plot, plot_backend=args.plot_backend)
+
+    # Warm up caches, lazily allocated buffers and the face mesh graph
+    recorder = StageRecorder()
+    recorder.enabled = False
+    for i in range(args.warmup):
+        pipeline.process(clip[i % len(clip)], recorder)
+
+    recorder.enabled = True
+    pipeline.faces_detected = 0
+    start = time.perf_counter()
+    for i in range(args.frames):
+        pipeline.process(clip[(args.warmup + i) % len(clip)], recorder)
+    elapsed = time.perf_counter() - start
+    faces_detected = pipeline.faces_detected
+
+    alloc_recorder = None
+    if not args.no_alloc:
+        alloc_recorder = StageRecorder(trace_allocations=True)
+        tracemalloc.start()
+        try:
+            for i in range(min(args.frames, 50)):
+                pipeline.process(clip[i % len(clip)], alloc_recorder)
+        finally:
+            tracemalloc.stop()
+
+    result = {
+        "benchmark": "microsleep_detector_stages",
+        "environment": environment_info(),
+        "source": args.source or f"synthetic {args.width}x{args.height}",
+        "frames": args.frames,
+        "plot_backend": None if args.no_plot else args.plot_backend,
+        "frames_with_face": faces_detected,
+        "absent_stages": FACE_STAGES if faces_detected == 0 else [],
+        "end_to_end_fps": round(args.frames / elapsed, 1),
+        "stages": summarize(recorder, alloc_recorder),
+    }
+    pipeline.detector.release_resources()
+
+    print(f"\n{'stage':<20} {'per s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'alloc KB':>9}")
+    for stage, stats in result["stages"].items():
+        alloc = stats.get("alloc_peak_kb", "")
+        print(f"{stage:<20} {stats['throughput_per_s']:>9} {stats['p50_ms']:>9} "
+              f"{stats['p95_ms']:>9} {stats['p99_ms']:>9} {alloc:>9}")
+    print(f"\nEnd-to-end: {result['end_to_end_fps']} fps over {args.frames} frames "
+          f"({faces_detected} with a detected face)")
+    if result["absent_stages"]:
+        print(f"No face detected: {', '.join(result['absent_stages'])} did not measure the face path; "
+              f"use --source with a clip of a face")
+
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        compare(result, args.compare)
+
+
+if __name__ == "__main__":
+    main()
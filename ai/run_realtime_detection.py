@@ -15,8 +15,12 @@ def parse_arguments():
                         help="Camera device index (default: 0)")
     parser.add_argument("--record", action="store_true",
                         help="Record the detection session")
+    parser.add_argument("--save_landmarks", type=str, default=None,
+                        help="Save the face mesh landmarks of every frame to this trace directory")
     parser.add_argument("--display_plot", action="store_true", default=True,
                         help="Display the EAR plot")
+    parser.add_argument("--plot_backend", type=str, default="matplotlib", choices=["matplotlib", "opencv"],
+                        help="EAR plot renderer; opencv draws the chart natively and is much cheaper (default: matplotlib)")
     parser.add_argument("--sensitivity", type=float, default=0.8,
                         help="Detection sensitivity (0.0-1.0, default: 0.8)")
     parser.add_argument("--audio", action="store_true", default=True,
@@ -29,6 +33,20 @@ def parse_arguments():
                         help="Route information (default: Jakarta-Bandung)")
     parser.add_argument("--server_url", type=str, default="http://127.0.0.1:5001/vision",
                         help="Server URL (default: http://127.0.0.1:5001/vision)")
+    parser.add_argument("--sequential", action="store_true",
+                        help="Process frames on a single thread instead of the capture/inference/render pipeline")
+    parser.add_argument("--adaptive_rate", action="store_true",
+                        help="Lower the face mesh inference rate and resolution when the device falls behind")
+    parser.add_argument("--roi_tracking", action="store_true",
+                        help="Run face mesh only on the face region of the previous frame")
+    parser.add_argument("--instrument", action="store_true",
+                        help="Time every pipeline stage and show the timings on the frame")
+    parser.add_argument("--metrics_file", type=str, default=None,
+                        help="Periodically dump the stage timings to this file")
+    parser.add_argument("--metrics_format", type=str, default="json", choices=["json", "prometheus"],
+                        help="Format of the metrics dump (default: json)")
+    parser.add_argument("--metrics_interval", type=float, default=10.0,
+                        help="Seconds between metrics dumps (default: 10)")
     
     return parser.parse_args()
 
@@ -43,13 +61,19 @@ def main():
     print(f"Consecutive Frames for Microsleep: {args.microsleep_frames}")
     print(f"Camera: {args.camera}")
     print(f"Recording: {'Enabled' if args.record else 'Disabled'}")
-    print(f"Display Plot: {'Enabled' if args.display_plot else 'Disabled'}")
+    print(f"Landmark Trace: {args.save_landmarks or 'Disabled'}")
+    print(f"Display Plot: {'Enabled (' + args.plot_backend + ')' if args.display_plot else 'Disabled'}")
     print(f"Audio Alerts: {'Enabled' if args.audio else 'Disabled'}")
     print(f"Sensitivity: {args.sensitivity}")
     print(f"Driver Name: {args.driver_name}")
     print(f"Armada: {args.armada}")
     print(f"Route: {args.rute}")
     print(f"Server URL: {args.server_url}")
+    print(f"Pipeline: {'Sequential' if args.sequential else 'Threaded'}")
+    print(f"Adaptive Inference Rate: {'Enabled' if args.adaptive_rate else 'Disabled'}")
+    print(f"Face ROI Tracking: {'Enabled' if args.roi_tracking else 'Disabled'}")
+    print(f"Instrumentation: {'Overlay' if args.instrument else 'Disabled'}")
+    print(f"Metrics File: {args.metrics_file or 'Disabled'}")
     print("================================================\n")
     
     print("Starting detection system...")
@@ -64,12 +88,21 @@ def main():
         microsleep_frames=args.microsleep_frames,
         save_video=args.record,
         display_plot=args.display_plot,
+        plot_backend=args.plot_backend,
         enable_audio=args.audio,
         sensitivity=args.sensitivity,
         driver_name=args.driver_name,
         armada=args.armada,
         rute=args.rute,
-        server_url=args.server_url
+        server_url=args.server_url,
+        threaded_pipeline=not args.sequential,
+        adaptive_rate=args.adaptive_rate,
+        roi_tracking=args.roi_tracking,
+        landmark_trace=args.save_landmarks,
+        instrument=args.instrument,
+        metrics_path=args.metrics_file,
+        metrics_interval=args.metrics_interval,
+        metrics_format=args.metrics_format
     )
     
     # Run the detector
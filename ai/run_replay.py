@@ -0,0 +1,65 @@
+import argparse
+import json
+from replay_engine import ReplayEngine
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Offline Microsleep Detection Replay")
+    parser.add_argument("source", type=str,
+                        help="Video file, image directory, landmark trace directory, or landmark/EAR trace (.npz, .npy, .csv)")
+    parser.add_argument("--fps", type=float, default=None,
+                        help="Frame rate of the recording (default: from the source, else 30)")
+    parser.add_argument("--events", type=str, default=None,
+                        help="Write the event log to this JSON lines file")
+    parser.add_argument("--save_trace", type=str, default=None,
+                        help="Cache the face mesh landmarks of a video/image replay in this directory")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Run face mesh inference on this many worker processes (default: in-process)")
+    parser.add_argument("--roi_tracking", action="store_true",
+                        help="Run face mesh only on the face region of the previous frame (in-process only)")
+    parser.add_argument("--max_frames", type=int, default=None,
+                        help="Stop after this many frames")
+    parser.add_argument("--threshold", type=float, default=0.21,
+                        help="Initial EAR threshold for blink detection (default: 0.21)")
+    parser.add_argument("--consec_frames", type=int, default=2,
+                        help="Number of consecutive frames for blink detection (default: 2)")
+    parser.add_argument("--microsleep_frames", type=int, default=15,
+                        help="Number of consecutive frames for microsleep detection (default: 15)")
+    parser.add_argument("--sensitivity", type=float, default=0.8,
+                        help="Detection sensitivity (0.0-1.0, default: 0.8)")
+    parser.add_argument("--metrics_file", type=str, default=None,
+                        help="Write the stage timings of the replay to this JSON file")
+
+    return parser.parse_args()
+
+def main():
+    """Replay a recorded session through the detector and print the summary"""
+    args = parse_arguments()
+
+    engine = ReplayEngine(
+        args.source,
+        fps=args.fps,
+        event_log=args.events,
+        save_trace=args.save_trace,
+        workers=args.workers,
+        roi_tracking=args.roi_tracking,
+        ear_threshold=args.threshold,
+        consec_frames=args.consec_frames,
+        microsleep_frames=args.microsleep_frames,
+        sensitivity=args.sensitivity,
+        instrument=args.metrics_file is not None
+    )
+
+    try:
+        summary = engine.run(max_frames=args.max_frames)
+        if args.metrics_file:
+            engine.detector.instrumentation.dump(args.metrics_file)
+    finally:
+        engine.release()
+
+    print(json.dumps(summary, indent=2))
+    if args.events:
+        print(f"{len(engine.events)} events written to {args.events}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+from detection_service import DetectionService, load_stream_config
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Multi-Camera Microsleep Detection Service")
+    parser.add_argument("--config", type=str, default=None,
+                        help="JSON list of streams ({\"source\", \"driver_name\", \"armada\", \"rute\"})")
+    parser.add_argument("--source", type=str, action="append", default=[],
+                        help="Camera index, video file or stream URL; repeat for more streams")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Inference workers (default: one per stream, up to the CPU count)")
+    parser.add_argument("--backend", type=str, default="threads", choices=DetectionService.BACKENDS,
+                        help="Run inference on worker threads or worker processes (default: threads)")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="Stop after this many seconds (default: until the streams end)")
+    parser.add_argument("--report_interval", type=float, default=10.0,
+                        help="Seconds between statistics reports (default: 10)")
+    parser.add_argument("--stats_file", type=str, default=None,
+                        help="Rewrite this JSON file with the statistics at every report")
+    parser.add_argument("--threshold", type=float, default=0.21,
+                        help="Initial EAR threshold for blink detection (default: 0.21)")
+    parser.add_argument("--consec_frames", type=int, default=2,
+                        help="Number of consecutive frames for blink detection (default: 2)")
+    parser.add_argument("--microsleep_frames", type=int, default=15,
+                        help="Number of consecutive frames for microsleep detection (default: 15)")
+    parser.add_argument("--sensitivity", type=float, default=0.8,
+                        help="Detection sensitivity (0.0-1.0, default: 0.8)")
+    parser.add_argument("--server_url", type=str, default=None,
+                        help="Backend /vision endpoint for status uploads (default: disabled)")
+
+    return parser.parse_args()
+
+def main():
+    """Run the detection service over every configured stream"""
+    args = parse_arguments()
+
+    streams = load_stream_config(args.config) if args.config else []
+    streams += [{"source": source, "driver_name": f"Driver {len(streams) + i + 1}"}
+                for i, source in enumerate(args.source)]
+    if not streams:
+        raise SystemExit("No streams configured; use --config or --source")
+
+    service = DetectionService(
+        streams,
+        workers=args.workers,
+        server_url=args.server_url,
+        backend=args.backend,
+        ear_threshold=args.threshold,
+        consec_frames=args.consec_frames,
+        microsleep_frames=args.microsleep_frames,
+        sensitivity=args.sensitivity
+    )
+
+    print(f"Monitoring {len(streams)} streams on {service.worker_count} inference workers. "
+          "Press Ctrl+C to stop.")
+    try:
+        service.run(duration=args.duration, report_interval=args.report_interval, report_path=args.stats_file)
+    except KeyboardInterrupt:
+        # run() has already stopped the streams on its way out
+        print("\nDetection service stopped (keyboard interrupt).")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
+from collections import OrderedDict
+
 import cv2 as cv
 import numpy as np
 
+from utils.landmarks import FaceLandmarks
+
 class DrawingUtils:
     """Utility class for drawing operations for visualization in the microsleep detection system."""
 
@@ -161,25 +165,27 @@ class DrawingUtils:
         
         Args:
             frame (np.ndarray): Input image
-            landmarks (dict): Dictionary of facial landmarks
+            landmarks (FaceLandmarks or dict): Facial landmarks
             landmark_indices (list): List of indices to include in the rectangle
             padding (int): Padding around landmarks
             color (tuple): Rectangle color
             thickness (int): Line thickness
         """
-        # Check if all landmarks are present
-        if not all(idx in landmarks for idx in landmark_indices):
-            return
-            
-        # Get coordinates of landmarks
-        x_coords = [landmarks[idx][0] for idx in landmark_indices]
-        y_coords = [landmarks[idx][1] for idx in landmark_indices]
+        # Check if all landmarks are present and get their coordinates
+        if isinstance(landmarks, FaceLandmarks):
+            if not landmarks.has_all(landmark_indices):
+                return
+            coords = landmarks.gather(landmark_indices)
+        else:
+            if not all(idx in landmarks for idx in landmark_indices):
+                return
+            coords = np.array([landmarks[idx] for idx in landmark_indices])
         
         # Calculate bounding box with padding
-        x_min = max(0, min(x_coords) - padding)
-        y_min = max(0, min(y_coords) - padding)
-        x_max = min(frame.shape[1], max(x_coords) + padding)
-        y_max = min(frame.shape[0], max(y_coords) + padding)
+        x_min = max(0, int(coords[:, 0].min()) - padding)
+        y_min = max(0, int(coords[:, 1].min()) - padding)
+        x_max = min(frame.shape[1], int(coords[:, 0].max()) + padding)
+        y_max = min(frame.shape[0], int(coords[:, 1].max()) + padding)
         
         # Draw rectangle
         cv.rectangle(frame, (x_min, y_min), (x_max, y_max), color, thickness)
@@ -231,4 +237,139 @@ class DrawingUtils:
             color, 
             1, 
             cv.LINE_AA
-        )
\ No newline at end of file
+        )
+
+
+class HudCompositor:
+    """
+    Heads-up display drawn from cached label sprites.
+    
+    Every label is rasterized once into a small tile, a sprite keyed by its text
+    and style, and blitted onto the frame afterwards. Each named field remembers
+    its last sprite, so an unchanged field costs only the blit, and a changed
+    field looks its new text up in an LRU cache before rendering it (counters
+    and states cycle through a few values). Labels with a background are opaque
+    and copied; labels without one carry an anti-aliased alpha mask and are
+    blended.
+    """
+    
+    def __init__(self, cache_size=256):
+        """
+        Initialize the compositor.
+        
+        Args:
+            cache_size (int): Maximum number of sprites kept in the LRU cache
+        """
+        self.cache_size = cache_size
+        self._sprites = OrderedDict()
+        self._fields = {}
+        
+        # Sprites rasterized and cache hits, for profiling
+        self.renders = 0
+        self.hits = 0
+    
+    def draw_label(
+        self,
+        frame,
+        field,
+        text,
+        pos,
+        font=cv.FONT_HERSHEY_SIMPLEX,
+        font_scale=0.7,
+        thickness=2,
+        bg_color=(255, 255, 255),
+        text_color=(0, 0, 0),
+        line_type=cv.LINE_AA
+    ):
+        """
+        Draw a label like DrawingUtils.draw_text_with_bg, from a cached sprite.
+        
+        Args:
+            frame (np.ndarray): Input image
+            field (str): Name of the HUD field the label shows
+            text (str): Text to display
+            pos (tuple): Position (x, y) of the text baseline origin
+            font: OpenCV font
+            font_scale (float): Font size scale
+            thickness (int): Line thickness
+            bg_color (tuple): Background color in BGR, or None for text only
+            text_color (tuple): Text color in BGR
+            line_type (int): OpenCV line type of the text
+        """
+        key = (text, font, font_scale, thickness, bg_color, text_color, line_type)
+        last = self._fields.get(field)
+        if last is None or last[0] != key:
+            last = self._fields[field] = (key, self._sprite(key))
+        
+        tile, alpha, (dx, dy) = last[1]
+        self._blit(frame, tile, alpha, pos[0] + dx, pos[1] + dy)
+    
+    def clear(self):
+        """Drop every cached sprite and field."""
+        self._sprites.clear()
+        self._fields.clear()
+    
+    def _sprite(self, key):
+        """
+        Get the sprite of a label from the LRU cache, rendering it on a miss.
+        
+        Args:
+            key (tuple): (text, font, font_scale, thickness, bg_color, text_color, line_type)
+            
+        Returns:
+            tuple: (tile, alpha, offset) with alpha None for opaque tiles and offset
+                   from the text origin to the tile's top-left corner
+        """
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+        
+        sprite = self._sprites[key] = self._render(*key)
+        self.renders += 1
+        if len(self._sprites) > self.cache_size:
+            self._sprites.popitem(last=False)
+        return sprite
+    
+    @staticmethod
+    def _render(text, font, font_scale, thickness, bg_color, text_color, line_type):
+        """Rasterize a label into a tile, laid out like draw_text_with_bg."""
+        (text_width, text_height), baseline = cv.getTextSize(text, font, font_scale, thickness)
+        
+        if bg_color is not None:
+            # The background rectangle spans baseline pixels above the text and below the baseline
+            height = text_height + 2 * baseline + 1
+            tile = np.empty((height, text_width + 1, 3), dtype=np.uint8)
+            tile[:] = bg_color
+            cv.putText(tile, text, (0, text_height + baseline), font, font_scale, text_color, thickness,
+                       lineType=line_type)
+            return tile, None, (0, -text_height - baseline)
+        
+        # Text only: stroke width can reach past the measured box, so pad by the thickness
+        pad = thickness
+        height = text_height + baseline + 2 * pad + 1
+        mask = np.zeros((height, text_width + 2 * pad + 1), dtype=np.uint8)
+        cv.putText(mask, text, (pad, text_height + pad), font, font_scale, 255, thickness, lineType=line_type)
+        
+        # Premultiplied color and inverse alpha, so a blit is one multiply-add
+        alpha = mask[..., None].astype(np.uint16)
+        tile = (np.array(text_color, dtype=np.uint16) * alpha, 255 - alpha)
+        return tile, alpha, (-pad, -text_height - pad)
+    
+    @staticmethod
+    def _blit(frame, tile, alpha, x, y):
+        """Copy or blend a tile onto the frame at (x, y), clipped to the frame."""
+        tile_h, tile_w = (tile if alpha is None else alpha).shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + tile_w, frame.shape[1]), min(y + tile_h, frame.shape[0])
+        if x0 >= x1 or y0 >= y1:
+            return
+        
+        region = frame[y0:y1, x0:x1]
+        crop = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+        if alpha is None:
+            region[:] = tile[crop]
+        else:
+            color, inverse = tile
+            region[:] = (region * inverse[crop] + color[crop] + 127) // 255
@@ -0,0 +1,282 @@
+import math
+
+import cv2 as cv
+import numpy as np
+
+# Plot colors in BGR, matching the hex colors of the matplotlib chart
+BLUE = (252, 41, 3)
+RED = (2, 2, 247)
+YELLOW = (15, 231, 249)
+WHITE = (255, 255, 255)
+GRID = (124, 123, 112)
+
+
+def plot_limits(frame_numbers, ear_values):
+    """
+    Compute the axis limits of the live EAR chart.
+
+    The x range slides with the plotted frames and the y range follows the
+    observed EAR values, clamped to a sensible EAR range with a minimum span so
+    noise is not zoomed in on. Both plot backends use these rules.
+
+    Args:
+        frame_numbers (sequence): Plotted frame numbers, in increasing order
+        ear_values (np.ndarray): Plotted EAR values
+
+    Returns:
+        tuple: ((x_min, x_max), (y_min, y_max))
+    """
+    x_limits = (0, 180)
+    if len(frame_numbers) > 1:
+        x_min = frame_numbers[0]
+        x_max = frame_numbers[-1]
+        margin = max(5, int((x_max - x_min) * 0.1))
+        x_limits = (x_min - margin, x_max + margin)
+
+    y_limits = (0.15, 0.4)
+    if len(ear_values) > 0:
+        ear_min = float(ear_values.min())
+        ear_max = float(ear_values.max())
+        margin = (ear_max - ear_min) * 0.1
+
+        y_min = max(0.1, ear_min - margin)
+        y_max = min(0.5, ear_max + margin)
+        if y_max - y_min < 0.1:
+            y_center = (y_min + y_max) / 2
+            y_min = y_center - 0.05
+            y_max = y_center + 0.05
+        y_limits = (y_min, y_max)
+
+    return x_limits, y_limits
+
+
+def _nice_ticks(low, high, target=6):
+    """
+    Pick round tick values covering a range.
+
+    Args:
+        low (float): Lower limit
+        high (float): Upper limit
+        target (int): Approximate number of ticks
+
+    Returns:
+        tuple: (tick values, tick step)
+    """
+    raw_step = (high - low) / target
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    for multiple in (1, 2, 2.5, 5, 10):
+        step = multiple * magnitude
+        if step >= raw_step:
+            break
+    start = math.ceil(low / step) * step
+    return np.arange(start, high + step * 1e-6, step), step
+
+
+def _dashed_segments(start, end, dash, gap):
+    """
+    Split an axis-aligned line into dash segments for cv.polylines.
+
+    Args:
+        start (tuple): (x, y) start point
+        end (tuple): (x, y) end point
+        dash (int): Dash length in pixels
+        gap (int): Gap length in pixels
+
+    Returns:
+        list: (2, 2) int32 point arrays, one per dash
+    """
+    (x0, y0), (x1, y1) = start, end
+    horizontal = y0 == y1
+    first, last = (x0, x1) if horizontal else (y0, y1)
+    segments = []
+    for position in range(first, last, dash + gap):
+        stop = min(position + dash, last)
+        if horizontal:
+            segments.append(np.array([[position, y0], [stop, y0]], dtype=np.int32))
+        else:
+            segments.append(np.array([[x0, position], [x0, stop]], dtype=np.int32))
+    return segments
+
+
+class OpenCVEarPlot:
+    """
+    Live EAR chart drawn straight into a reusable image with OpenCV.
+
+    Shows the same information as the matplotlib chart (EAR curve colored by
+    alert state, smoothed EAR, blink and adaptive thresholds, blink markers,
+    microsleep spans, sliding axes with ticks and a legend) without a figure
+    render per frame. Title, axis labels and frame are drawn once into a cached
+    background that is copied into the output buffer each frame, and the
+    legend is a cached patch pasted on top.
+    """
+
+    MARGINS = (70, 20, 45, 50)  # left, right, top, bottom
+
+    def __init__(self, width=1000, height=400):
+        """
+        Initialize the renderer.
+
+        Args:
+            width (int): Image width in pixels (use the video width to skip resizing)
+            height (int): Image height in pixels
+        """
+        self.width = int(width)
+        self.height = int(height)
+
+        left, right, top, bottom = self.MARGINS
+        self.plot_x0, self.plot_y0 = left, top
+        self.plot_x1, self.plot_y1 = self.width - right, self.height - bottom
+
+        self._background = self._draw_background()
+        self._legends = {}  # Legend patch per "adaptive threshold shown" flag
+        self._image = np.empty_like(self._background)
+
+    def _draw_background(self):
+        """Draw the parts of the chart that never change."""
+        image = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+
+        title = "Real-Time Eye Aspect Ratio (EAR)"
+        (title_width, title_height), _ = cv.getTextSize(title, cv.FONT_HERSHEY_SIMPLEX, 0.7, 2)
+        cv.putText(image, title, ((self.width - title_width) // 2, 10 + title_height),
+                   cv.FONT_HERSHEY_SIMPLEX, 0.7, WHITE, 2, cv.LINE_AA)
+
+        label = "Frame Number"
+        (label_width, _), _ = cv.getTextSize(label, cv.FONT_HERSHEY_SIMPLEX, 0.45, 1)
+        cv.putText(image, label, ((self.plot_x0 + self.plot_x1 - label_width) // 2, self.height - 10),
+                   cv.FONT_HERSHEY_SIMPLEX, 0.45, WHITE, 1, cv.LINE_AA)
+
+        # Vertical axis label: draw horizontally on a patch and rotate it into place
+        (label_width, label_height), baseline = cv.getTextSize("EAR", cv.FONT_HERSHEY_SIMPLEX, 0.45, 1)
+        patch = np.zeros((label_height + baseline, label_width, 3), dtype=np.uint8)
+        cv.putText(patch, "EAR", (0, label_height), cv.FONT_HERSHEY_SIMPLEX, 0.45, WHITE, 1, cv.LINE_AA)
+        patch = cv.rotate(patch, cv.ROTATE_90_COUNTERCLOCKWISE)
+        y = (self.plot_y0 + self.plot_y1 - patch.shape[0]) // 2
+        image[y:y + patch.shape[0], 8:8 + patch.shape[1]] = patch
+
+        return image
+
+    def _legend(self, show_adaptive):
+        """
+        Get the cached legend patch.
+
+        Args:
+            show_adaptive (bool): Whether the adaptive threshold entry is listed
+
+        Returns:
+            np.ndarray: Legend image
+        """
+        legend = self._legends.get(show_adaptive)
+        if legend is not None:
+            return legend
+
+        entries = [("Eye Aspect Ratio", (86, 241, 13), []), ("Smoothed EAR", BLUE, []),
+                   ("Blink Threshold", RED, (6, 4))]
+        if show_adaptive:
+            entries.append(("Adaptive Threshold", YELLOW, (2, 3)))
+
+        row_height = 18
+        text_width = max(cv.getTextSize(text, cv.FONT_HERSHEY_SIMPLEX, 0.4, 1)[0][0] for text, _, _ in entries)
+        legend = np.zeros((row_height * len(entries) + 8, text_width + 50, 3), dtype=np.uint8)
+        cv.rectangle(legend, (0, 0), (legend.shape[1] - 1, legend.shape[0] - 1), WHITE, 1)
+        for row, (text, color, dashes) in enumerate(entries):
+            y = 4 + row * row_height + row_height // 2
+            if dashes:
+                cv.polylines(legend, _dashed_segments((6, y), (32, y), *dashes), False, color, 2)
+            else:
+                cv.line(legend, (6, y), (32, y), color, 2)
+            cv.putText(legend, text, (40, y + 4), cv.FONT_HERSHEY_SIMPLEX, 0.4, WHITE, 1, cv.LINE_AA)
+
+        self._legends[show_adaptive] = legend
+        return legend
+
+    def render(self, frame_numbers, ear_values, smoothed_ear_values, ear_color,
+               threshold, adaptive_threshold=None, blink_frames=(), microsleep_frames=()):
+        """
+        Draw the chart for the current window.
+
+        Args:
+            frame_numbers (sequence): Frame number of every plotted sample
+            ear_values (np.ndarray): EAR values
+            smoothed_ear_values (sequence): Smoothed EAR values
+            ear_color (tuple): BGR color of the EAR curve (follows the alert state)
+            threshold (float): Blink threshold
+            adaptive_threshold (float): Calibrated threshold, or None before calibration
+            blink_frames (sequence): Frames with a blink inside the window
+            microsleep_frames (sequence): Frames with a microsleep inside the window
+
+        Returns:
+            np.ndarray: BGR chart image; the buffer is reused by the next call
+        """
+        image = self._image
+        np.copyto(image, self._background)
+        (x_min, x_max), (y_min, y_max) = plot_limits(frame_numbers, ear_values)
+
+        x0, y0 = self.plot_x0, self.plot_y0
+        plot_width = self.plot_x1 - x0
+        plot_height = self.plot_y1 - y0
+        x_scale = plot_width / (x_max - x_min)
+        y_scale = plot_height / (y_max - y_min)
+
+        # Drawing into a view of the plot area lets OpenCV clip everything to the axes
+        area = image[y0:self.plot_y1, x0:self.plot_x1]
+
+        def to_x(values):
+            return ((np.asarray(values, dtype=np.float64) - x_min) * x_scale).astype(np.int32)
+
+        def to_y(values):
+            return ((y_max - np.asarray(values, dtype=np.float64)) * y_scale).astype(np.int32)
+
+        # Grid and tick labels
+        grid = []
+        x_ticks, _ = _nice_ticks(x_min, x_max)
+        for tick, x in zip(x_ticks, to_x(x_ticks)):
+            grid.extend(_dashed_segments((x, 0), (x, plot_height), 4, 4))
+            cv.putText(image, f"{tick:.0f}", (x0 + x - 10, self.plot_y1 + 16),
+                       cv.FONT_HERSHEY_SIMPLEX, 0.4, WHITE, 1, cv.LINE_AA)
+        y_ticks, y_step = _nice_ticks(y_min, y_max, target=5)
+        y_format = "{:.2f}" if y_step >= 0.01 else "{:.3f}"
+        for tick, y in zip(y_ticks, to_y(y_ticks)):
+            grid.extend(_dashed_segments((0, y), (plot_width, y), 4, 4))
+            cv.putText(image, y_format.format(tick), (x0 - 45, y0 + y + 4),
+                       cv.FONT_HERSHEY_SIMPLEX, 0.4, WHITE, 1, cv.LINE_AA)
+        if grid:
+            cv.polylines(area, grid, False, GRID, 1)
+
+        # Microsleep regions, blended at 30% like the matplotlib spans
+        if len(microsleep_frames):
+            shaded = area.copy()
+            for frame in microsleep_frames:
+                left, right = to_x([frame - 5, frame + 5])
+                cv.rectangle(shaded, (int(left), 0), (int(right), plot_height), (0, 0, 255), cv.FILLED)
+            cv.addWeighted(shaded, 0.3, area, 0.7, 0, dst=area)
+
+        # Threshold lines across the plotted frames
+        if len(frame_numbers):
+            start, end = (int(x) for x in to_x([frame_numbers[0], frame_numbers[-1]]))
+            y = int(to_y([threshold])[0])
+            cv.polylines(area, _dashed_segments((start, y), (end, y), 8, 5), False, RED, 2)
+            if adaptive_threshold:
+                y = int(to_y([adaptive_threshold])[0])
+                cv.polylines(area, _dashed_segments((start, y), (end, y), 2, 4), False, YELLOW, 2)
+
+        # EAR curves, the smoothed one on top
+        if len(frame_numbers) > 1:
+            x = to_x(frame_numbers)
+            raw = np.column_stack((x, to_y(ear_values)))
+            cv.polylines(area, [raw], False, ear_color, 1, cv.LINE_AA)
+            smoothed = np.column_stack((x, to_y(smoothed_ear_values)))
+            cv.polylines(area, [smoothed], False, BLUE, 2, cv.LINE_AA)
+
+        # Blink markers
+        if len(blink_frames):
+            y = int(to_y([0.2])[0])
+            for x in to_x(blink_frames):
+                cv.circle(area, (int(x), y), 4, (255, 0, 0), cv.FILLED, cv.LINE_AA)
+
+        cv.rectangle(image, (x0, y0), (self.plot_x1, self.plot_y1), WHITE, 1)
+
+        legend = self._legend(bool(adaptive_threshold))
+        legend_h, legend_w = legend.shape[:2]
+        image[y0 + 6:y0 + 6 + legend_h, x0 + 6:x0 + 6 + legend_w] = legend
+
+        return image
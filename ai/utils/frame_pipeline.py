@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import deque
+
+from utils.instrumentation import Instrumentation
+
+
+class LatestFrameQueue:
+    """
+    Bounded hand-off queue between pipeline stages with a latest-frame-wins policy.
+
+    When the queue is full, putting a new item discards the oldest one instead of
+    blocking the producer, so a slow consumer always picks up the freshest frame
+    rather than working through a backlog of stale ones.
+    """
+
+    def __init__(self, maxsize=1):
+        """
+        Initialize the queue.
+
+        Args:
+            maxsize (int): Maximum number of items held before the oldest is dropped
+        """
+        self.maxsize = max(1, int(maxsize))
+        self._items = deque(maxlen=self.maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # Number of items discarded because the consumer fell behind
+        self.dropped = 0
+
+    def put(self, item):
+        """
+        Add an item, discarding the oldest queued item if the queue is full.
+
+        Args:
+            item: Item to enqueue
+
+        Returns:
+            bool: False if the queue has been closed, True otherwise
+        """
+        with self._cond:
+            if self._closed:
+                return False
+
+            if len(self._items) == self.maxsize:
+                self.dropped += 1
+
+            self._items.append(item)
+            self._cond.notify()
+            return True
+
+    def get(self, timeout=None):
+        """
+        Remove and return the oldest queued item.
+
+        Args:
+            timeout (float): Maximum seconds to wait, or None to wait indefinitely
+
+        Returns:
+            The next item, or None on timeout or when the queue is closed and drained
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self._closed, timeout)
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def close(self):
+        """Close the queue; consumers drain what is left and then receive None."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def exhausted(self):
+        """bool: True once the queue is closed and every item has been consumed."""
+        with self._cond:
+            return self._closed and not self._items
+
+
+class CaptureThread(threading.Thread):
+    """
+    Background thread that keeps reading frames from a capture device.
+
+    Each frame is pushed into a LatestFrameQueue as a (frame_index, capture_time, frame)
+    tuple, so downstream stages can measure end-to-end latency from the moment
+    the frame left the camera.
+
+    With a recycled deque, frames are decoded into arrays the last stage has
+    appended to it after it was done with them, instead of a fresh array per
+    frame. Frames dropped by a queue are not recycled, so the capture thread
+    allocates a new array whenever the deque is empty.
+    """
+
+    def __init__(self, cap, output_queue, stop_event, instrumentation=None, recycled=None):
+        """
+        Initialize the capture thread.
+
+        Args:
+            cap (cv.VideoCapture): Opened video capture
+            output_queue (LatestFrameQueue): Queue receiving captured frames
+            stop_event (threading.Event): Event signalling the pipeline to stop
+            instrumentation (Instrumentation): Span timers for the "capture" stage, or None
+            recycled (collections.deque): Frames that may be overwritten, or None to allocate every frame
+        """
+        super().__init__(name="microsleep-capture", daemon=True)
+        self.cap = cap
+        self.output_queue = output_queue
+        self.stop_event = stop_event
+        self.instrumentation = instrumentation or Instrumentation()
+        self.frames_read = 0
+        self.recycled = recycled
+
+    def run(self):
+        """Read frames until the source is exhausted or the pipeline is stopped."""
+        try:
+            while not self.stop_event.is_set() and self.cap.isOpened():
+                with self.instrumentation.span("capture"):
+                    # read() decodes in place when the recycled array has the frame's size
+                    buffer = self.recycled.popleft() if self.recycled else None
+                    ret, frame = self.cap.read(buffer)
+                if not ret:
+                    break
+
+                self.output_queue.put((self.frames_read, time.time(), frame))
+                self.frames_read += 1
+        finally:
+            # Let the next stage know no more frames are coming
+            self.output_queue.close()
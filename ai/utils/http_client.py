@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PooledHttpClient:
+    """
+    Keep-alive HTTP client with one pooled session per destination.
+
+    Each named destination (e.g. "server", "ubidots") gets its own requests.Session
+    so TCP and TLS connections are reused across posts instead of being set up
+    again every second, and its own latency and error counters.
+    """
+
+    def __init__(self, pool_maxsize=4):
+        """
+        Initialize the client.
+
+        Args:
+            pool_maxsize (int): Maximum number of kept-alive connections per host
+        """
+        self.pool_maxsize = pool_maxsize
+        self._sessions = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def register(self, destination, headers=None):
+        """
+        Create the pooled session for a destination.
+
+        Args:
+            destination (str): Destination name used for statistics
+            headers (dict): Headers sent with every request to this destination
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if headers:
+            session.headers.update(headers)
+
+        with self._lock:
+            self._sessions[destination] = session
+            self._stats[destination] = {
+                'requests': 0,
+                'errors': 0,
+                'last_error': None,
+                'latencies': deque(maxlen=100)
+            }
+
+    def post(self, destination, url, json=None, timeout=5):
+        """
+        Send a POST request through the destination's pooled session.
+
+        Args:
+            destination (str): Registered destination name
+            url (str): Request URL
+            json: JSON-serializable request body
+            timeout (float): Request timeout in seconds
+
+        Returns:
+            requests.Response: The response
+
+        Raises:
+            requests.exceptions.RequestException: If the request fails
+        """
+        if destination not in self._sessions:
+            self.register(destination)
+
+        stats = self._stats[destination]
+        start_time = time.perf_counter()
+        try:
+            response = self._sessions[destination].post(url, json=json, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            self._record(stats, start_time, type(e).__name__)
+            raise
+
+        error = None if 200 <= response.status_code < 300 else f"HTTP {response.status_code}"
+        self._record(stats, start_time, error)
+        return response
+
+    def _record(self, stats, start_time, error):
+        """
+        Record the outcome of a request.
+
+        Args:
+            stats (dict): Statistics of the destination
+            start_time (float): perf_counter() value when the request started
+            error (str): Error description, or None on success
+        """
+        with self._lock:
+            stats['requests'] += 1
+            stats['latencies'].append(time.perf_counter() - start_time)
+            if error:
+                stats['errors'] += 1
+                stats['last_error'] = error
+
+    def get_statistics(self):
+        """
+        Get per-destination request statistics.
+
+        Returns:
+            dict: Destination name mapped to request/error counts and latency in ms
+        """
+        result = {}
+        with self._lock:
+            for destination, stats in self._stats.items():
+                latencies = sorted(stats['latencies'])
+                entry = {
+                    'requests': stats['requests'],
+                    'errors': stats['errors'],
+                    'last_error': stats['last_error'],
+                }
+                if latencies:
+                    entry['avg_latency_ms'] = sum(latencies) / len(latencies) * 1000
+                    entry['p95_latency_ms'] = latencies[int(0.95 * (len(latencies) - 1))] * 1000
+                    entry['max_latency_ms'] = latencies[-1] * 1000
+                result[destination] = entry
+        return result
+
+    def close(self):
+        """Close all sessions and their pooled connections."""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
@@ -0,0 +1,424 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from utils.landmarks import FaceLandmarks
+
+
+def _worker_main(frame_block, result_block, slots, frame_bytes, num_landmarks,
+                 tasks, results, static_image_mode, min_detection_con, min_track_con):
+    """
+    Face mesh worker process: read frames from shared slots, write landmarks back.
+
+    Tasks are (slot, height, width, scale, job) tuples, None stops the worker;
+    a scale below 1 downsizes the frame before inference. Each
+    result is (slot, count, error, job): count landmarks were written to the
+    slot's result rows (0 when no face was found, -1 on error). Slot -1
+    announces that the worker has loaded its graph.
+    """
+    import cv2 as cv
+    from facemesh_module import FaceMeshGenerator
+
+    # Spawned workers share the parent's resource tracker, which unlinks the blocks if the parent dies
+    frame_memory = shared_memory.SharedMemory(name=frame_block)
+    result_memory = shared_memory.SharedMemory(name=result_block)
+    frames = np.ndarray((slots, frame_bytes), dtype=np.uint8, buffer=frame_memory.buf)
+    points = np.ndarray((slots, num_landmarks, 2), dtype=np.int32, buffer=result_memory.buf)
+
+    generator = FaceMeshGenerator(mode=static_image_mode, min_detection_con=min_detection_con,
+                                  min_track_con=min_track_con)
+    results.put((-1, 0, None, None))
+    small = rgb = None
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+
+            slot, height, width, scale, job = task
+            try:
+                frame = frames[slot, :height * width * 3].reshape(height, width, 3)
+                if scale < 1.0:
+                    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+                    if small is None or small.shape[:2] != (size[1], size[0]):
+                        small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+                    # Landmarks are normalized, so they still map onto the full frame
+                    frame = cv.resize(frame, size, dst=small, interpolation=cv.INTER_LINEAR)
+                if rgb is None or rgb.shape != frame.shape:
+                    rgb = np.empty_like(frame)
+                cv.cvtColor(frame, cv.COLOR_BGR2RGB, dst=rgb)
+
+                count = 0
+                detection = generator.face_mesh.process(rgb)
+                if detection.multi_face_landmarks:
+                    landmarks = generator._to_pixel_landmarks(detection.multi_face_landmarks[0], width, height)
+                    count = min(len(landmarks.points), num_landmarks)
+                    points[slot, :count] = landmarks.points[:count]
+                results.put((slot, count, None, job))
+            except Exception as e:
+                results.put((slot, -1, f"{type(e).__name__}: {e}", job))
+    finally:
+        del frames, points
+        frame_memory.close()
+        result_memory.close()
+
+
+class FaceMeshProcessPool:
+    """
+    Face mesh inference on a pool of worker processes.
+
+    MediaPipe inference holds the GIL for part of every frame, so threads do not
+    scale it across cores. Each worker process owns one MediaPipe graph. Frames
+    travel through a ring of shared memory slots, one copy into the slot and no
+    pickling, and the workers write landmarks back into a second shared ring
+    as (N, 2) int32 rows. Only the slot number and frame size go through the
+    task queues. A slot is reused as soon as its result has been read, and
+    submit() blocks while every slot is in flight, which bounds memory and
+    latency.
+
+    Every worker has its own task queue, so the pool knows which slots each
+    worker holds. A watchdog in the result collector fails the futures of a
+    worker that died (e.g. a crash inside MediaPipe) and returns its slots to
+    the ring, and close() fails every pending future, so callers never wait
+    on a result that cannot come.
+
+    Workers default to static image mode because consecutive frames of one
+    worker may come from different streams or be out of order.
+    """
+
+    def __init__(self, workers=None, max_frame_size=(1920, 1080), slots=None, num_landmarks=468,
+                 static_image_mode=True, min_detection_con=0.5, min_track_con=0.5, watchdog_interval=0.5):
+        """
+        Create the shared memory rings and start the workers.
+
+        Args:
+            workers (int): Worker processes, default the CPU count
+            max_frame_size (tuple): Largest (width, height) of a submitted frame
+            slots (int): Frames that can be in flight at once, default two per worker
+            num_landmarks (int): Landmark rows reserved per result (468 without iris refinement)
+            static_image_mode (bool): Run face detection on every frame instead of tracking
+            min_detection_con (float): Minimum detection confidence threshold
+            min_track_con (float): Minimum tracking confidence threshold
+            watchdog_interval (float): Seconds between checks for dead workers
+        """
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.slots = max(1, slots or 2 * self.workers)
+        width, height = max_frame_size
+        self.frame_bytes = int(width) * int(height) * 3
+        self.num_landmarks = num_landmarks
+
+        self._frame_memory = shared_memory.SharedMemory(create=True, size=self.slots * self.frame_bytes)
+        self._result_memory = shared_memory.SharedMemory(create=True, size=self.slots * num_landmarks * 2 * 4)
+        self._frames = np.ndarray((self.slots, self.frame_bytes), dtype=np.uint8, buffer=self._frame_memory.buf)
+        self._points = np.ndarray((self.slots, num_landmarks, 2), dtype=np.int32, buffer=self._result_memory.buf)
+
+        self._free_slots = queue.Queue()
+        for slot in range(self.slots):
+            self._free_slots.put(slot)
+
+        # Guards the job bookkeeping below and the frame slots against close()
+        self._lock = threading.Lock()
+        self._futures = {}  # slot -> Future of the job in it
+        self._jobs = {}  # slot -> job id, so late results of a dead worker's job are ignored
+        self._in_flight = [set() for _ in range(self.workers)]  # Slots held by each worker
+        self._dead = set()
+        self._next_job = 0
+        self._loaded = 0
+        self._ready = threading.Event()
+        self.watchdog_interval = watchdog_interval
+
+        # MediaPipe's graph threads do not survive fork, so workers are spawned
+        context = multiprocessing.get_context("spawn")
+        self._tasks = [context.Queue() for _ in range(self.workers)]
+        self._results = context.Queue()
+        self._processes = [
+            context.Process(
+                target=_worker_main,
+                args=(self._frame_memory.name, self._result_memory.name, self.slots, self.frame_bytes,
+                      num_landmarks, self._tasks[index], self._results, static_image_mode,
+                      min_detection_con, min_track_con),
+                name=f"facemesh-worker-{index}",
+                daemon=True
+            )
+            for index in range(self.workers)
+        ]
+        for process in self._processes:
+            process.start()
+
+        self.closed = False
+        self._collector = threading.Thread(target=self._collect, name="facemesh-results", daemon=True)
+        self._collector.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    @property
+    def alive_workers(self):
+        """int: Workers that have not died."""
+        return self.workers - len(self._dead)
+
+    def wait_ready(self, timeout=None):
+        """
+        Wait until every worker has loaded its MediaPipe graph or died.
+
+        Submitting earlier is fine but the first frames wait for the slowest
+        start-up; live sources call this before capturing so no frames queue up.
+
+        Args:
+            timeout (float): Seconds to wait, or None to wait indefinitely
+
+        Returns:
+            bool: True if the workers are ready and at least one is alive
+        """
+        return self._ready.wait(timeout) and self.alive_workers > 0
+
+    def submit(self, frame, timeout=None, input_scale=1.0):
+        """
+        Queue a BGR frame for inference.
+
+        Args:
+            frame (np.ndarray): (H, W, 3) uint8 frame no larger than max_frame_size
+            timeout (float): Seconds to wait for a free slot, or None to wait indefinitely
+            input_scale (float): Factor the frame is downscaled by before inference
+
+        Returns:
+            concurrent.futures.Future: Resolves to a FaceLandmarks (empty if no face was found),
+                                       or fails with RuntimeError if the worker died or the pool closed
+        """
+        height, width = frame.shape[:2]
+        size = height * width * 3
+        if frame.ndim != 3 or frame.shape[2] != 3 or size > self.frame_bytes:
+            raise ValueError(f"Frame of shape {frame.shape} does not fit a {self.frame_bytes} byte slot")
+
+        # Short waits, so a closed pool or a timeout is noticed while every slot is busy
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self._check_open()
+            try:
+                slot = self._free_slots.get(timeout=self.watchdog_interval)
+                break
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError("No free face mesh slot") from None
+
+        with self._lock:
+            try:
+                self._check_open()
+            except RuntimeError:
+                self._free_slots.put(slot)
+                raise
+
+            np.copyto(self._frames[slot, :size].reshape(height, width, 3), frame)
+
+            # Least loaded live worker
+            worker = min((i for i in range(self.workers) if i not in self._dead),
+                         key=lambda i: len(self._in_flight[i]))
+            job = self._next_job
+            self._next_job += 1
+            future = Future()
+            self._futures[slot] = future
+            self._jobs[slot] = (job, worker)
+            self._in_flight[worker].add(slot)
+            self._tasks[worker].put((slot, height, width, input_scale, job))
+        return future
+
+    def process(self, frame, timeout=None, input_scale=1.0):
+        """
+        Run inference on one frame and wait for the landmarks.
+
+        Args:
+            frame (np.ndarray): BGR frame
+            timeout (float): Seconds to wait for a slot and again for the result,
+                             or None to wait until the result or a worker failure
+            input_scale (float): Factor the frame is downscaled by before inference
+
+        Returns:
+            FaceLandmarks: Landmarks in pixel coordinates, empty if no face was found
+        """
+        return self.submit(frame, timeout, input_scale).result(timeout)
+
+    def close(self, timeout=5.0):
+        """
+        Stop the workers, fail every pending future and free the shared memory.
+
+        Args:
+            timeout (float): Seconds to wait for each worker
+        """
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+
+        for tasks in self._tasks:
+            tasks.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout)
+
+        self._results.put(None)
+        self._collector.join(timeout)
+
+        with self._lock:
+            for slot in list(self._futures):
+                self._fail(slot, "Face mesh pool closed")
+
+            del self._frames, self._points
+            self._frame_memory.close()
+            self._frame_memory.unlink()
+            self._result_memory.close()
+            self._result_memory.unlink()
+
+    def _check_open(self):
+        """Raise if the pool is closed or has no live workers."""
+        if self.closed:
+            raise RuntimeError("Face mesh pool is closed")
+        if len(self._dead) == self.workers:
+            raise RuntimeError("Every face mesh worker has died")
+
+    def _collect(self):
+        """Resolve futures from worker results, return their slots to the ring and watch the workers."""
+        next_check = time.monotonic() + self.watchdog_interval
+        while True:
+            try:
+                item = self._results.get(timeout=self.watchdog_interval)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                return
+
+            if item:
+                self._resolve(*item)
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + self.watchdog_interval
+                self._check_workers()
+
+    def _resolve(self, slot, count, error, job):
+        """Complete the future of one worker result."""
+        with self._lock:
+            if slot < 0:
+                self._loaded += 1
+                self._update_ready()
+                return
+
+            # The job may already have been failed by the watchdog and its slot reused
+            if self._jobs.get(slot, (None,))[0] != job:
+                return
+
+            future = self._futures.pop(slot)
+            _, worker = self._jobs.pop(slot)
+            self._in_flight[worker].discard(slot)
+            if error is None:
+                # A compact copy, so the slot can be reused right away
+                landmarks = FaceLandmarks(self._points[slot, :count].copy())
+            self._free_slots.put(slot)
+
+        if error is None:
+            future.set_result(landmarks)
+        else:
+            future.set_exception(RuntimeError(f"Face mesh worker failed: {error}"))
+
+    def _check_workers(self):
+        """Fail the jobs of workers that died and give their slots back."""
+        with self._lock:
+            for index, process in enumerate(self._processes):
+                if index in self._dead or process.is_alive():
+                    continue
+                self._dead.add(index)
+                for slot in list(self._in_flight[index]):
+                    self._fail(slot, f"{process.name} exited with code {process.exitcode}")
+                self._update_ready()
+
+    def _fail(self, slot, reason):
+        """Fail the job in a slot and free the slot; the caller holds the lock."""
+        future = self._futures.pop(slot)
+        _, worker = self._jobs.pop(slot)
+        self._in_flight[worker].discard(slot)
+        self._free_slots.put(slot)
+        future.set_exception(RuntimeError(reason))
+
+    def _update_ready(self):
+        """Mark the pool ready once every worker has loaded its graph or died."""
+        if self._loaded + len(self._dead) >= self.workers:
+            self._ready.set()
+
+
+class PooledFaceMesh:
+    """
+    FaceMeshGenerator stand-in that runs inference on a FaceMeshProcessPool.
+
+    create_face_mesh() has the generator's signature, so the pool can be used
+    wherever a generator is injected; it never draws and returns the input frame
+    itself instead of a copy. map() keeps several frames in flight for batch jobs
+    such as replay.
+    """
+
+    def __init__(self, pool):
+        """
+        Initialize the front end.
+
+        Args:
+            pool (FaceMeshProcessPool): Pool running the inference
+        """
+        self.pool = pool
+        self.trace_writer = None
+
+    def create_face_mesh(self, frame, draw=False, timestamp=None, input_scale=None):
+        """
+        Run inference on one frame and wait for the result.
+
+        Args:
+            frame (np.ndarray): Input video frame
+            draw (bool): Ignored; pooled inference does not draw
+            timestamp (float): Frame time recorded in the landmark trace
+            input_scale (float): Factor the frame is downscaled by before inference, None for full size
+
+        Returns:
+            tuple: (frame, landmarks) with landmarks as FaceLandmarks
+        """
+        landmarks = self.pool.process(frame, input_scale=1.0 if input_scale is None else input_scale)
+        self._trace(landmarks, timestamp)
+        return frame, landmarks
+
+    def map(self, frames, window=None):
+        """
+        Run inference on a sequence of frames with several of them in flight.
+
+        Args:
+            frames (iterable): (timestamp, frame) pairs
+            window (int): Frames in flight, default the pool's slot count
+
+        Yields:
+            tuple: (timestamp, landmarks) in input order
+        """
+        window = window or self.pool.slots
+        pending = deque()
+        for timestamp, frame in frames:
+            pending.append((timestamp, self.pool.submit(frame)))
+            if len(pending) >= window:
+                yield self._finish(*pending.popleft())
+        while pending:
+            yield self._finish(*pending.popleft())
+
+    def _finish(self, timestamp, future):
+        """Wait for one result and record it in the trace."""
+        landmarks = future.result()
+        self._trace(landmarks, timestamp)
+        return timestamp, landmarks
+
+    def _trace(self, landmarks, timestamp):
+        """Append a result to the landmark trace, if one is attached."""
+        if self.trace_writer is not None:
+            self.trace_writer.append(landmarks.points, timestamp)
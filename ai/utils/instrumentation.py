@@ -0,0 +1,379 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+from utils.drawing_utils import DrawingUtils
+
+# Upper bounds of the histogram buckets in milliseconds; a final +Inf bucket catches the rest
+BUCKET_BOUNDS_MS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 16.0, 25.0, 33.0, 50.0, 100.0, 250.0, 500.0, 1000.0)
+
+# Detector stages in pipeline order, used to order reports and the overlay
+STAGES = ("capture", "face_mesh", "ear", "classification", "drawing", "plot", "write", "telemetry")
+
+PROMETHEUS_METRIC = "microsleep_stage_duration_seconds"
+
+
+class SpanHistogram:
+    """
+    Fixed-bucket latency histogram of one span on one thread.
+
+    Only the owning thread records into it, so recording takes no lock; readers
+    on other threads may see a sample that is half applied, which is harmless
+    for monitoring.
+    """
+
+    __slots__ = ("name", "thread", "counts", "count", "total_ns", "max_ns", "ewma_ms")
+
+    # Weight of the newest sample in the moving average shown on the overlay
+    EWMA_ALPHA = 0.1
+
+    def __init__(self, name, thread):
+        """
+        Initialize an empty histogram.
+
+        Args:
+            name (str): Span name
+            thread (str): Name of the thread recording into it
+        """
+        self.name = name
+        self.thread = thread
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.ewma_ms = None
+
+    def record(self, elapsed_ns):
+        """
+        Add one duration.
+
+        Args:
+            elapsed_ns (int): Duration in nanoseconds
+        """
+        ms = elapsed_ns / 1e6
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+        ewma = self.ewma_ms
+        self.ewma_ms = ms if ewma is None else ewma + self.EWMA_ALPHA * (ms - ewma)
+
+
+class _Span:
+    """Reusable timing context for one span name on one thread."""
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.record(time.perf_counter_ns() - self.start)
+        return False
+
+
+class _NullSpan:
+    """Shared do-nothing context returned while instrumentation is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Instrumentation:
+    """
+    Named span timers for the detector's hot path.
+
+    `with instrumentation.span("face_mesh"): ...` times a block into a
+    histogram owned by the calling thread. Each thread keeps its own span
+    objects and histograms in thread-local storage, so recording never takes a
+    lock; the shared registry is only locked the first time a thread uses a
+    span name. Spans are inclusive: a span opened inside another is counted in
+    both.
+
+    While disabled, span() returns one shared no-op context, so the timers can
+    stay in the code permanently at a cost of a few hundred nanoseconds per
+    frame.
+    """
+
+    def __init__(self, enabled=False, frame_budget_ms=None):
+        """
+        Initialize the instrumentation.
+
+        Args:
+            enabled (bool): Whether spans are recorded
+            frame_budget_ms (float): Time available per frame (1000 / fps), used for budget shares
+        """
+        self.enabled = enabled
+        self.frame_budget_ms = frame_budget_ms
+        self._local = threading.local()
+        self._histograms = []
+        self._registry_lock = threading.Lock()
+        self._started = time.time()
+
+        self._dump_thread = None
+        self._dump_stop = threading.Event()
+
+    def span(self, name):
+        """
+        Get the timing context for a span.
+
+        Args:
+            name (str): Span name, e.g. one of STAGES
+
+        Returns:
+            Context manager timing the enclosed block (a no-op while disabled)
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        try:
+            return self._local.spans[name]
+        except (AttributeError, KeyError):
+            return self._register(name)
+
+    def _register(self, name):
+        """Create the calling thread's histogram and span for a name."""
+        spans = getattr(self._local, "spans", None)
+        if spans is None:
+            spans = self._local.spans = {}
+
+        histogram = SpanHistogram(name, threading.current_thread().name)
+        with self._registry_lock:
+            self._histograms.append(histogram)
+        spans[name] = _Span(histogram)
+        return spans[name]
+
+    def reset(self):
+        """Drop all recorded samples; threads register fresh histograms on their next span."""
+        with self._registry_lock:
+            self._histograms = []
+            self._local = threading.local()
+        self._started = time.time()
+
+    def snapshot(self):
+        """
+        Merge the per-thread histograms into one summary per span.
+
+        Returns:
+            dict: Span name mapped to counts, bucket counts, mean, moving average,
+                  approximate percentiles and maximum in milliseconds
+        """
+        with self._registry_lock:
+            histograms = list(self._histograms)
+
+        merged = {}
+        for histogram in histograms:
+            count = histogram.count
+            if count == 0:
+                continue
+
+            entry = merged.get(histogram.name)
+            if entry is None:
+                entry = merged[histogram.name] = {
+                    "count": 0, "total_ns": 0, "max_ns": 0, "ewma_weight": 0.0,
+                    "buckets": [0] * (len(BUCKET_BOUNDS_MS) + 1), "threads": []
+                }
+            entry["count"] += count
+            entry["total_ns"] += histogram.total_ns
+            entry["max_ns"] = max(entry["max_ns"], histogram.max_ns)
+            entry["ewma_weight"] += (histogram.ewma_ms or 0.0) * count
+            entry["threads"].append(histogram.thread)
+            for index, bucket_count in enumerate(histogram.counts):
+                entry["buckets"][index] += bucket_count
+
+        summary = {}
+        for name in sorted(merged, key=self._stage_order):
+            entry = merged[name]
+            count = entry["count"]
+            max_ms = entry["max_ns"] / 1e6
+            stats = {
+                "count": count,
+                "sum_ms": round(entry["total_ns"] / 1e6, 3),
+                "mean_ms": round(entry["total_ns"] / 1e6 / count, 3),
+                "ewma_ms": round(entry["ewma_weight"] / count, 3),
+                "p50_ms": self._quantile(entry["buckets"], count, 0.50, max_ms),
+                "p95_ms": self._quantile(entry["buckets"], count, 0.95, max_ms),
+                "p99_ms": self._quantile(entry["buckets"], count, 0.99, max_ms),
+                "max_ms": round(max_ms, 3),
+                "buckets": entry["buckets"],
+                "threads": sorted(set(entry["threads"])),
+            }
+            if self.frame_budget_ms:
+                stats["budget_pct"] = round(100.0 * stats["ewma_ms"] / self.frame_budget_ms, 1)
+            summary[name] = stats
+        return summary
+
+    @staticmethod
+    def _stage_order(name):
+        """Sort key putting the known stages first, in pipeline order."""
+        return (STAGES.index(name), "") if name in STAGES else (len(STAGES), name)
+
+    @staticmethod
+    def _quantile(buckets, count, q, max_ms):
+        """
+        Approximate a quantile as the upper bound of the bucket that contains it.
+
+        Args:
+            buckets (list): Per-bucket counts
+            count (int): Total number of samples
+            q (float): Quantile between 0 and 1
+            max_ms (float): Largest sample, reported for the +Inf bucket and as an upper cap
+
+        Returns:
+            float: Quantile in milliseconds
+        """
+        rank = q * count
+        cumulative = 0
+        for index, bucket_count in enumerate(buckets):
+            cumulative += bucket_count
+            if cumulative >= rank and bucket_count:
+                if index == len(BUCKET_BOUNDS_MS):
+                    return round(max_ms, 3)
+                return round(min(BUCKET_BOUNDS_MS[index], max_ms), 3)
+        return round(max_ms, 3)
+
+    def to_json(self):
+        """
+        Render the current snapshot as a JSON document.
+
+        Returns:
+            str: JSON with the collection window, frame budget, bucket bounds and spans
+        """
+        return json.dumps({
+            "timestamp": time.time(),
+            "uptime_s": round(time.time() - self._started, 3),
+            "frame_budget_ms": self.frame_budget_ms,
+            "bucket_bounds_ms": list(BUCKET_BOUNDS_MS),
+            "spans": self.snapshot(),
+        }, indent=2)
+
+    def to_prometheus(self):
+        """
+        Render the current snapshot in the Prometheus text exposition format.
+
+        Returns:
+            str: One cumulative histogram per span, labelled by stage
+        """
+        lines = [
+            f"# HELP {PROMETHEUS_METRIC} Time spent in each microsleep detector stage.",
+            f"# TYPE {PROMETHEUS_METRIC} histogram",
+        ]
+        for name, stats in self.snapshot().items():
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKET_BOUNDS_MS, stats["buckets"]):
+                cumulative += bucket_count
+                lines.append(f'{PROMETHEUS_METRIC}_bucket{{stage="{name}",le="{bound / 1000:g}"}} {cumulative}')
+            lines.append(f'{PROMETHEUS_METRIC}_bucket{{stage="{name}",le="+Inf"}} {stats["count"]}')
+            lines.append(f'{PROMETHEUS_METRIC}_sum{{stage="{name}"}} {stats["sum_ms"] / 1000:.6f}')
+            lines.append(f'{PROMETHEUS_METRIC}_count{{stage="{name}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path, fmt="json"):
+        """
+        Write the current snapshot to a file atomically.
+
+        Args:
+            path (str): Output file
+            fmt (str): "json" or "prometheus"
+        """
+        text = self.to_prometheus() if fmt == "prometheus" else self.to_json()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+
+    def start_periodic_dump(self, path, interval=10.0, fmt="json"):
+        """
+        Dump the snapshot every interval seconds on a background thread.
+
+        Args:
+            path (str): Output file, rewritten in place (e.g. for a node_exporter textfile collector)
+            interval (float): Seconds between dumps
+            fmt (str): "json" or "prometheus"
+        """
+        if fmt not in ("json", "prometheus"):
+            raise ValueError(f"Unsupported metrics format: {fmt}")
+        self.stop_periodic_dump()
+        self._dump_stop.clear()
+
+        def run():
+            while not self._dump_stop.wait(interval):
+                self._safe_dump(path, fmt)
+            # Final dump so the file covers the whole session
+            self._safe_dump(path, fmt)
+
+        self._dump_thread = threading.Thread(target=run, name="metrics-dump", daemon=True)
+        self._dump_thread.start()
+
+    def stop_periodic_dump(self, timeout=2.0):
+        """
+        Stop the periodic dump after writing a final snapshot.
+
+        Args:
+            timeout (float): Seconds to wait for the dump thread
+        """
+        if self._dump_thread is None:
+            return
+        self._dump_stop.set()
+        self._dump_thread.join(timeout)
+        self._dump_thread = None
+
+    def _safe_dump(self, path, fmt):
+        """Dump without letting an I/O error kill the dump thread."""
+        try:
+            self.dump(path, fmt)
+        except OSError as e:
+            print(f"❌ Gagal menyimpan metrik: {e}")
+
+    def draw_overlay(self, frame, origin=None):
+        """
+        Draw the per-stage moving average and frame budget share on a frame.
+
+        Args:
+            frame (np.ndarray): Frame to draw on
+            origin (tuple): Top-left (x, y) of the overlay, default near the top-right corner
+        """
+        snapshot = self.snapshot()
+        if not snapshot:
+            return
+
+        x, y = origin if origin is not None else (frame.shape[1] - 250, 60)
+        budget = self.frame_budget_ms
+        slowest = max(snapshot, key=lambda name: snapshot[name]["ewma_ms"])
+
+        if budget:
+            DrawingUtils.draw_text_with_bg(
+                frame, f"Budget: {budget:.1f} ms", (x, y),
+                font_scale=0.5, thickness=1,
+                bg_color=(40, 40, 40), text_color=(255, 255, 255)
+            )
+            y += 20
+
+        for name, stats in snapshot.items():
+            text = f"{name}: {stats['ewma_ms']:.1f} ms"
+            if budget:
+                text += f" ({stats['budget_pct']:.0f}%)"
+            DrawingUtils.draw_text_with_bg(
+                frame, text, (x, y),
+                font_scale=0.5, thickness=1,
+                bg_color=(0, 0, 180) if name == slowest else (40, 40, 40),
+                text_color=(255, 255, 255)
+            )
+            y += 20
@@ -0,0 +1,208 @@
+import json
+import os
+
+import numpy as np
+
+META_FILE = "meta.json"
+TRACE_VERSION = 1
+
+
+class LandmarkTraceChunk:
+    """
+    One chunk of a landmark trace.
+
+    Attributes:
+        landmarks (np.ndarray): (T, N, 2) int16 pixel coordinates, zeros where no face was found
+        detected (np.ndarray): (T,) bool, True where a face was found
+        timestamps (np.ndarray): (T,) float64 frame times in seconds
+        start (int): Index of the chunk's first frame in the whole trace
+    """
+
+    def __init__(self, landmarks, detected, timestamps, start):
+        self.landmarks = landmarks
+        self.detected = detected
+        self.timestamps = timestamps
+        self.start = start
+
+    def __len__(self):
+        return len(self.timestamps)
+
+
+class LandmarkTraceWriter:
+    """
+    Append per-frame face mesh landmarks to a chunked, memory-mappable trace.
+
+    A trace is a directory holding one plain `.npy` file per column and chunk
+    (`chunk_00000.landmarks.npy`, `.detected.npy`, `.timestamps.npy`) plus a
+    `meta.json` index. Plain `.npy` files can be opened with
+    `np.load(mmap_mode='r')`, so readers get the columns zero-copy. Frames are
+    buffered in preallocated arrays and flushed one chunk at a time.
+    """
+
+    def __init__(self, directory, num_landmarks=468, chunk_size=1800, fps=None, frame_size=None):
+        """
+        Initialize the writer.
+
+        Args:
+            directory (str): Trace directory, created if missing; an existing trace is overwritten
+            num_landmarks (int): Landmarks per face (468 for MediaPipe FaceMesh without iris refinement)
+            chunk_size (int): Frames per chunk file (1800 = 1 minute at 30fps)
+            fps (float): Frame rate of the recording, stored for replay
+            frame_size (tuple): (width, height) of the frames, stored for replay
+        """
+        self.directory = directory
+        self.num_landmarks = int(num_landmarks)
+        self.chunk_size = max(1, int(chunk_size))
+        self.fps = fps
+        self.frame_size = frame_size
+
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.startswith("chunk_") and name.endswith(".npy"):
+                os.remove(os.path.join(directory, name))
+
+        self._landmarks = np.zeros((self.chunk_size, self.num_landmarks, 2), dtype=np.int16)
+        self._detected = np.zeros(self.chunk_size, dtype=bool)
+        self._timestamps = np.zeros(self.chunk_size, dtype=np.float64)
+        self._count = 0
+        self._chunks = []  # Frame count of every flushed chunk
+        self._frames = 0
+        self.closed = False
+
+        self._write_meta()
+
+    def __len__(self):
+        return self._frames
+
+    def append(self, points, timestamp):
+        """
+        Add one frame.
+
+        Args:
+            points (np.ndarray): (N, 2) pixel coordinates, or None / empty when no face was found
+            timestamp (float): Frame time in seconds
+        """
+        if self.closed:
+            raise ValueError("Landmark trace is closed")
+
+        row = self._count
+        if points is not None and len(points):
+            if len(points) != self.num_landmarks:
+                raise ValueError(f"Expected {self.num_landmarks} landmarks, got {len(points)}")
+            self._landmarks[row] = points
+            self._detected[row] = True
+        else:
+            self._landmarks[row] = 0
+            self._detected[row] = False
+        self._timestamps[row] = timestamp
+
+        self._count += 1
+        self._frames += 1
+        if self._count == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered frames as a new chunk."""
+        if self._count == 0:
+            return
+
+        prefix = os.path.join(self.directory, f"chunk_{len(self._chunks):05d}")
+        np.save(f"{prefix}.landmarks.npy", self._landmarks[:self._count])
+        np.save(f"{prefix}.detected.npy", self._detected[:self._count])
+        np.save(f"{prefix}.timestamps.npy", self._timestamps[:self._count])
+
+        self._chunks.append(self._count)
+        self._count = 0
+        self._write_meta()
+
+    def close(self):
+        """Flush the last partial chunk and finalize the index."""
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+
+    def _write_meta(self):
+        """Rewrite the index so a trace interrupted mid-recording stays readable."""
+        meta = {
+            "version": TRACE_VERSION,
+            "num_landmarks": self.num_landmarks,
+            "fps": self.fps,
+            "frame_size": list(self.frame_size) if self.frame_size else None,
+            "chunks": self._chunks,
+        }
+        path = os.path.join(self.directory, META_FILE)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+
+
+class LandmarkTraceReader:
+    """
+    Lazily read a trace written by LandmarkTraceWriter.
+
+    Chunks are opened one at a time as memory maps, so a multi-hour recording
+    never has to fit in RAM and no frame data is copied until it is used.
+    """
+
+    def __init__(self, directory):
+        """
+        Open a trace.
+
+        Args:
+            directory (str): Trace directory
+        """
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("version") != TRACE_VERSION:
+            raise ValueError(f"Unsupported landmark trace version: {meta.get('version')}")
+
+        self.num_landmarks = meta["num_landmarks"]
+        self.fps = meta.get("fps")
+        self.frame_size = tuple(meta["frame_size"]) if meta.get("frame_size") else None
+        self.chunk_lengths = meta["chunks"]
+
+    @staticmethod
+    def is_trace(path):
+        """
+        Check whether a path is a landmark trace directory.
+
+        Args:
+            path (str): Path to check
+
+        Returns:
+            bool: True if the directory holds a trace index
+        """
+        return os.path.isdir(path) and os.path.exists(os.path.join(path, META_FILE))
+
+    def __len__(self):
+        return sum(self.chunk_lengths)
+
+    def chunk(self, index):
+        """
+        Open one chunk as memory maps.
+
+        Args:
+            index (int): Chunk number
+
+        Returns:
+            LandmarkTraceChunk: Read-only memory-mapped columns
+        """
+        prefix = os.path.join(self.directory, f"chunk_{index:05d}")
+        return LandmarkTraceChunk(
+            np.load(f"{prefix}.landmarks.npy", mmap_mode='r'),
+            np.load(f"{prefix}.detected.npy", mmap_mode='r'),
+            np.load(f"{prefix}.timestamps.npy", mmap_mode='r'),
+            sum(self.chunk_lengths[:index])
+        )
+
+    def iter_chunks(self):
+        """
+        Iterate over the chunks in order, opening each only when it is reached.
+
+        Yields:
+            LandmarkTraceChunk: Next chunk
+        """
+        for index in range(len(self.chunk_lengths)):
+            yield self.chunk(index)
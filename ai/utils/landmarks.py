@@ -0,0 +1,84 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+
+class FaceLandmarks(Mapping):
+    """
+    Pixel coordinates of the face mesh landmarks of one frame.
+
+    The coordinates live in a single (N, 2) int32 array, so index sets such as
+    the eye points are gathered with one fancy-indexing operation
+    (`landmarks.gather(indices)`) instead of per-landmark dictionary lookups.
+
+    The Mapping interface (`idx in landmarks`, `landmarks[idx] -> (x, y)`,
+    `len`, iteration, truthiness) is kept as a compatibility view for code
+    written against the old `{index: (x, y)}` dictionary.
+    """
+
+    def __init__(self, points):
+        """
+        Initialize the landmarks.
+
+        Args:
+            points (np.ndarray): (N, 2) integer pixel coordinates; N is 0 when no face was found
+        """
+        self.points = points
+
+    def gather(self, indices):
+        """
+        Get the coordinates of several landmarks at once.
+
+        Args:
+            indices (list or np.ndarray): Landmark indices, any shape
+
+        Returns:
+            np.ndarray: Coordinates with shape indices.shape + (2,)
+        """
+        return self.points[indices]
+
+    def has_all(self, indices):
+        """
+        Check that every index refers to a detected landmark.
+
+        Args:
+            indices (list or np.ndarray): Landmark indices
+
+        Returns:
+            bool: True if all indices are within range
+        """
+        indices = np.asarray(indices)
+        return indices.size == 0 or (len(self.points) > 0 and 0 <= indices.min() and indices.max() < len(self.points))
+
+    def as_dict(self):
+        """
+        Build the legacy landmark dictionary.
+
+        Returns:
+            dict: Landmark index mapped to an (x, y) tuple
+        """
+        return {idx: (x, y) for idx, (x, y) in enumerate(self.points.tolist())}
+
+    def copy(self):
+        """
+        Copy the landmarks out of a reused buffer.
+
+        Returns:
+            FaceLandmarks: Landmarks owning their own array
+        """
+        return FaceLandmarks(self.points.copy())
+
+    def __getitem__(self, idx):
+        if not isinstance(idx, (int, np.integer)) or not 0 <= idx < len(self.points):
+            raise KeyError(idx)
+        x, y = self.points[idx]
+        return int(x), int(y)
+
+    def __contains__(self, idx):
+        return isinstance(idx, (int, np.integer)) and 0 <= idx < len(self.points)
+
+    def __iter__(self):
+        return iter(range(len(self.points)))
+
+    def __len__(self):
+        return len(self.points)
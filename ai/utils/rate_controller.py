@@ -0,0 +1,152 @@
+class AdaptiveRateController:
+    """
+    Choose how often and at which resolution face mesh inference runs.
+
+    Quality levels are (stride, input_scale) pairs ordered from best to
+    cheapest: inference runs on every stride-th frame, on a frame downscaled by
+    input_scale. The controller measures the cost of one inference at each level
+    and the rest of the per-frame work, and every `window` frames moves one level
+    down when the predicted frame cost exceeds the frame budget, or one level up
+    when the better level is known (or not yet measured) to fit comfortably.
+    Measurements of unused levels expire after probe_interval decisions, so a
+    device that speeds up again (e.g. after thermal throttling) is re-probed.
+
+    Strides are capped so consecutive inferences are never more than max_gap
+    seconds apart, which keeps even short blinks (100-400 ms) sampled; the
+    detector fills the skipped frames by interpolating EAR.
+    """
+
+    # (stride, input_scale) from best quality to cheapest
+    LEVELS = ((1, 1.0), (1, 0.75), (2, 0.75), (2, 0.5), (3, 0.5), (4, 0.5))
+
+    def __init__(self, fps, levels=None, max_gap=0.1, headroom=0.85, low_water=0.6,
+                 window=30, smoothing=0.1, probe_interval=10):
+        """
+        Initialize the controller at the best quality level.
+
+        Args:
+            fps (float): Camera frame rate; one frame period is the frame budget
+            levels (sequence): (stride, input_scale) pairs from best to cheapest, default LEVELS
+            max_gap (float): Longest allowed time between two inferences in seconds
+            headroom (float): Fraction of the frame budget above which quality is lowered
+            low_water (float): Fraction of the frame budget below which quality is raised
+            window (int): Frames between two level decisions
+            smoothing (float): Weight of the newest sample in the cost moving averages
+            probe_interval (int): Decisions after which an unused level's cost is measured again
+        """
+        self.fps = fps
+        self.frame_budget = 1.0 / fps
+        self.max_gap = max_gap
+        self.headroom = headroom
+        self.low_water = low_water
+        self.window = max(1, int(window))
+        self.smoothing = smoothing
+        self.probe_interval = probe_interval
+
+        # A stride of n leaves n / fps seconds between inferred frames
+        max_stride = max(1, int(max_gap * fps + 1e-9))
+        self.levels = [level for level in (levels or self.LEVELS) if level[0] <= max_stride]
+        if not self.levels:
+            raise ValueError("No quality level satisfies max_gap")
+        self.level = 0
+
+        # Moving averages in seconds: one inference per level, and all other per-frame work
+        self.inference_cost = {}
+        self.overhead_cost = None
+        self._measured_at = {}  # Decision count at which each level's cost was last updated
+        self._decisions = 0
+
+        self._countdown = 0
+        self._last_inference = 0.0
+        self._frames = 0
+        self.level_changes = 0
+
+    @property
+    def stride(self):
+        """int: Inference runs on every stride-th frame."""
+        return self.levels[self.level][0]
+
+    @property
+    def scale(self):
+        """float: Input scale for face mesh inference."""
+        return self.levels[self.level][1]
+
+    def should_infer(self):
+        """
+        Decide whether the next frame gets face mesh inference; call once per frame.
+
+        Returns:
+            bool: True if the frame should be inferred, False if it can be skipped
+        """
+        if self._countdown > 0:
+            self._countdown -= 1
+            return False
+        self._countdown = self.stride - 1
+        return True
+
+    def record_inference(self, seconds):
+        """
+        Record the cost of one face mesh inference at the current level.
+
+        Args:
+            seconds (float): Inference time
+        """
+        self._last_inference = seconds
+        self.inference_cost[self.level] = self._average(self.inference_cost.get(self.level), seconds)
+        self._measured_at[self.level] = self._decisions
+
+    def record_frame(self, seconds, inferred):
+        """
+        Record the total processing time of one frame and adjust the level when due.
+
+        Args:
+            seconds (float): Processing time of the frame, inference included
+            inferred (bool): Whether the frame was inferred (record_inference was called for it)
+        """
+        overhead = max(0.0, seconds - self._last_inference) if inferred else seconds
+        self.overhead_cost = self._average(self.overhead_cost, overhead)
+
+        self._frames += 1
+        if self._frames >= self.window:
+            self._frames = 0
+            self._adjust()
+
+    def predicted_cost(self, level=None):
+        """
+        Predict the average processing time per frame at a level.
+
+        Args:
+            level (int): Level index, default the current level
+
+        Returns:
+            float: Seconds per frame, or None while the level's inference cost is unknown
+        """
+        level = self.level if level is None else level
+        inference = self.inference_cost.get(level)
+        if inference is None or self.overhead_cost is None:
+            return None
+        return self.overhead_cost + inference / self.levels[level][0]
+
+    def _adjust(self):
+        """Move one level down when over budget, or one level up when the better level fits."""
+        self._decisions += 1
+        cost = self.predicted_cost()
+        if cost is None:
+            return
+
+        if cost > self.headroom * self.frame_budget and self.level < len(self.levels) - 1:
+            self.level += 1
+            self.level_changes += 1
+        elif self.level > 0:
+            better = self.predicted_cost(self.level - 1)
+            # Unmeasured or stale levels are tried optimistically once the current one has spare time
+            if better is None or self._decisions - self._measured_at[self.level - 1] > self.probe_interval:
+                self.inference_cost.pop(self.level - 1, None)
+                better = cost
+            if better < self.low_water * self.frame_budget:
+                self.level -= 1
+                self.level_changes += 1
+
+    def _average(self, current, sample):
+        """Exponential moving average update."""
+        return sample if current is None else current + self.smoothing * (sample - current)
@@ -0,0 +1,207 @@
+from collections import deque
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-capacity NumPy ring buffer of EAR values with constant-time window statistics.
+
+    Every append updates a running sum, a below-threshold counter and the
+    current closure run, so the moving average, PERCLOS and consecutive-closure
+    length of the last `capacity` frames are available without rescanning the
+    window. Completed closure runs are kept in a monotonic deque so the longest
+    run inside the window is also answered in O(1).
+
+    The closure statistics refer to a single threshold. Changing it with
+    set_threshold() recounts the window once (vectorized); appends stay O(1).
+    """
+
+    def __init__(self, capacity, threshold=None):
+        """
+        Initialize the buffer.
+
+        Args:
+            capacity (int): Number of most recent values kept (the window length)
+            threshold (float): Values below this count as closed, or None to disable closure statistics
+        """
+        self.capacity = max(1, int(capacity))
+        self.threshold = threshold
+
+        self._data = np.zeros(self.capacity, dtype=np.float64)
+        self._closed = np.zeros(self.capacity, dtype=bool)
+        self._total = 0  # Values appended since the last clear (absolute sequence number)
+        self._sum = 0.0
+        self._closed_count = 0
+        self._current_run = 0
+
+        # Completed closure runs as (start, end) sequence numbers, end exclusive
+        self._runs = deque()
+        # Subset of _runs with strictly decreasing length: each entry is the longest run after its predecessor
+        self._longest_runs = deque()
+
+    def __len__(self):
+        return min(self._total, self.capacity)
+
+    @property
+    def mean(self):
+        """float: Average of the values in the window (0.0 when empty)."""
+        size = len(self)
+        return self._sum / size if size else 0.0
+
+    @property
+    def closed_count(self):
+        """int: Number of values in the window below the threshold."""
+        return self._closed_count
+
+    @property
+    def perclos(self):
+        """float: Fraction of the window below the threshold (0-1 range)."""
+        size = len(self)
+        return self._closed_count / size if size else 0.0
+
+    @property
+    def current_run(self):
+        """int: Consecutive below-threshold values ending at the newest one (not capped at the window)."""
+        return self._current_run
+
+    def longest_run(self):
+        """
+        Get the longest run of consecutive below-threshold values inside the window.
+
+        Returns:
+            int: Length of the longest closure run, truncated to the window
+        """
+        window_start = self._total - len(self)
+        longest = min(self._current_run, len(self))
+
+        if self._runs:
+            # Only the oldest run can reach past the start of the window
+            start, end = self._runs[0]
+            longest = max(longest, end - max(start, window_start))
+
+        if self._longest_runs:
+            start, end = self._longest_runs[0]
+            if start < window_start:
+                # Truncated run, already counted above; the next entry is the longest after it
+                if len(self._longest_runs) > 1:
+                    start, end = self._longest_runs[1]
+                    longest = max(longest, end - start)
+            else:
+                longest = max(longest, end - start)
+
+        return longest
+
+    def append(self, value):
+        """
+        Add a value, evicting the oldest one when the buffer is full.
+
+        Args:
+            value (float): New EAR value
+        """
+        idx = self._total % self.capacity
+        if self._total >= self.capacity:
+            self._sum -= self._data[idx]
+            self._closed_count -= int(self._closed[idx])
+
+        is_closed = self.threshold is not None and value < self.threshold
+        self._data[idx] = value
+        self._closed[idx] = is_closed
+        self._sum += value
+        self._closed_count += int(is_closed)
+        self._total += 1
+
+        if is_closed:
+            self._current_run += 1
+        elif self._current_run:
+            self._push_run(self._total - 1 - self._current_run, self._total - 1)
+            self._current_run = 0
+
+        self._evict_runs()
+
+        # Re-sum once per lap so floating point drift in the running sum cannot accumulate
+        if idx == self.capacity - 1:
+            self._sum = float(self._data.sum())
+
+    def set_threshold(self, threshold):
+        """
+        Change the closure threshold, recounting the window if it differs.
+
+        Args:
+            threshold (float): New threshold, or None to disable closure statistics
+        """
+        if threshold == self.threshold:
+            return
+        self.threshold = threshold
+
+        values = self.values()
+        closed = values < threshold if threshold is not None else np.zeros(len(values), dtype=bool)
+        self._closed_count = int(closed.sum())
+
+        # Store the flags in ring order
+        offset = self._total - len(values)
+        self._closed[(offset + np.arange(len(values))) % self.capacity] = closed
+
+        # Rebuild the runs from the edges of the closed mask
+        edges = np.diff(np.concatenate(([0], closed.view(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+
+        self._runs.clear()
+        self._longest_runs.clear()
+        self._current_run = 0
+        if len(ends) and ends[-1] == len(values):
+            # A run touching the newest value is still open
+            self._current_run = int(ends[-1] - starts[-1])
+            starts, ends = starts[:-1], ends[:-1]
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            self._push_run(offset + start, offset + end)
+
+    def values(self):
+        """
+        Get the window in chronological order.
+
+        Returns:
+            np.ndarray: Copy of the values, oldest first
+        """
+        if self._total <= self.capacity:
+            return self._data[:self._total].copy()
+        idx = self._total % self.capacity
+        return np.concatenate((self._data[idx:], self._data[:idx]))
+
+    def latest(self, count):
+        """
+        Get the most recent values in chronological order.
+
+        Args:
+            count (int): Maximum number of values
+
+        Returns:
+            np.ndarray: Up to `count` values, oldest first
+        """
+        count = min(int(count), len(self))
+        return self._data[np.arange(self._total - count, self._total) % self.capacity]
+
+    def clear(self):
+        """Remove all values and closure runs."""
+        self._total = 0
+        self._sum = 0.0
+        self._closed_count = 0
+        self._current_run = 0
+        self._runs.clear()
+        self._longest_runs.clear()
+
+    def _push_run(self, start, end):
+        """Record a completed closure run [start, end)."""
+        self._runs.append((start, end))
+        while self._longest_runs and self._longest_runs[-1][1] - self._longest_runs[-1][0] <= end - start:
+            self._longest_runs.pop()
+        self._longest_runs.append((start, end))
+
+    def _evict_runs(self):
+        """Drop closure runs that ended before the window."""
+        window_start = self._total - len(self)
+        while self._runs and self._runs[0][1] <= window_start:
+            self._runs.popleft()
+        while self._longest_runs and self._longest_runs[0][1] <= window_start:
+            self._longest_runs.popleft()
@@ -0,0 +1,204 @@
+import math
+from collections import deque
+
+
+class RollingStats:
+    """
+    Sliding-window mean, standard deviation, minimum and maximum in O(1) per value.
+
+    Mean and variance use Welford's update in both directions (adding the new
+    value and removing the evicted one); minimum and maximum use monotonic
+    deques. The variance is re-summed from the window once per lap so rounding
+    errors cannot accumulate.
+    """
+
+    def __init__(self, window):
+        """
+        Initialize the statistics.
+
+        Args:
+            window (int): Number of most recent values covered
+        """
+        self.window = max(1, int(window))
+        self._values = deque()
+        self._mins = deque()  # Non-decreasing candidates for the minimum
+        self._maxs = deque()  # Non-increasing candidates for the maximum
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._pushes = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    @property
+    def mean(self):
+        """float: Mean of the window (0.0 when empty)."""
+        return self._mean
+
+    @property
+    def std(self):
+        """float: Population standard deviation of the window, like np.std."""
+        return math.sqrt(max(0.0, self._m2) / len(self._values)) if self._values else 0.0
+
+    @property
+    def min(self):
+        """float: Smallest value in the window, or None when empty."""
+        return self._mins[0] if self._mins else None
+
+    @property
+    def max(self):
+        """float: Largest value in the window, or None when empty."""
+        return self._maxs[0] if self._maxs else None
+
+    def push(self, value):
+        """
+        Add a value, evicting the oldest one when the window is full.
+
+        Args:
+            value (float): New value
+        """
+        if len(self._values) == self.window:
+            self._remove(self._values.popleft())
+
+        self._values.append(value)
+        delta = value - self._mean
+        self._mean += delta / len(self._values)
+        self._m2 += delta * (value - self._mean)
+
+        while self._mins and self._mins[-1] > value:
+            self._mins.pop()
+        self._mins.append(value)
+        while self._maxs and self._maxs[-1] < value:
+            self._maxs.pop()
+        self._maxs.append(value)
+
+        self._pushes += 1
+        if self._pushes % self.window == 0:
+            self._resum()
+
+    def clear(self):
+        """Remove all values."""
+        self._values.clear()
+        self._mins.clear()
+        self._maxs.clear()
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._pushes = 0
+
+    def _remove(self, value):
+        """Undo the contribution of an evicted value."""
+        count = len(self._values)  # Already excludes the evicted value
+        if count == 0:
+            self._mean = 0.0
+            self._m2 = 0.0
+        else:
+            delta = value - self._mean
+            self._mean -= delta / count
+            self._m2 -= delta * (value - self._mean)
+
+        if self._mins and self._mins[0] == value:
+            self._mins.popleft()
+        if self._maxs and self._maxs[0] == value:
+            self._maxs.popleft()
+
+    def _resum(self):
+        """Recompute mean and variance exactly from the window."""
+        count = len(self._values)
+        self._mean = math.fsum(self._values) / count
+        self._m2 = math.fsum((v - self._mean) ** 2 for v in self._values)
+
+
+class OscillationTracker:
+    """
+    Sign changes of the first difference and the mean of the oldest and newest
+    values of a sliding window, in O(1) per value.
+
+    This is the incremental form of
+    `np.sum(np.diff(np.signbit(np.diff(values))) != 0)` together with
+    `np.mean(values[:edge])` and `np.mean(values[-edge:])`.
+    """
+
+    def __init__(self, window, edge=10):
+        """
+        Initialize the tracker.
+
+        Args:
+            window (int): Number of most recent values covered
+            edge (int): Number of values averaged at each end of the window
+        """
+        self.window = max(2, int(window))
+        self.edge = max(1, min(int(edge), self.window))
+        self._values = deque()
+        self._falling = deque()  # signbit of each consecutive difference
+        self._changes = 0
+        self._head_sum = 0.0
+        self._tail_sum = 0.0
+        self._pushes = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    @property
+    def sign_changes(self):
+        """int: Number of direction changes inside the window."""
+        return self._changes
+
+    @property
+    def head_mean(self):
+        """float: Mean of the oldest `edge` values in the window."""
+        return self._head_sum / min(self.edge, len(self._values)) if self._values else 0.0
+
+    @property
+    def tail_mean(self):
+        """float: Mean of the newest `edge` values in the window."""
+        return self._tail_sum / min(self.edge, len(self._values)) if self._values else 0.0
+
+    def push(self, value):
+        """
+        Add a value, evicting the oldest one when the window is full.
+
+        Args:
+            value (float): New value
+        """
+        values = self._values
+
+        if len(values) == self.window:
+            # Evict the oldest value; the value at index `edge` moves into the head
+            self._head_sum -= values[0]
+            if self.edge < len(values):
+                self._head_sum += values[self.edge]
+            else:
+                self._tail_sum -= values[0]  # The tail spans the whole window
+            values.popleft()
+            falling = self._falling.popleft()
+            if self._falling and self._falling[0] != falling:
+                self._changes -= 1
+
+        if values:
+            falling = math.copysign(1.0, value - values[-1]) < 0
+            if self._falling and self._falling[-1] != falling:
+                self._changes += 1
+            self._falling.append(falling)
+
+        if len(values) < self.edge:
+            self._head_sum += value
+        else:
+            self._tail_sum -= values[-self.edge]
+        self._tail_sum += value
+        values.append(value)
+
+        # Re-sum the edges once per lap so rounding errors cannot accumulate
+        self._pushes += 1
+        if self._pushes % self.window == 0:
+            edge = min(self.edge, len(values))
+            self._head_sum = math.fsum(values[i] for i in range(edge))
+            self._tail_sum = math.fsum(values[-i] for i in range(1, edge + 1))
+
+    def clear(self):
+        """Remove all values."""
+        self._values.clear()
+        self._falling.clear()
+        self._changes = 0
+        self._head_sum = 0.0
+        self._tail_sum = 0.0
+        self._pushes = 0
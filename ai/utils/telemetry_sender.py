@@ -0,0 +1,395 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import requests
+
+from utils.instrumentation import Instrumentation
+
+
+class TelemetrySender:
+    """
+    Background delivery of detector status samples to the backend and Ubidots.
+
+    The frame loop only calls enqueue(), which never touches the network or the
+    disk. A worker thread drains the bounded in-memory queue in batches, retries
+    failed deliveries with exponential backoff and spills samples it could not
+    deliver, or that overflowed the queue, to an on-disk JSON Lines outbox, which
+    is replayed once the backend is reachable again.
+    """
+
+    UBIDOTS_URL = "https://industrial.api.ubidots.com/api/v1.6/devices/{device_label}"
+
+    def __init__(self, server_url, http_client, ubidots_token=None, device_label="esp32-cam",
+                 max_queue_size=600, batch_size=20, flush_interval=1.0,
+                 max_retries=4, backoff_base=0.5, backoff_max=30.0,
+                 outbox_path="DATA/OUTBOX/telemetry_outbox.jsonl", instrumentation=None):
+        """
+        Initialize the sender and start its worker thread.
+
+        Args:
+            server_url (str): Backend /vision endpoint, or None/"dummy_url" to skip the backend
+            http_client (PooledHttpClient): Keep-alive client shared with the detector
+            ubidots_token (str): Ubidots API token, or None to disable Ubidots forwarding
+            device_label (str): Ubidots device label
+            max_queue_size (int): Samples held in memory before the oldest are spilled to disk
+            batch_size (int): Maximum number of samples delivered per batch
+            flush_interval (float): Seconds to wait for a batch to fill before sending it
+            max_retries (int): Delivery attempts per batch before spilling it to the outbox
+            backoff_base (float): Initial retry delay in seconds, doubled after every failure
+            backoff_max (float): Upper bound for the retry delay in seconds
+            outbox_path (str): JSON Lines file holding undelivered samples
+            instrumentation (Instrumentation): Span timers for batch delivery, or None
+        """
+        self.server_url = server_url if server_url and server_url != "dummy_url" else None
+        self.batch_url = self.server_url.rstrip("/") + "/batch" if self.server_url else None
+        self._batch_supported = True  # Cleared if the backend has no /vision/batch endpoint
+        self.ubidots_token = ubidots_token
+        self.ubidots_url = self.UBIDOTS_URL.format(device_label=device_label)
+
+        # Pooled sessions so every batch reuses the same kept-alive connections
+        self.http_client = http_client
+        self.http_client.register("server")
+        if self.ubidots_token:
+            self.http_client.register("ubidots", headers={
+                "X-Auth-Token": self.ubidots_token,
+                "Content-Type": "application/json"
+            })
+
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.outbox_path = outbox_path
+        self.instrumentation = instrumentation or Instrumentation()
+
+        # Pending samples as (payload, status_alert) tuples
+        self._queue = deque()
+        # Oldest samples pushed out of a full queue, written to the outbox by the worker
+        self._overflow = []
+        self._cond = threading.Condition()
+        self._outbox_lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+        # Delivery statistics
+        self.sent_count = 0  # Samples the backend inserted
+        self.rejected_count = 0  # Samples the backend refused as invalid; never retried
+        self.failed_count = 0
+        self.spilled_count = 0
+
+        self._worker = threading.Thread(target=self._run, name="telemetry-sender", daemon=True)
+        self._worker.start()
+
+    def enqueue(self, payload, status_alert):
+        """
+        Queue a status sample for delivery without blocking.
+
+        Args:
+            payload (dict): Sample in the backend /vision format
+            status_alert (str): Detector alert state name (NORMAL, BLINK, DROWSY, MICROSLEEP)
+        """
+        with self._cond:
+            self._queue.append((payload, status_alert))
+            # The link has been down for a while; the worker keeps the oldest samples on disk instead
+            while len(self._queue) > self.max_queue_size:
+                self._overflow.append(self._queue.popleft())
+            self._cond.notify()
+
+    def pending(self):
+        """
+        Get the number of samples waiting in memory.
+
+        Returns:
+            int: Queue length
+        """
+        with self._cond:
+            return len(self._queue)
+
+    def close(self, timeout=5.0):
+        """
+        Stop the worker, delivering what is left in memory or spilling it to disk.
+
+        Args:
+            timeout (float): Seconds to wait for the worker to finish
+        """
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._worker.join(timeout)
+
+        # Whatever the worker did not get to survives until the next start
+        self._flush_overflow()
+        with self._cond:
+            leftover = list(self._queue)
+            self._queue.clear()
+        if leftover:
+            self._spill(leftover)
+
+    def _run(self):
+        """Worker loop: collect batches, deliver them and replay the outbox."""
+        # Samples left over from a previous session are delivered first
+        self._drain_outbox()
+
+        while not self._stop_event.is_set():
+            batch = self._next_batch()
+            self._flush_overflow()
+            if not batch:
+                continue
+
+            with self.instrumentation.span("telemetry_delivery"):
+                undelivered = self._deliver_with_retry(batch)
+            if undelivered:
+                self._spill(undelivered)
+            elif self.server_url:
+                # The backend is reachable again, so replay anything spilled earlier
+                self._drain_outbox()
+
+    def _next_batch(self):
+        """
+        Wait for samples and collect up to batch_size of them.
+
+        Returns:
+            list: (payload, status_alert) tuples, possibly empty
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._queue or self._overflow or self._stop_event.is_set())
+
+            # Give the batch a short time to fill up
+            deadline = time.time() + self.flush_interval
+            while len(self._queue) < self.batch_size and not self._stop_event.is_set():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            count = min(len(self._queue), self.batch_size)
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _deliver_with_retry(self, batch, include_ubidots=True):
+        """
+        Deliver a batch, retrying with exponential backoff.
+
+        Ubidots only mirrors the live status, so it is retried together with the
+        backend but samples it never accepted are not kept; the outbox exists for
+        the backend, which is the system of record.
+
+        Args:
+            batch (list): (payload, status_alert) tuples
+            include_ubidots (bool): Whether to forward the batch to Ubidots as well
+
+        Returns:
+            list: Samples the backend still has not accepted after all retries
+        """
+        server_pending = list(batch) if self.server_url else []
+        ubidots_pending = include_ubidots and bool(self.ubidots_token)
+        delay = self.backoff_base
+
+        for attempt in range(self.max_retries):
+            if ubidots_pending:
+                ubidots_pending = not self._send_to_ubidots(batch)
+
+            if server_pending:
+                processed, rejected = self._send_to_server(server_pending)
+                self.sent_count += processed - rejected
+                self.rejected_count += rejected
+                server_pending = server_pending[processed:]
+
+            if not server_pending and not ubidots_pending:
+                return []
+
+            if attempt < self.max_retries - 1:
+                print(f"🔄 Pengiriman gagal, mencoba lagi dalam {delay:.1f}s "
+                      f"({attempt + 1}/{self.max_retries})")
+                # Samples keep overflowing while the link is down
+                self._flush_overflow()
+                # Wake up early on shutdown; the caller spills what is left
+                if self._stop_event.wait(delay):
+                    break
+                delay = min(delay * 2, self.backoff_max)
+
+        self.failed_count += len(server_pending)
+        return server_pending
+
+    def _send_to_server(self, batch):
+        """
+        Deliver a batch to the backend.
+
+        The whole batch goes to /vision/batch in one request; backends without
+        that endpoint get one /vision post per sample instead.
+
+        Args:
+            batch (list): (payload, status_alert) tuples
+
+        Returns:
+            tuple: (processed, rejected) - number of leading samples the backend
+                   processed, and how many of those it rejected as invalid
+        """
+        if self._batch_supported:
+            result = self._send_batch_to_server(batch)
+            if result is not None:
+                return result
+
+        for index, (payload, _) in enumerate(batch):
+            try:
+                response = self.http_client.post("server", self.server_url, json=payload, timeout=3)
+                if not 200 <= response.status_code < 300:
+                    print(f"❌ Gagal kirim ke server. Status: {response.status_code}")
+                    return index, 0
+            except requests.exceptions.RequestException as e:
+                print(f"❌ Tidak dapat menghubungi server: {e}")
+                return index, 0
+
+        print(f"✅ {len(batch)} data berhasil dikirim ke server.")
+        return len(batch), 0
+
+    def _send_batch_to_server(self, batch):
+        """
+        Post a batch to the backend /vision/batch endpoint in one request.
+
+        Args:
+            batch (list): (payload, status_alert) tuples
+
+        Returns:
+            tuple: (processed, rejected) sample counts, or None if the endpoint is unavailable
+        """
+        try:
+            response = self.http_client.post(
+                "server", self.batch_url, json=[payload for payload, _ in batch], timeout=5
+            )
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Tidak dapat menghubungi server: {e}")
+            return 0, 0
+
+        if response.status_code in (404, 405):
+            print("⚠️ Server tidak mendukung /vision/batch, mengirim data satu per satu.")
+            self._batch_supported = False
+            return None
+
+        if response.status_code not in (200, 207):
+            print(f"❌ Gagal kirim ke server. Status: {response.status_code}")
+            return 0, 0
+
+        # Rejected samples are invalid, so retrying them would fail the same way
+        try:
+            rejected = [r for r in response.json().get("results", []) if r.get("status") != "inserted"]
+        except ValueError:
+            rejected = []
+        for result in rejected:
+            print(f"⚠️ Data ditolak server (index {result.get('index')}): {result.get('error')}")
+
+        print(f"✅ {len(batch) - len(rejected)} data berhasil dikirim ke server.")
+        return len(batch), len(rejected)
+
+    def _send_to_ubidots(self, batch):
+        """
+        Send a batch to Ubidots as a single multi-value request.
+
+        Args:
+            batch (list): (payload, status_alert) tuples
+
+        Returns:
+            bool: True if Ubidots accepted the request
+        """
+        latest_payload = batch[-1][0]
+        ubidots_payload = {
+            "driver_name": latest_payload.get("nama_sopir", "Unknown"),
+            "armada": latest_payload.get("armada", "Unknown"),
+            "rute": latest_payload.get("rute", "Unknown"),
+            # Every sample keeps its own timestamp (milliseconds) so no alert is lost
+            "status_alert": [
+                {
+                    "value": 1 if status_alert in ["DROWSY", "MICROSLEEP"] else 0,
+                    "timestamp": self._timestamp_ms(payload)
+                }
+                for payload, status_alert in batch
+            ]
+        }
+
+        try:
+            response = self.http_client.post("ubidots", self.ubidots_url, json=ubidots_payload, timeout=5)
+            response.raise_for_status()
+            print(f"✅ {len(batch)} data berhasil dikirim ke Ubidots.")
+            return True
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Gagal mengirim ke Ubidots: {str(e)}")
+            if getattr(e, 'response', None) is not None:
+                print(f"Detail error: {e.response.text}")
+            return False
+
+    @staticmethod
+    def _timestamp_ms(payload):
+        """
+        Get the sample time of a payload in Unix milliseconds.
+
+        Args:
+            payload (dict): Sample with an ISO-8601 "timestamp" field
+
+        Returns:
+            int: Timestamp in milliseconds, falling back to the current time
+        """
+        try:
+            return int(datetime.fromisoformat(payload["timestamp"]).timestamp() * 1000)
+        except (KeyError, TypeError, ValueError):
+            return int(time.time() * 1000)
+
+    def _flush_overflow(self):
+        """Write the samples that overflowed the queue to the outbox, on the calling (worker) thread."""
+        with self._cond:
+            overflow, self._overflow = self._overflow, []
+        if overflow:
+            self._spill(overflow)
+
+    def _spill(self, items):
+        """
+        Append undelivered samples to the outbox file.
+
+        Args:
+            items (list): (payload, status_alert) tuples
+        """
+        try:
+            with self._outbox_lock:
+                os.makedirs(os.path.dirname(self.outbox_path) or ".", exist_ok=True)
+                with open(self.outbox_path, "a", encoding="utf-8") as f:
+                    for payload, status_alert in items:
+                        f.write(json.dumps({"payload": payload, "status_alert": status_alert}) + "\n")
+            self.spilled_count += len(items)
+            print(f"💾 {len(items)} data disimpan ke outbox: {self.outbox_path}")
+        except OSError as e:
+            print(f"❌ Gagal menyimpan ke outbox: {e}")
+
+    def _drain_outbox(self):
+        """Replay spilled samples to the backend, keeping whatever still cannot be delivered."""
+        if not self.server_url:
+            return
+
+        with self._outbox_lock:
+            if not os.path.exists(self.outbox_path):
+                return
+            try:
+                with open(self.outbox_path, "r", encoding="utf-8") as f:
+                    records = [json.loads(line) for line in f if line.strip()]
+                os.remove(self.outbox_path)
+            except (OSError, ValueError) as e:
+                print(f"❌ Gagal membaca outbox: {e}")
+                return
+
+        items = [(record["payload"], record["status_alert"]) for record in records]
+        if items:
+            print(f"📤 Mengirim ulang {len(items)} data dari outbox...")
+
+        for start in range(0, len(items), self.batch_size):
+            if self._stop_event.is_set():
+                self._spill(items[start:])
+                return
+
+            batch = items[start:start + self.batch_size]
+            undelivered = self._deliver_with_retry(batch, include_ubidots=False)
+            if undelivered:
+                # Still offline; put this and the remaining batches back on disk
+                self._spill(undelivered + items[start + self.batch_size:])
+                return
@@ -0,0 +1,111 @@
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+# Modul level ai (utils/) bisa diimpor saat file ini dijalankan langsung
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from utils.ring_buffer import RingBuffer
+
+
+def longest_run(closed):
+    """Longest run of True values, by scanning."""
+    longest = current = 0
+    for is_closed in closed:
+        current = current + 1 if is_closed else 0
+        longest = max(longest, current)
+    return longest
+
+
+def current_run(closed):
+    """Run of True values ending at the last element."""
+    run = 0
+    for is_closed in reversed(closed):
+        if not is_closed:
+            break
+        run += 1
+    return run
+
+
+def ear_sequence(length, seed):
+    """EAR-like values: open eyes around 0.3 with closures of random length around 0.1."""
+    rng = np.random.default_rng(seed)
+    values = rng.normal(0.3, 0.03, length)
+    position = 0
+    while position < length:
+        position += int(rng.integers(1, 25))
+        closure = int(rng.integers(1, 40))
+        values[position:position + closure] = rng.normal(0.1, 0.03, len(values[position:position + closure]))
+        position += closure
+    return values
+
+
+class RingBufferTest(unittest.TestCase):
+    """Compare the incremental window statistics with recomputing them from the raw values."""
+
+    def assert_matches_window(self, buffer, history, threshold):
+        window = np.asarray(history[-buffer.capacity:])
+        closed = window < threshold if threshold is not None else np.zeros(len(window), dtype=bool)
+
+        np.testing.assert_allclose(buffer.values(), window)
+        self.assertEqual(len(buffer), len(window))
+        self.assertAlmostEqual(buffer.mean, window.mean() if len(window) else 0.0, places=12)
+        self.assertEqual(buffer.closed_count, int(closed.sum()))
+        self.assertAlmostEqual(buffer.perclos, closed.mean() if len(window) else 0.0, places=12)
+        self.assertEqual(buffer.longest_run(), longest_run(closed))
+
+    def test_statistics_after_wraparound(self):
+        for capacity in (1, 5, 90):
+            for seed in range(3):
+                with self.subTest(capacity=capacity, seed=seed):
+                    buffer = RingBuffer(capacity, threshold=0.2)
+                    history = []
+                    for value in ear_sequence(4 * capacity + 37, seed):
+                        buffer.append(value)
+                        history.append(value)
+                        self.assert_matches_window(buffer, history, 0.2)
+
+    def test_current_run_is_not_capped_at_the_window(self):
+        buffer = RingBuffer(5, threshold=0.2)
+        for value in [0.3] + [0.1] * 12:
+            buffer.append(value)
+
+        self.assertEqual(buffer.current_run, 12)
+        self.assertEqual(buffer.longest_run(), 5)
+        self.assertEqual(buffer.perclos, 1.0)
+
+    def test_set_threshold_recounts_the_window(self):
+        values = ear_sequence(500, seed=7)
+        buffer = RingBuffer(90, threshold=0.2)
+        history = []
+        thresholds = [0.15, 0.25, None, 0.2, 0.12]
+
+        for index, value in enumerate(values):
+            buffer.append(value)
+            history.append(value)
+            if index % 100 == 63:
+                buffer.set_threshold(thresholds[index // 100])
+                # A closure still open at the newest value carries over, counted within the window
+                window = np.asarray(history[-buffer.capacity:])
+                closed = window < buffer.threshold if buffer.threshold is not None else [False]
+                self.assertEqual(buffer.current_run, current_run(closed))
+            self.assert_matches_window(buffer, history, buffer.threshold)
+
+    def test_clear(self):
+        buffer = RingBuffer(4, threshold=0.2)
+        for value in [0.1, 0.1, 0.3, 0.1, 0.1, 0.1]:
+            buffer.append(value)
+        buffer.clear()
+
+        self.assert_matches_window(buffer, [], 0.2)
+        self.assertEqual(buffer.current_run, 0)
+
+        history = [0.3, 0.1, 0.1]
+        for value in history:
+            buffer.append(value)
+        self.assert_matches_window(buffer, history, 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
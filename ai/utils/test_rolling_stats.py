@@ -0,0 +1,83 @@
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+# Modul level ai (utils/) bisa diimpor saat file ini dijalankan langsung
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from utils.rolling_stats import OscillationTracker, RollingStats
+
+
+def ear_sequence(length, seed):
+    """Noisy EAR-like values with repeated values, so ties and flat stretches are covered."""
+    rng = np.random.default_rng(seed)
+    values = np.round(rng.normal(0.28, 0.05, length), 2)
+    values[length // 3:length // 3 + 15] = 0.1
+    return values
+
+
+class RollingStatsTest(unittest.TestCase):
+    """Compare the sliding-window statistics with NumPy over the same window."""
+
+    def test_statistics_after_wraparound(self):
+        for window in (1, 10, 30):
+            with self.subTest(window=window):
+                stats = RollingStats(window)
+                history = []
+                for value in ear_sequence(5 * window + 13, seed=window):
+                    stats.push(value)
+                    history.append(value)
+                    recent = np.asarray(history[-window:])
+
+                    self.assertEqual(len(stats), len(recent))
+                    self.assertAlmostEqual(stats.mean, recent.mean(), places=9)
+                    self.assertAlmostEqual(stats.std, recent.std(), places=9)
+                    self.assertEqual(stats.min, recent.min())
+                    self.assertEqual(stats.max, recent.max())
+
+    def test_clear(self):
+        stats = RollingStats(3)
+        for value in [0.2, 0.4, 0.1, 0.5]:
+            stats.push(value)
+        stats.clear()
+
+        self.assertEqual((len(stats), stats.mean, stats.std, stats.min, stats.max), (0, 0.0, 0.0, None, None))
+        stats.push(0.3)
+        self.assertEqual((stats.mean, stats.std, stats.min, stats.max), (0.3, 0.0, 0.3, 0.3))
+
+
+class OscillationTrackerTest(unittest.TestCase):
+    """Compare the tracker with the NumPy expressions it replaces."""
+
+    def test_matches_numpy_after_wraparound(self):
+        for window, edge in [(2, 1), (20, 10), (30, 10), (10, 10), (5, 20)]:
+            with self.subTest(window=window, edge=edge):
+                tracker = OscillationTracker(window, edge=edge)
+                history = []
+                for value in ear_sequence(4 * window + 11, seed=window + edge):
+                    tracker.push(value)
+                    history.append(value)
+                    recent = np.asarray(history[-tracker.window:])
+
+                    self.assertEqual(len(tracker), len(recent))
+                    self.assertEqual(tracker.sign_changes, int(np.sum(np.diff(np.signbit(np.diff(recent))) != 0)))
+                    self.assertAlmostEqual(tracker.head_mean, recent[:tracker.edge].mean(), places=9)
+                    self.assertAlmostEqual(tracker.tail_mean, recent[-tracker.edge:].mean(), places=9)
+
+    def test_clear(self):
+        tracker = OscillationTracker(6, edge=2)
+        for value in [0.3, 0.1, 0.3, 0.1]:
+            tracker.push(value)
+        self.assertEqual(tracker.sign_changes, 2)
+        tracker.clear()
+
+        self.assertEqual((len(tracker), tracker.sign_changes, tracker.head_mean, tracker.tail_mean), (0, 0, 0.0, 0.0))
+        for value in [0.2, 0.4]:
+            tracker.push(value)
+        self.assertEqual(tracker.sign_changes, 0)
+        self.assertAlmostEqual(tracker.head_mean, 0.3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Modul level ai (utils/) bisa diimpor saat file ini dijalankan langsung
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from utils.telemetry_sender import TelemetrySender
+
+
+class FakeResponse:
+    """Minimal stand-in for requests.Response."""
+
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self._body = body or {}
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeHttpClient:
+    """Stand-in for PooledHttpClient that answers /vision/batch with a fixed rejection pattern."""
+
+    def __init__(self, rejected_indices=()):
+        self.rejected_indices = set(rejected_indices)
+        self.batches = []
+
+    def register(self, destination, headers=None):
+        pass
+
+    def post(self, destination, url, json=None, timeout=5):
+        self.batches.append(json)
+        results = [
+            {"index": i, "status": "error", "error": "invalid"} if i in self.rejected_indices
+            else {"index": i, "status": "inserted", "id": str(i)}
+            for i in range(len(json))
+        ]
+        return FakeResponse(207 if self.rejected_indices else 200, {"results": results})
+
+
+def sample(i):
+    return {"nama_sopir": "Budi", "timestamp": f"2025-01-01T00:00:{i:02d}"}
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class TelemetrySenderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.outbox_path = os.path.join(self.tmp.name, "outbox.jsonl")
+
+    def make_sender(self, http_client, **kwargs):
+        sender = TelemetrySender("http://backend/vision", http_client, outbox_path=self.outbox_path,
+                                 flush_interval=0.05, backoff_base=0.01, **kwargs)
+        self.addCleanup(sender.close)
+        return sender
+
+    def test_rejected_samples_are_not_counted_as_sent(self):
+        sender = self.make_sender(FakeHttpClient(rejected_indices={1, 3}), batch_size=5)
+        for i in range(5):
+            sender.enqueue(sample(i), "NORMAL")
+        wait_until(lambda: sender.sent_count + sender.rejected_count == 5)
+        sender.close()
+
+        self.assertEqual(sender.sent_count, 3)
+        self.assertEqual(sender.rejected_count, 2)
+        self.assertEqual(sender.failed_count, 0)
+        self.assertFalse(os.path.exists(self.outbox_path))
+
+    def test_overflow_is_spilled_by_the_worker_not_by_enqueue(self):
+        http_client = FakeHttpClient()
+        posting = threading.Event()
+        release = threading.Event()
+        original_post = http_client.post
+
+        def blocked_post(*args, **kwargs):
+            # Hold the worker in delivery so the queue overflows
+            posting.set()
+            release.wait(5)
+            return original_post(*args, **kwargs)
+
+        http_client.post = blocked_post
+        sender = self.make_sender(http_client, max_queue_size=3, batch_size=1)
+        spill_threads = []
+        original_spill = sender._spill
+
+        def recording_spill(items):
+            spill_threads.append(threading.current_thread())
+            original_spill(items)
+
+        with mock.patch.object(sender, "_spill", side_effect=recording_spill):
+            sender.enqueue(sample(0), "NORMAL")
+            self.assertTrue(posting.wait(5))
+            for i in range(1, 10):
+                sender.enqueue(sample(i), "NORMAL")
+            # enqueue() itself never writes the outbox
+            self.assertEqual(spill_threads, [])
+            self.assertFalse(os.path.exists(self.outbox_path))
+
+            release.set()
+            wait_until(lambda: sender.sent_count == 10)
+
+        # The worker spilled the 6 overflowed samples, then replayed them once the backend answered
+        self.assertEqual(spill_threads, [sender._worker])
+        self.assertEqual(sender.spilled_count, 6)
+        self.assertEqual(sender.sent_count, 10)
+        self.assertFalse(os.path.exists(self.outbox_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
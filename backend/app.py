@@ -1,6 +1,5 @@
 # import certifi
 from flask import Flask, request, jsonify
-import requests
 from pymongo import MongoClient
 import datetime
 from datetime import datetime, timezone
@@ -8,6 +7,12 @@ from datetime import datetime, timezone
 from dotenv import load_dotenv
 import os
 
+from database.models import insert_samples, parse_batch_body
+from database.indexes import ensure_indexes
+from utils.ubidots_forwarder import UbidotsForwarder
+import atexit
+import threading
+
 load_dotenv()  # Baca file .env
 
 app = Flask(__name__)
@@ -15,6 +20,12 @@ app = Flask(__name__)
 # UBIDOTS setup
 UBIDOTS_TOKEN = os.getenv("UBIDOTS_TOKEN")
 DEVICE_LABEL = "esp32-cam"
+UBIDOTS_URL = os.getenv("UBIDOTS_URL", "https://industrial.api.ubidots.com")  # Can point at a local stub
+
+# Ubidots forwarding runs on a background worker instead of inside the request
+ubidots_forwarder = UbidotsForwarder(UBIDOTS_TOKEN, base_url=UBIDOTS_URL) if UBIDOTS_TOKEN else None
+if ubidots_forwarder is not None:
+    atexit.register(ubidots_forwarder.stop)
 
 # MongoDB setup
 MONGO_URI = os.getenv("MONGO_URI")
@@ -26,6 +37,38 @@ client = MongoClient(
 db = client["MicrosleepDetector"]
 collection = db["information"]
 
+# Create the dashboard / data indexes (no-op when they already exist).
+# Runs in the background so a slow MongoDB does not delay startup.
+def bootstrap_indexes():
+    try:
+        ttl_days = os.getenv("RAW_SAMPLE_TTL_DAYS")
+        ensure_indexes(collection, raw_sample_ttl_days=float(ttl_days) if ttl_days else None)
+    except Exception as e:
+        print("Index bootstrap failed:", e)
+
+threading.Thread(target=bootstrap_indexes, daemon=True).start()
+
+def forward_to_ubidots(data):
+    """Queue one sample for the background Ubidots forwarder without blocking the request"""
+    if ubidots_forwarder is None:
+        return False
+
+    try:
+        timestamp_ms = int(datetime.fromisoformat(data["timestamp"]).timestamp() * 1000)
+    except (KeyError, TypeError, ValueError):
+        timestamp_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+
+    return ubidots_forwarder.submit(
+        DEVICE_LABEL,
+        1 if data.get("status_alert") == "MICROSLEEP" else 0,
+        timestamp_ms,
+        context={
+            "driver_name": data.get("nama_sopir", "Unknown"),
+            "armada": data.get("armada", "Unknown"),
+            "rute": data.get("rute", "Unknown"),
+        }
+    )
+
 @app.route("/vision", methods=["POST"])
 def receive_vision_data():
     try:
@@ -43,31 +86,49 @@ def receive_vision_data():
         result = collection.insert_one(document)
         print("Inserted to MongoDB with ID:", result.inserted_id)
 
-        ubidots_payload = {
-            "driver_name": data.get("nama_sopir", "Unknown"),
-            "armada": data.get("armada", "Unknown"),
-            "rute": data.get("rute", "Unknown"),
-            "timestamp": data.get("timestamp", datetime.now(timezone.utc).isoformat()),
-            "status_alert": 1 if data.get("status_alert") == "MICROSLEEP" else 0
-        }
-
-        headers = {
-            "X-Auth-Token": UBIDOTS_TOKEN,
-            "Content-Type": "application/json"
-        }
-
-        url = f"https://industrial.api.ubidots.com/api/v1.6/devices/{DEVICE_LABEL}"
-        response = requests.post(url, headers=headers, json=ubidots_payload)
-        print("Ubidots response:", response.status_code)
+        if ubidots_forwarder is None:
+            ubidots_response = {"message": "Ubidots integration disabled"}
+        elif forward_to_ubidots(data):
+            ubidots_response = {"message": "queued"}
+        else:
+            ubidots_response = {"error": "forwarding queue full"}
 
         return jsonify({
             "status": "success",
-            "ubidots_response": response.json() if response.status_code == 200 else {"error": response.status_code}
+            "ubidots_response": ubidots_response
         })
     except Exception as e:
         print("ERROR:", e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route("/vision/batch", methods=["POST"])
+def receive_vision_batch():
+    """Endpoint untuk menerima banyak data deteksi sekaligus (JSON array atau NDJSON)"""
+    try:
+        items = parse_batch_body(request.get_data(), request.content_type)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        results = insert_samples(collection, items, default_status="NORMAL")
+        for result in results:
+            if result["status"] == "inserted":
+                forward_to_ubidots(items[result["index"]])
+        inserted = sum(1 for r in results if r["status"] == "inserted")
+        failed = len(results) - inserted
+        print(f"Batch received: {len(results)} samples, {inserted} inserted, {failed} failed")
+
+        return jsonify({
+            "status": "success" if failed == 0 else "partial",
+            "inserted": inserted,
+            "failed": failed,
+            "results": results
+        }), 200 if failed == 0 else 207
+    except Exception as e:
+        print("ERROR:", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5001)
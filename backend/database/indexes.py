@@ -0,0 +1,244 @@
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo.errors import OperationFailure
+
+# Indexes for the `information` collection, following the access patterns of
+# /data and the Streamlit dashboard. Equality fields come first, then the sort /
+# range field (timestamp), so filtered date-range queries stay index-bounded.
+INDEXES = [
+    # /data: latest samples first; dashboards: date-range scans over all statuses
+    {"name": "timestamp_desc", "keys": [("timestamp", DESCENDING)]},
+    # Alert-only pages (Log Alert, Klasifikasi, Rekomendasi, Analitik) by date range
+    {"name": "status_timestamp", "keys": [("status_alert", ASCENDING), ("timestamp", ASCENDING)]},
+    # Alerts per driver in time order (event segmentation, driver filter)
+    {"name": "status_driver_timestamp",
+     "keys": [("status_alert", ASCENDING), ("nama_sopir", ASCENDING), ("timestamp", ASCENDING)]},
+    # Dashboard driver filter over all statuses (shift distribution, primary shift)
+    {"name": "driver_timestamp", "keys": [("nama_sopir", ASCENDING), ("timestamp", ASCENDING)]},
+    # Log Alert armada and route filters
+    {"name": "status_armada_timestamp",
+     "keys": [("status_alert", ASCENDING), ("armada", ASCENDING), ("timestamp", ASCENDING)]},
+    {"name": "status_rute_timestamp",
+     "keys": [("status_alert", ASCENDING), ("rute", ASCENDING), ("timestamp", ASCENDING)]},
+]
+
+# Name of the optional TTL index that expires raw (non-alert) samples
+RAW_SAMPLE_TTL_INDEX = "raw_sample_ttl"
+
+
+def ensure_indexes(collection, raw_sample_ttl_days=None, raw_status="OFF"):
+    """
+    Create the dashboard indexes on the information collection.
+
+    create_index is a no-op for indexes that already exist, so this is safe to
+    call on every startup.
+
+    Args:
+        collection (pymongo.collection.Collection): The information collection
+        raw_sample_ttl_days (float): Expire samples with status `raw_status` after this
+                                    many days, or None to keep all samples
+        raw_status (str): status_alert value of raw heartbeat samples
+
+    Returns:
+        list: Names of the indexes that were ensured
+    """
+    names = []
+    for index in INDEXES:
+        names.append(collection.create_index(index["keys"], name=index["name"], background=True))
+
+    if raw_sample_ttl_days:
+        expire_after = int(raw_sample_ttl_days * 86400)
+        try:
+            names.append(collection.create_index(
+                [("timestamp", ASCENDING)],
+                name=RAW_SAMPLE_TTL_INDEX,
+                expireAfterSeconds=expire_after,
+                # Alerts are kept forever; only heartbeat samples expire
+                partialFilterExpression={"status_alert": raw_status},
+                background=True
+            ))
+        except OperationFailure:
+            # The TTL changed since the index was created; update it in place
+            collection.database.command(
+                "collMod", collection.name,
+                index={"name": RAW_SAMPLE_TTL_INDEX, "expireAfterSeconds": expire_after}
+            )
+            names.append(RAW_SAMPLE_TTL_INDEX)
+
+    return names
+
+
+def _dashboard_query_module():
+    """
+    Import components.queries of the Streamlit dashboard, which builds the page queries.
+
+    Returns:
+        module: streamlit_dashboard/components/queries.py
+    """
+    dashboard_dir = str(Path(__file__).resolve().parents[2] / "streamlit_dashboard")
+    if dashboard_dir not in sys.path:
+        sys.path.append(dashboard_dir)
+    from components import queries
+    return queries
+
+
+def dashboard_queries(collection, days=7):
+    """
+    Build the commands /data and the dashboard pages issue, for plan diagnostics.
+
+    The filters and aggregation pipelines come from the dashboard's own query
+    builders, so the plans match what the pages run. Analitik Shift aggregates
+    the whole collection without a filter; that scan is intended and left out.
+
+    Args:
+        collection (pymongo.collection.Collection): The information collection
+        days (int): Size of the representative date range in days
+
+    Returns:
+        list: (name, command) tuples; command is a find, distinct or aggregate command document
+    """
+    queries = _dashboard_query_module()
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=days)
+    name = collection.name
+
+    def aggregate(pipeline):
+        return {"aggregate": name, "pipeline": pipeline, "cursor": {}, "allowDiskUse": True}
+
+    commands = [
+        ("/data (10 terbaru)", {
+            "find": name, "filter": {}, "projection": {"_id": 0}, "sort": {"timestamp": -1}, "limit": 10
+        }),
+    ]
+    for label, status in [("semua status", None), ("alert", "ON")]:
+        match = queries._match_stage(status=status)
+        for projection, sort in queries.FILTER_BOUNDS:
+            bound = "awal" if sort[0][1] == ASCENDING else "akhir"
+            commands.append((f"Filter ({label}): tanggal {bound}", {
+                "find": name, "filter": match, "projection": projection, "sort": dict(sort), "limit": 1
+            }))
+        for field in queries.FILTER_FIELDS:
+            commands.append((f"Filter ({label}): distinct {field}", {"distinct": name, "key": field, "query": match}))
+
+    commands += [
+        ("Dashboard: ringkasan", aggregate(queries.dashboard_summary_pipeline(start_date, end_date))),
+        ("Dashboard: ringkasan + pengemudi",
+         aggregate(queries.dashboard_summary_pipeline(start_date, end_date, ["Budi"]))),
+        ("Log Alert: event per pengemudi dan shift",
+         aggregate(queries.alert_events_pipeline(collection, start_date, end_date))),
+        ("Log Alert: event per armada",
+         aggregate(queries.alert_events_pipeline(collection, start_date, end_date, armadas=["BUS-001"]))),
+        ("Log Alert: event per rute",
+         aggregate(queries.alert_events_pipeline(collection, start_date, end_date, routes=["Jakarta-Bandung"]))),
+        ("Log Alert: event per pengemudi",
+         aggregate(queries.alert_events_pipeline(collection, start_date, end_date, drivers=["Budi"]))),
+        ("Klasifikasi: shift terbanyak", aggregate(queries.primary_shift_pipeline(start_date, end_date))),
+        ("Klasifikasi: event per pengemudi",
+         aggregate(queries.alert_events_pipeline(collection, start_date, end_date, by_shift=False))),
+        ("Rekomendasi: profil pengemudi",
+         aggregate(queries.driver_shift_profile_pipeline(collection, start_date, end_date))),
+    ]
+    return commands
+
+
+def summarize_plan(explain):
+    """
+    Reduce an explain document to the stages and indexes of the winning plan.
+
+    Args:
+        explain (dict): Output of the explain command for find, distinct or aggregate
+
+    Returns:
+        dict: stages, indexes and execution statistics (when available)
+    """
+    stages, indexes = [], []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if "stage" in node:
+                stages.append(node["stage"])
+            if "indexName" in node:
+                indexes.append(node["indexName"])
+            for key, value in node.items():
+                # Rejected plans would make the summary misleading
+                if key != "rejectedPlans":
+                    walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    # Aggregations report the plan of their initial $match under stages[0].$cursor
+    cursor = explain
+    if explain.get("stages"):
+        cursor = explain["stages"][0].get("$cursor", explain)
+    walk(cursor.get("queryPlanner", {}).get("winningPlan", cursor))
+    for stage in explain.get("stages", [])[1:]:
+        stages.extend(key for key in stage if key.startswith("$"))
+
+    summary = {"stages": list(dict.fromkeys(stages)), "indexes": list(dict.fromkeys(indexes))}
+    stats = cursor.get("executionStats", {})
+    for key in ["nReturned", "totalKeysExamined", "totalDocsExamined", "executionTimeMillis"]:
+        if key in stats:
+            summary[key] = stats[key]
+    return summary
+
+
+def explain_queries(collection, days=7):
+    """
+    Print the winning plan of every dashboard and /data query.
+
+    Args:
+        collection (pymongo.collection.Collection): The information collection
+        days (int): Size of the representative date range in days
+    """
+    for name, command in dashboard_queries(collection, days):
+        explain = collection.database.command("explain", command, verbosity="executionStats")
+        summary = summarize_plan(explain)
+        scan = "COLLSCAN ⚠️" if "COLLSCAN" in summary["stages"] else "IXSCAN ✅"
+        print(f"\n▶ {name}: {scan}")
+        print(f"  stages : {' -> '.join(summary['stages'])}")
+        print(f"  indexes: {', '.join(summary['indexes']) or '-'}")
+        if "nReturned" in summary:
+            print(f"  returned {summary['nReturned']}, keys examined {summary.get('totalKeysExamined')}, "
+                  f"docs examined {summary.get('totalDocsExamined')}, {summary.get('executionTimeMillis')} ms")
+
+
+def get_collection():
+    """
+    Connect to the information collection using the backend .env configuration.
+
+    Returns:
+        pymongo.collection.Collection: The information collection
+    """
+    env_path = Path(__file__).resolve().parent / ".env"
+    if not env_path.exists():
+        env_path = Path(__file__).resolve().parents[1] / ".env"
+    load_dotenv(dotenv_path=env_path)
+
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/"))
+    db = client[os.getenv("MONGO_DB_NAME", "MicrosleepDetector")]
+    return db[os.getenv("MONGO_COLLECTION", "information")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Buat index koleksi information dan tampilkan query plan")
+    parser.add_argument("--ttl-days", type=float, default=None,
+                        help="Hapus otomatis sampel status OFF setelah N hari (default: tidak aktif)")
+    parser.add_argument("--explain", action="store_true",
+                        help="Tampilkan explain() untuk setiap query dashboard dan /data")
+    parser.add_argument("--days", type=int, default=7,
+                        help="Rentang tanggal contoh untuk --explain (default: 7)")
+    args = parser.parse_args()
+
+    collection = get_collection()
+    created = ensure_indexes(collection, raw_sample_ttl_days=args.ttl_days)
+    print(f"✅ Index tersedia: {', '.join(created)}")
+
+    if args.explain:
+        explain_queries(collection, days=args.days)
@@ -4,8 +4,16 @@ from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
 from pathlib import Path
+import atexit
+import threading
+import sys
 
-import requests
+# Paket level backend (database/, utils/) bisa diimpor saat file ini dijalankan langsung
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from database.models import insert_samples, parse_batch_body
+from database.indexes import ensure_indexes
+from utils.ubidots_forwarder import UbidotsForwarder
 
 # Inisialisasi Flask
 app = Flask(__name__)  # Tambahkan inisialisasi app
@@ -21,6 +29,11 @@ else:
 # Ubidots configuration
 UBIDOTS_TOKEN = os.getenv("UBIDOTS_TOKEN")
 DEVICE_LABEL = os.getenv("DEVICE_LABEL", "esp32-cam")  # Tambahkan definisi DEVICE_LABEL
+UBIDOTS_URL = os.getenv("UBIDOTS_URL", "https://industrial.api.ubidots.com")  # Bisa diarahkan ke stub lokal
+
+# Pengiriman ke Ubidots berjalan di background worker, bukan di dalam request.
+# Dibuat oleh start_background_workers() di proses yang melayani request.
+ubidots_forwarder = None
 
 # MongoDB configuration
 mongo_uri = os.getenv("MONGO_URI")
@@ -36,6 +49,24 @@ print("Client config OK")
 db = client["MicrosleepDetector"]
 collection = db["information"]
 
+# Pastikan index untuk query dashboard dan /data tersedia (idempoten).
+# Dijalankan di background agar server tetap bisa start walau MongoDB lambat.
+def bootstrap_indexes():
+    try:
+        ttl_days = os.getenv("RAW_SAMPLE_TTL_DAYS")
+        ensure_indexes(collection, raw_sample_ttl_days=float(ttl_days) if ttl_days else None)
+        print("Index OK")
+    except Exception as e:
+        print("Index bootstrap failed:", e)
+
+def start_background_workers():
+    """Jalankan forwarder Ubidots dan bootstrap index (sekali per proses server)"""
+    global ubidots_forwarder
+    if UBIDOTS_TOKEN and ubidots_forwarder is None:
+        ubidots_forwarder = UbidotsForwarder(UBIDOTS_TOKEN, base_url=UBIDOTS_URL)
+        atexit.register(ubidots_forwarder.stop)
+    threading.Thread(target=bootstrap_indexes, daemon=True).start()
+
 # Cek apakah perlu mengisi data dummy (hanya jika collection kosong)
 # if collection.count_documents({}) == 0:
 #     data_dummy = [
@@ -50,6 +81,27 @@ collection = db["information"]
 #     result = collection.insert_many(data_dummy)
 #     print(f"{len(result.inserted_ids)} data dummy berhasil dimasukkan.")
 
+def forward_to_ubidots(data):
+    """Masukkan satu sampel ke antrean forwarder Ubidots (tidak memblokir request)"""
+    if ubidots_forwarder is None:
+        return False
+
+    try:
+        timestamp_ms = int(datetime.fromisoformat(data["timestamp"]).timestamp() * 1000)
+    except (KeyError, TypeError, ValueError):
+        timestamp_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+
+    return ubidots_forwarder.submit(
+        DEVICE_LABEL,
+        1 if data.get("status_alert") == "ON" else 0,
+        timestamp_ms,
+        context={
+            "driver_name": data.get("nama_sopir", "Unknown"),
+            "armada": data.get("armada", "Unknown"),
+            "rute": data.get("rute", "Unknown"),
+        }
+    )
+
 @app.route("/vision", methods=["POST"])
 def receive_vision_data():
     try:
@@ -68,41 +120,50 @@ def receive_vision_data():
         result = collection.insert_one(document)
         print("Inserted to MongoDB with ID:", result.inserted_id)
 
-        # Jika UBIDOTS_TOKEN tersedia, kirim data ke Ubidots
-        if UBIDOTS_TOKEN:
-            ubidots_payload = {
-                "driver_name": data.get("nama_sopir", "Unknown"),
-                "armada": data.get("armada", "Unknown"),
-                "rute": data.get("rute", "Unknown"),
-                "timestamp": data.get("timestamp", datetime.now(timezone.utc).isoformat()),
-                "status_alert": 1 if data.get("status_alert") == "ON" else 0
-            }
-
-            headers = {
-                "X-Auth-Token": UBIDOTS_TOKEN,
-                "Content-Type": "application/json"
-            }
-
-            try:
-                url = f"https://industrial.api.ubidots.com/api/v1.6/devices/{DEVICE_LABEL}"
-                response = requests.post(url, headers=headers, json=ubidots_payload, timeout=3)
-                print("Ubidots response:", response.status_code)
-                ubidots_response = response.json() if response.status_code == 200 else {"error": response.status_code}
-            except requests.exceptions.RequestException as e:
-                print("Ubidots connection error:", e)
-                ubidots_response = {"error": str(e)}
+        # Jika UBIDOTS_TOKEN tersedia, antrekan data untuk dikirim ke Ubidots
+        if ubidots_forwarder is None:
+            ubidots_response = {"message": "Ubidots integration disabled"}
+        elif forward_to_ubidots(data):
+            ubidots_response = {"message": "queued"}
         else:
-            ubidots_response = {"message": "UBIDOTS_TOKEN not configured"}
+            ubidots_response = {"error": "forwarding queue full"}
 
         return jsonify({
             "status": "success",
             "mongodb_id": str(result.inserted_id),
-            "ubidots_response": ubidots_response if UBIDOTS_TOKEN else {"message": "Ubidots integration disabled"}
+            "ubidots_response": ubidots_response
         })
     except Exception as e:
         print("ERROR:", e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route("/vision/batch", methods=["POST"])
+def receive_vision_batch():
+    """Endpoint untuk menerima banyak data deteksi sekaligus (JSON array atau NDJSON)"""
+    try:
+        items = parse_batch_body(request.get_data(), request.content_type)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        results = insert_samples(collection, items, default_status="OFF")
+        for result in results:
+            if result["status"] == "inserted":
+                forward_to_ubidots(items[result["index"]])
+        inserted = sum(1 for r in results if r["status"] == "inserted")
+        failed = len(results) - inserted
+        print(f"Batch received: {len(results)} samples, {inserted} inserted, {failed} failed")
+
+        return jsonify({
+            "status": "success" if failed == 0 else "partial",
+            "inserted": inserted,
+            "failed": failed,
+            "results": results
+        }), 200 if failed == 0 else 207
+    except Exception as e:
+        print("ERROR:", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @app.route("/status", methods=["GET"])
 def status():
     """Endpoint untuk memeriksa status server"""
@@ -115,6 +176,7 @@ def status():
             "mongodb_connection": "OK" if document else "Connected but empty collection",
             "database": db.name,
             "collection": collection.name,
+            "ubidots_forwarder": ubidots_forwarder.get_statistics() if ubidots_forwarder else "disabled",
             "timestamp": datetime.now().isoformat()
         })
     except Exception as e:
@@ -157,6 +219,7 @@ def root():
         "endpoints": [
             {"path": "/", "method": "GET", "description": "This information"},
             {"path": "/vision", "method": "POST", "description": "Send microsleep detection data"},
+            {"path": "/vision/batch", "method": "POST", "description": "Send many detection samples (JSON array or NDJSON)"},
             {"path": "/status", "method": "GET", "description": "Check server status"},
             {"path": "/data", "method": "GET", "description": "Get recent data"}
         ],
@@ -164,6 +227,13 @@ def root():
     })
 
 if __name__ == "__main__":
+    # debug=True menjalankan reloader Werkzeug: modul ini dieksekusi lagi di proses anak
+    # (WERKZEUG_RUN_MAIN) yang melayani request, sedangkan proses induk hanya memantau file
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_workers()
     print("Starting Microsleep Detector Server on port 5000...")
     print(f"Database: {db.name}, Collection: {collection.name}")
-    app.run(host="0.0.0.0", port=5001, debug=True)  # Tambahkan debug=True untuk melihat error
\ No newline at end of file
+    app.run(host="0.0.0.0", port=5001, debug=True)  # Tambahkan debug=True untuk melihat error
+else:
+    # Diimpor oleh server WSGI
+    start_background_workers()
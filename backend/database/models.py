@@ -0,0 +1,135 @@
+import json
+from datetime import datetime, timezone
+
+from pymongo.errors import BulkWriteError
+
+# Fields of a document in the `information` collection
+SAMPLE_FIELDS = ["nama_sopir", "timestamp", "armada", "rute", "status_alert"]
+
+# Maximum number of samples accepted in one /vision/batch request
+MAX_BATCH_SIZE = 1000
+
+
+def build_document(data, default_status="OFF"):
+    """
+    Validate one incoming sample and convert it to an `information` document.
+
+    Args:
+        data (dict): Sample as posted by the detector
+        default_status (str): status_alert used when the sample has none
+
+    Returns:
+        dict: Document ready to be inserted
+
+    Raises:
+        ValueError: If the sample is not an object or has invalid fields
+    """
+    if not isinstance(data, dict):
+        raise ValueError("sample must be a JSON object")
+
+    for field in ["nama_sopir", "armada", "rute", "status_alert", "timestamp"]:
+        if field in data and not isinstance(data[field], str):
+            raise ValueError(f"'{field}' must be a string")
+
+    try:
+        timestamp = datetime.fromisoformat(data.get("timestamp", datetime.now(timezone.utc).isoformat()))
+    except ValueError:
+        raise ValueError(f"invalid timestamp: {data.get('timestamp')!r}")
+
+    return {
+        "nama_sopir": data.get("nama_sopir", "Unknown"),
+        "timestamp": timestamp,
+        "armada": data.get("armada", "Unknown"),
+        "rute": data.get("rute", "Unknown"),
+        "status_alert": data.get("status_alert", default_status),
+    }
+
+
+def parse_batch_body(body, content_type):
+    """
+    Parse a /vision/batch request body into a list of raw samples.
+
+    Accepts either a JSON array or an NDJSON stream (one JSON object per line,
+    sent with an application/x-ndjson content type). Lines of an NDJSON stream
+    that cannot be decoded are returned as ValueError instances so they can be
+    reported per item instead of rejecting the whole upload.
+
+    Args:
+        body (bytes): Raw request body
+        content_type (str): Request Content-Type header
+
+    Returns:
+        list: Raw samples (dicts) or ValueError instances, in request order
+
+    Raises:
+        ValueError: If the body is not a JSON array or NDJSON stream, or is too large
+    """
+    text = body.decode("utf-8")
+
+    if "ndjson" in (content_type or "") or "jsonlines" in (content_type or ""):
+        items = []
+        for line_number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                items.append(ValueError(f"line {line_number}: {e.msg}"))
+    else:
+        try:
+            items = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"invalid JSON: {e.msg}")
+        if not isinstance(items, list):
+            raise ValueError("request body must be a JSON array of samples")
+
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f"batch too large: {len(items)} samples (max {MAX_BATCH_SIZE})")
+
+    return items
+
+
+def insert_samples(collection, items, default_status="OFF"):
+    """
+    Validate a batch of samples and insert the valid ones with one unordered insert_many.
+
+    Args:
+        collection (pymongo.collection.Collection): Target collection
+        items (list): Raw samples as returned by parse_batch_body
+        default_status (str): status_alert used when a sample has none
+
+    Returns:
+        list: One result per item, in request order, with "index", "status"
+              ("inserted" or "error") and either "id" or "error"
+    """
+    results = [None] * len(items)
+    documents = []
+    document_indices = []
+
+    # Validate everything first so a bad sample never reaches the database
+    for index, item in enumerate(items):
+        try:
+            if isinstance(item, ValueError):
+                raise item
+            documents.append(build_document(item, default_status))
+            document_indices.append(index)
+        except ValueError as e:
+            results[index] = {"index": index, "status": "error", "error": str(e)}
+
+    write_errors = {}
+    if documents:
+        try:
+            # Unordered so one failing document does not stop the rest of the batch
+            collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                write_errors[error["index"]] = error.get("errmsg", "write error")
+
+    # insert_many assigns _id to each document client-side, so ids are known even on partial failure
+    for position, (index, document) in enumerate(zip(document_indices, documents)):
+        if position in write_errors:
+            results[index] = {"index": index, "status": "error", "error": write_errors[position]}
+        else:
+            results[index] = {"index": index, "status": "inserted", "id": str(document["_id"])}
+
+    return results
@@ -0,0 +1,101 @@
+import json
+import sys
+import unittest
+from pathlib import Path
+
+import mongomock
+
+# Paket level backend (database/) bisa diimpor saat file ini dijalankan langsung
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from database.models import MAX_BATCH_SIZE, insert_samples, parse_batch_body
+
+
+def sample(index, **fields):
+    """One detector sample with a distinct timestamp per index."""
+    data = {
+        "nama_sopir": "Budi",
+        "timestamp": f"2025-01-01T08:{index // 60:02d}:{index % 60:02d}",
+        "armada": "BUS-001",
+        "rute": "Jakarta-Bandung",
+        "status_alert": "ON",
+    }
+    data.update(fields)
+    return data
+
+
+class ParseBatchBodyTest(unittest.TestCase):
+    """JSON array and NDJSON bodies of /vision/batch."""
+
+    def test_json_array(self):
+        items = [sample(0), sample(1)]
+        self.assertEqual(parse_batch_body(json.dumps(items).encode(), "application/json"), items)
+
+    def test_json_body_must_be_an_array(self):
+        with self.assertRaisesRegex(ValueError, "JSON array"):
+            parse_batch_body(json.dumps(sample(0)).encode(), "application/json")
+        with self.assertRaisesRegex(ValueError, "invalid JSON"):
+            parse_batch_body(b"[{", "application/json")
+
+    def test_ndjson_reports_bad_lines_in_place(self):
+        body = "\n".join([json.dumps(sample(0)), "", "{not json", json.dumps(sample(1))]).encode()
+        items = parse_batch_body(body, "application/x-ndjson; charset=utf-8")
+
+        self.assertEqual(len(items), 3)  # The blank line is skipped
+        self.assertEqual(items[0], sample(0))
+        self.assertIsInstance(items[1], ValueError)
+        self.assertIn("line 3", str(items[1]))
+        self.assertEqual(items[2], sample(1))
+
+    def test_batch_size_limit(self):
+        items = [sample(i) for i in range(MAX_BATCH_SIZE)]
+        self.assertEqual(len(parse_batch_body(json.dumps(items).encode(), "application/json")), MAX_BATCH_SIZE)
+
+        ndjson = "\n".join(json.dumps(item) for item in items + [sample(0)]).encode()
+        with self.assertRaisesRegex(ValueError, "batch too large"):
+            parse_batch_body(ndjson, "application/x-ndjson")
+
+
+class InsertSamplesTest(unittest.TestCase):
+    """Validation and per-item results of insert_samples on a mongomock collection."""
+
+    def setUp(self):
+        self.collection = mongomock.MongoClient().db.information
+
+    def test_valid_samples_are_inserted(self):
+        results = insert_samples(self.collection, [sample(0), {"timestamp": "2025-01-01T09:00:00"}])
+
+        self.assertEqual([r["status"] for r in results], ["inserted", "inserted"])
+        self.assertEqual(self.collection.count_documents({}), 2)
+        stored = self.collection.find_one({"nama_sopir": "Unknown"})
+        self.assertEqual(stored["status_alert"], "OFF")  # default_status
+        self.assertEqual(str(stored["_id"]), results[1]["id"])
+
+    def test_invalid_samples_keep_their_position(self):
+        items = [sample(0), ValueError("line 2: Expecting value"), sample(1, timestamp="kemarin"),
+                 sample(2, armada=7), "not an object", sample(3)]
+        results = insert_samples(self.collection, items)
+
+        self.assertEqual([r["index"] for r in results], list(range(len(items))))
+        self.assertEqual([r["status"] for r in results], ["inserted", "error", "error", "error", "error", "inserted"])
+        self.assertEqual(results[1]["error"], "line 2: Expecting value")
+        self.assertIn("invalid timestamp", results[2]["error"])
+        self.assertIn("'armada' must be a string", results[3]["error"])
+        self.assertEqual(self.collection.count_documents({}), 2)
+
+    def test_write_errors_map_to_request_positions(self):
+        self.collection.create_index([("nama_sopir", 1), ("timestamp", 1)], unique=True)
+        insert_samples(self.collection, [sample(1)])
+
+        # Positions in insert_many skip the invalid item, results must not
+        items = [sample(0), "not an object", sample(1), sample(2), sample(2)]
+        results = insert_samples(self.collection, items)
+
+        self.assertEqual([r["status"] for r in results], ["inserted", "error", "error", "inserted", "error"])
+        self.assertIn("must be a JSON object", results[1]["error"])
+        self.assertIn("E11000", results[2]["error"])
+        self.assertIn("E11000", results[4]["error"])
+        self.assertEqual(self.collection.count_documents({}), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
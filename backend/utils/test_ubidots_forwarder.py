@@ -0,0 +1,61 @@
+import sys
+import unittest
+from pathlib import Path
+
+# Modul level backend (utils/) bisa diimpor saat file ini dijalankan langsung
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from utils.ubidots_forwarder import UbidotsForwarder
+from utils.ubidots_stub import UbidotsStubServer
+
+
+class UbidotsForwarderTest(unittest.TestCase):
+    """Forward samples to the local Ubidots stub and inspect what it received."""
+
+    def setUp(self):
+        self.stub = UbidotsStubServer().start()
+        self.addCleanup(self.stub.stop)
+
+    def test_samples_of_one_device_share_one_request(self):
+        forwarder = UbidotsForwarder("test-token", base_url=self.stub.url, flush_interval=0.5)
+        samples = [(1, 1000), (0, 2000), (1, 3000), (1, 4000), (0, 5000)]
+        for value, timestamp_ms in samples:
+            self.assertTrue(forwarder.submit("bus-001", value, timestamp_ms, context={"driver": "Budi"}))
+        forwarder.stop()
+
+        self.assertEqual(len(self.stub.requests), 1)
+        device_label, headers, body = self.stub.requests[0]
+        self.assertEqual(device_label, "bus-001")
+        self.assertEqual(headers["X-Auth-Token"], "test-token")
+        self.assertEqual(body, {"status_alert": [
+            {"value": value, "timestamp": timestamp_ms, "context": {"driver": "Budi"}}
+            for value, timestamp_ms in samples
+        ]})
+
+        stats = forwarder.get_statistics()
+        self.assertEqual((stats["forwarded"], stats["requests"], stats["pending"]), (len(samples), 1, 0))
+
+    def test_requests_respect_the_rate_limit(self):
+        forwarder = UbidotsForwarder("test-token", base_url=self.stub.url, flush_interval=0.2,
+                                     max_requests_per_second=5.0)
+        devices = ["bus-001", "bus-002", "bus-003"]
+        for device_label in devices:
+            forwarder.submit(device_label, 1, 1000)
+        forwarder.stop()
+
+        self.assertEqual([request[0] for request in self.stub.requests], devices)
+        gaps = [b - a for a, b in zip(self.stub.request_times, self.stub.request_times[1:])]
+        # One request per 0.2 s, with a little slack for the clock resolution
+        self.assertTrue(all(gap >= 0.19 for gap in gaps), gaps)
+
+    def test_full_queue_rejects_samples(self):
+        forwarder = UbidotsForwarder("test-token", base_url=self.stub.url, max_queue_size=2, flush_interval=0.5)
+        accepted = [forwarder.submit("bus-001", 1, timestamp_ms) for timestamp_ms in range(4)]
+        forwarder.stop()
+
+        self.assertEqual(accepted, [True, True, False, False])
+        self.assertEqual(forwarder.get_statistics()["rejected"], 2)
+        self.assertEqual(len(self.stub.requests[0][2]["status_alert"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
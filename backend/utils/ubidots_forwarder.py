@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+import requests
+
+
+class UbidotsForwarder:
+    """
+    In-process background worker that forwards detection samples to Ubidots.
+
+    Request handlers only call submit(), which appends to a bounded queue and
+    returns immediately. The worker drains the queue, coalesces all pending
+    samples of the same device into one multi-value Ubidots payload and sends
+    them under a simple rate limit, so request latency no longer depends on the
+    Ubidots API.
+    """
+
+    def __init__(self, token, base_url="https://industrial.api.ubidots.com",
+                 variable="status_alert", max_queue_size=5000, flush_interval=1.0,
+                 max_requests_per_second=4.0, timeout=5):
+        """
+        Initialize the forwarder and start its worker thread.
+
+        Args:
+            token (str): Ubidots API token
+            base_url (str): Ubidots API base URL (point it at a stub server for testing)
+            variable (str): Ubidots variable label the samples are written to
+            max_queue_size (int): Samples held before new ones are rejected
+            flush_interval (float): Seconds to collect samples before forwarding them
+            max_requests_per_second (float): Upper bound on the Ubidots request rate
+            timeout (float): Request timeout in seconds
+        """
+        self.base_url = base_url.rstrip("/")
+        self.variable = variable
+        self.max_queue_size = max_queue_size
+        self.flush_interval = flush_interval
+        self.min_request_interval = 1.0 / max_requests_per_second if max_requests_per_second > 0 else 0
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "X-Auth-Token": token,
+            "Content-Type": "application/json"
+        })
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._last_request_time = 0.0
+
+        # Forwarding statistics
+        self.stats = {
+            "submitted": 0,
+            "rejected": 0,
+            "forwarded": 0,
+            "failed": 0,
+            "requests": 0,
+        }
+
+        self._worker = threading.Thread(target=self._run, name="ubidots-forwarder", daemon=True)
+        self._worker.start()
+
+    def submit(self, device_label, value, timestamp_ms, context=None):
+        """
+        Queue one sample for forwarding without blocking.
+
+        Args:
+            device_label (str): Ubidots device label
+            value (float): Value of the status variable
+            timestamp_ms (int): Sample time in Unix milliseconds
+            context (dict): Extra information stored with the dot (driver, armada, route)
+
+        Returns:
+            bool: False if the queue is full and the sample was dropped
+        """
+        dot = {"value": value, "timestamp": timestamp_ms}
+        if context:
+            dot["context"] = context
+
+        with self._cond:
+            if len(self._queue) >= self.max_queue_size:
+                self.stats["rejected"] += 1
+                return False
+            self._queue.append((device_label, dot))
+            self.stats["submitted"] += 1
+            self._cond.notify()
+        return True
+
+    def get_statistics(self):
+        """
+        Get forwarding statistics.
+
+        Returns:
+            dict: Counters plus the current queue length
+        """
+        with self._cond:
+            return dict(self.stats, pending=len(self._queue))
+
+    def stop(self, timeout=5.0):
+        """
+        Stop the worker after forwarding what is still queued.
+
+        Args:
+            timeout (float): Seconds to wait for the worker to finish
+        """
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._worker.join(timeout)
+        self.session.close()
+
+    def _run(self):
+        """Worker loop: wait for samples, let them accumulate, then forward per device."""
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._stop_event.is_set())
+                if not self._queue and self._stop_event.is_set():
+                    return
+
+            # Let more samples accumulate so they can share one request
+            self._stop_event.wait(self.flush_interval)
+
+            with self._cond:
+                pending = list(self._queue)
+                self._queue.clear()
+
+            for device_label, dots in self._coalesce(pending).items():
+                self._forward(device_label, dots)
+
+    @staticmethod
+    def _coalesce(pending):
+        """
+        Group queued samples by device, keeping their order.
+
+        Args:
+            pending (list): (device_label, dot) tuples
+
+        Returns:
+            OrderedDict: Device label mapped to its list of dots
+        """
+        grouped = OrderedDict()
+        for device_label, dot in pending:
+            grouped.setdefault(device_label, []).append(dot)
+        return grouped
+
+    def _forward(self, device_label, dots):
+        """
+        Send all dots of one device in a single rate-limited request.
+
+        Args:
+            device_label (str): Ubidots device label
+            dots (list): Dots with value, timestamp and optional context
+        """
+        # Rate limiting: keep at least min_request_interval between requests
+        wait = self._last_request_time + self.min_request_interval - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_request_time = time.time()
+
+        url = f"{self.base_url}/api/v1.6/devices/{device_label}"
+        try:
+            response = self.session.post(url, json={self.variable: dots}, timeout=self.timeout)
+            response.raise_for_status()
+            self._count(forwarded=len(dots))
+            print(f"Ubidots: forwarded {len(dots)} samples to {device_label} ({response.status_code})")
+        except requests.exceptions.RequestException as e:
+            self._count(failed=len(dots))
+            print("Ubidots connection error:", e)
+
+    def _count(self, forwarded=0, failed=0):
+        """
+        Update the statistics after a request.
+
+        Args:
+            forwarded (int): Number of samples Ubidots accepted
+            failed (int): Number of samples that could not be forwarded
+        """
+        with self._cond:
+            self.stats["requests"] += 1
+            self.stats["forwarded"] += forwarded
+            self.stats["failed"] += failed
@@ -0,0 +1,105 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class UbidotsStubServer:
+    """
+    Minimal local stand-in for the Ubidots device API.
+
+    Accepts POST /api/v1.6/devices/<device_label>, records every request and
+    answers like Ubidots does. Point the backend at it with
+    UBIDOTS_URL=http://127.0.0.1:<port> to test forwarding without a real token,
+    or start it from a test and inspect `requests` afterwards.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, status_code=200):
+        """
+        Initialize the stub server.
+
+        Args:
+            host (str): Interface to bind
+            port (int): Port to bind, 0 to pick a free one
+            latency (float): Artificial delay in seconds before each response
+            status_code (int): HTTP status returned for every request
+        """
+        self.latency = latency
+        self.status_code = status_code
+        self.requests = []  # (device_label, headers, body) per request
+        self.request_times = []  # time.monotonic() at the arrival of each request
+        self._lock = threading.Lock()
+        self._thread = None
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                prefix = "/api/v1.6/devices/"
+                if not self.path.startswith(prefix):
+                    self.send_error(404)
+                    return
+
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self.send_error(400, "invalid JSON")
+                    return
+
+                with stub._lock:
+                    stub.requests.append((self.path[len(prefix):].strip("/"), dict(self.headers), body))
+                    stub.request_times.append(time.monotonic())
+
+                if stub.latency:
+                    time.sleep(stub.latency)
+
+                # Ubidots answers with one status per variable and dot
+                response = {
+                    variable: [{"status_code": 201}] * (len(dots) if isinstance(dots, list) else 1)
+                    for variable, dots in body.items()
+                }
+                payload = json.dumps(response).encode()
+                self.send_response(stub.status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+
+    @property
+    def url(self):
+        """str: Base URL to use in place of https://industrial.api.ubidots.com."""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down."""
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Ubidots stub server")
+    parser.add_argument("--port", type=int, default=9090, help="Port to listen on (default: 9090)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay per response in seconds")
+    parser.add_argument("--status", type=int, default=200, help="HTTP status to return (default: 200)")
+    args = parser.parse_args()
+
+    stub = UbidotsStubServer(port=args.port, latency=args.latency, status_code=args.status)
+    print(f"Ubidots stub listening on {stub.url} (set UBIDOTS_URL={stub.url})")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.server.server_close()
@@ -3,55 +3,209 @@ import streamlit as st
 import pymongo
 import certifi
 from components.generate_data import generate_data
+from components.snapshot import ColumnarSnapshot
+
+# Seconds a cached query result is reused before MongoDB is asked again
+QUERY_CACHE_TTL = 60
+
+@st.cache_resource(show_spinner=False)
+def get_mongo_client(mongo_uri):
+    """
+    Create the MongoDB client shared by every session, page and rerun
+    
+    The client keeps its own connection pool, so it is created and pinged once
+    per process instead of on every widget interaction.
+    
+    Parameters:
+    -----------
+    mongo_uri : str
+        MongoDB connection string
+    
+    Returns:
+    --------
+    pymongo.MongoClient
+        Connected client
+    """
+    client = pymongo.MongoClient(
+        mongo_uri, 
+        tlsCAFile=certifi.where(),
+        serverSelectionTimeoutMS=5000 
+    )
+    
+    client.admin.command('ping')
+    
+    return client
+
+def get_collection():
+    """
+    Connect to the MongoDB information collection
+    
+    Returns:
+    --------
+    pymongo.collection.Collection or None
+        The information collection, or None if MONGO_URI is not configured
+    """
+    if "secrets" in st.secrets and "MONGO_URI" in st.secrets["secrets"]:
+        client = get_mongo_client(st.secrets["secrets"]["MONGO_URI"])
+        
+        db = client["MicrosleepDetector"]
+        return db["information"]
+
+    st.warning("MONGO_URI tidak ditemukan di secrets. Menggunakan data dummy.")
+    return None
+
+@st.cache_resource(show_spinner=False)
+def get_snapshot(collection_name):
+    """
+    Get the process-wide incremental snapshot of a collection
+    
+    Parameters:
+    -----------
+    collection_name : str
+        Full name of the collection, e.g. "MicrosleepDetector.information"
+    
+    Returns:
+    --------
+    ColumnarSnapshot
+        Snapshot shared by every session
+    """
+    return ColumnarSnapshot()
+
+def get_sync_mode():
+    """
+    Get how pages read the information collection
+    
+    Returns:
+    --------
+    str
+        "aggregate" (default) runs every query as a MongoDB aggregation;
+        "incremental" keeps a local snapshot that only fetches new documents
+        and answers the queries from it. Set SYNC_MODE in secrets to choose.
+    """
+    if "secrets" in st.secrets:
+        return st.secrets["secrets"].get("SYNC_MODE", "aggregate")
+    return "aggregate"
+
+@st.cache_data(ttl=QUERY_CACHE_TTL, show_spinner=False)
+def _collection_has_data(_collection, collection_name):
+    return _collection.find_one({}, {"_id": 1}) is not None
+
+def get_data_source():
+    """
+    Get the source the dashboard queries in components.queries run against
+    
+    Aggregations run inside MongoDB when it is reachable and holds data;
+    otherwise the same queries are answered from the dummy DataFrame.
+    
+    Returns:
+    --------
+    pymongo.collection.Collection or pd.DataFrame
+        The information collection, or dummy microsleep data
+    """
+    if get_sync_mode() == "incremental":
+        return fetch_data_from_mongo()
+
+    try:
+        collection = get_collection()
+        if collection is None:
+            return generate_dummy_data()
+        
+        if not _collection_has_data(collection, collection.full_name):
+            st.warning("Tidak ada data di MongoDB. Menggunakan data dummy.")
+            return generate_dummy_data()
+        
+        return collection
+            
+    except Exception as e:
+        st.error(f"MongoDB Fetch Error: {e}")
+        st.info("Menggunakan data dummy sebagai pengganti.")
+        return generate_dummy_data()
+
+def source_key(source):
+    """
+    Identify a data source in cache keys
+    
+    Parameters:
+    -----------
+    source : pymongo.collection.Collection or pd.DataFrame
+        Data source from get_data_source
+    
+    Returns:
+    --------
+    str
+        "mongo:<db>.<collection>", the snapshot version, or "dummy"
+    """
+    if isinstance(source, pd.DataFrame):
+        return source.attrs.get("source_key", "dummy")
+    return f"mongo:{source.full_name}"
+
+def invalidate_cache(reconnect=False):
+    """
+    Drop cached query results so the next run reads fresh data
+    
+    Call this after writing to the information collection, or from the
+    refresh button rendered by render_cache_controls.
+    
+    Parameters:
+    -----------
+    reconnect : bool
+        Also discard the shared MongoDB client and the incremental snapshot
+    """
+    st.cache_data.clear()
+    if reconnect:
+        get_mongo_client.clear()
+        get_snapshot.clear()
+        return
+
+    if get_sync_mode() == "incremental":
+        try:
+            collection = get_collection()
+            if collection is not None:
+                get_snapshot(collection.full_name).mark_stale()
+        except Exception:
+            # Nothing to refresh while MongoDB is unreachable
+            pass
+
+def render_cache_controls():
+    """
+    Render the sidebar button that refreshes the cached dashboard data
+    """
+    with st.sidebar:
+        if st.button("🔄 Perbarui Data"):
+            invalidate_cache()
+            st.rerun()
+        st.caption(f"Data diperbarui otomatis setiap {QUERY_CACHE_TTL} detik.")
 
 def fetch_data_from_mongo():
     """
     Fetch microsleep data from MongoDB, or generate dummy data if connection fails
     
+    The data comes from the process-wide ColumnarSnapshot: the first call loads
+    the collection, later calls (at most every QUERY_CACHE_TTL seconds, or after
+    invalidate_cache) only fetch documents inserted since the previous sync.
+    
     Returns:
     --------
     pd.DataFrame
-        DataFrame containing microsleep data
+        DataFrame containing microsleep data; shared, so do not modify it in place
     """
     try:
-        if "secrets" in st.secrets and "MONGO_URI" in st.secrets["secrets"]:
-            mongo_uri = st.secrets["secrets"]["MONGO_URI"]
-
-            client = pymongo.MongoClient(
-                mongo_uri, 
-                tlsCAFile=certifi.where(),
-                serverSelectionTimeoutMS=5000 
-            )
-            
-            client.admin.command('ping')
-            
-            db = client["MicrosleepDetector"]
-            collection = db["information"]
-            
-            query = {}
-            projection = {"_id": 0} 
-            cursor = collection.find(query, projection)
-            
-            data = pd.DataFrame(list(cursor))
-            
-            if data.empty:
-                st.warning("Tidak ada data di MongoDB. Menggunakan data dummy.")
-                return generate_dummy_data()
-            
-            if 'timestamp' in data.columns:
-                data['timestamp'] = pd.to_datetime(data['timestamp'], errors='coerce')
-                
-                if data['timestamp'].isnull().any():
-                    st.warning("Beberapa nilai timestamp tidak valid. Data mungkin tidak lengkap.")
-                
-                return data
-            else:
-                st.warning("Format data tidak valid. Menggunakan data dummy.")
-                return generate_dummy_data()
-                
-        else:
-            st.warning("MONGO_URI tidak ditemukan di secrets. Menggunakan data dummy.")
+        collection = get_collection()
+        if collection is None:
+            return generate_dummy_data()
+        
+        snapshot = get_snapshot(collection.full_name)
+        snapshot.sync(collection, min_interval=QUERY_CACHE_TTL)
+        data = snapshot.frame()
+        
+        if data.empty:
+            st.warning("Tidak ada data di MongoDB. Menggunakan data dummy.")
             return generate_dummy_data()
+        
+        if data['timestamp'].isnull().any():
+            st.warning("Beberapa nilai timestamp tidak valid. Data mungkin tidak lengkap.")
+        
+        return data
             
     except Exception as e:
         st.error(f"MongoDB Fetch Error: {e}")
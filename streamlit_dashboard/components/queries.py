@@ -0,0 +1,721 @@
+import datetime
+import functools
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from components.mongo_utils import QUERY_CACHE_TTL, source_key
+
+SHIFT_ORDER = ["Shift Pagi", "Shift Siang", "Shift Malam"]
+HARI_ORDER = ['Senin', 'Selasa', 'Rabu', 'Kamis', 'Jumat', 'Sabtu', 'Minggu']
+
+# MongoDB $dayOfWeek numbers days from 1 (Sunday) to 7 (Saturday)
+DAY_OF_WEEK_HARI = {1: 'Minggu', 2: 'Senin', 3: 'Selasa', 4: 'Rabu', 5: 'Kamis', 6: 'Jumat', 7: 'Sabtu'}
+WEEKDAY_HARI = {0: 'Senin', 1: 'Selasa', 2: 'Rabu', 3: 'Kamis', 4: 'Jumat', 5: 'Sabtu', 6: 'Minggu'}
+
+# Alerts further apart than this start a new microsleep event
+EVENT_GAP = pd.Timedelta(minutes=15)
+EVENT_GAP_MS = int(EVENT_GAP.total_seconds() * 1000)
+
+
+def cached_query(func):
+    """
+    Cache a query's result for QUERY_CACHE_TTL seconds, keyed by its filter arguments
+
+    The source itself is not hashed; it is identified by source_key, so results
+    from the dummy data are never served for MongoDB. Concurrent sessions asking
+    for the same filters share one result instead of each querying MongoDB.
+    """
+    @st.cache_data(ttl=QUERY_CACHE_TTL, show_spinner=False)
+    def cached(query_name, key, _source, *args, **kwargs):
+        return func(_source, *args, **kwargs)
+
+    @functools.wraps(func)
+    def wrapper(source, *args, **kwargs):
+        return cached(func.__name__, source_key(source), source, *args, **kwargs)
+
+    wrapper.clear = cached.clear
+    return wrapper
+
+
+def _shift_expr(hour_expr):
+    """MongoDB expression mapping an hour to its shift name (Pagi 06-14, Siang 14-22, Malam otherwise)."""
+    return {
+        "$switch": {
+            "branches": [
+                {"case": {"$and": [{"$gte": [hour_expr, 6]}, {"$lt": [hour_expr, 14]}]}, "then": "Shift Pagi"},
+                {"case": {"$and": [{"$gte": [hour_expr, 14]}, {"$lt": [hour_expr, 22]}]}, "then": "Shift Siang"},
+            ],
+            "default": "Shift Malam"
+        }
+    }
+
+
+# $setWindowFields support per MongoClient, looked up once from the server version
+_window_fields_support = {}
+
+
+def _supports_window_fields(collection):
+    """Check whether the server runs MongoDB 5.0+, which has $setWindowFields and $shift."""
+    client = collection.database.client
+    supported = _window_fields_support.get(id(client))
+    if supported is None:
+        version = client.server_info().get("versionArray", [0, 0])
+        supported = _window_fields_support[id(client)] = tuple(version[:2]) >= (5, 0)
+    return supported
+
+
+def _event_counting(collection, keys, output):
+    """
+    Pipeline pieces counting microsleep events per group
+
+    An alert starts a new event when it is the first of its group or comes more
+    than EVENT_GAP after the previous alert of the group, like segment_events.
+    On MongoDB 5.0+ every alert is compared with its predecessor through
+    $setWindowFields/$shift and the new-event flags are summed in the $group,
+    so memory stays constant per group. Older servers fall back to collecting
+    the group's timestamps with $push and segmenting them with $reduce, which
+    grows with the alert history of a group.
+
+    Parameters:
+    -----------
+    collection : pymongo.collection.Collection
+        Collection the pipeline runs on
+    keys : list
+        Fields identifying a group, present on the documents before the $group
+    output : str
+        Name of the event count field
+
+    Returns:
+    --------
+    tuple
+        (stages inserted before the $sort and $group, $group accumulators,
+        $project fields producing the count)
+    """
+    if _supports_window_fields(collection):
+        stages = [
+            {"$setWindowFields": {
+                "partitionBy": {key: f"${key}" for key in keys},
+                "sortBy": {"timestamp": 1},
+                "output": {"previous_timestamp": {"$shift": {"output": "$timestamp", "by": -1}}}
+            }},
+            {"$addFields": {"new_event": {"$cond": [
+                {"$or": [
+                    {"$eq": ["$previous_timestamp", None]},
+                    {"$gt": [{"$subtract": ["$timestamp", "$previous_timestamp"]}, EVENT_GAP_MS]}
+                ]}, 1, 0
+            ]}}}
+        ]
+        return stages, {output: {"$sum": "$new_event"}}, {output: 1}
+
+    return [], {"timestamps": {"$push": "$timestamp"}}, {output: _event_count_expr("$timestamps")}
+
+
+def _event_count_expr(timestamps_expr):
+    """
+    MongoDB expression counting microsleep events in a time-ordered array of timestamps
+
+    Fallback of _event_counting for servers without $setWindowFields. An alert
+    starts a new event when it is the first one or comes more than EVENT_GAP
+    after the previous alert, like segment_events.
+    """
+    return {
+        "$let": {
+            "vars": {
+                "segmented": {
+                    "$reduce": {
+                        "input": timestamps_expr,
+                        "initialValue": {"events": 0, "last": None},
+                        "in": {
+                            "events": {"$add": ["$$value.events", {"$cond": [
+                                {"$or": [
+                                    {"$eq": ["$$value.last", None]},
+                                    {"$gt": [{"$subtract": ["$$this", "$$value.last"]}, EVENT_GAP_MS]}
+                                ]}, 1, 0
+                            ]}]},
+                            "last": "$$this"
+                        }
+                    }
+                }
+            },
+            "in": "$$segmented.events"
+        }
+    }
+
+
+def segment_events(alerts, keys, gap=EVENT_GAP):
+    """
+    Split alerts into microsleep events for all groups in one pass
+
+    Alerts are sorted once by keys and timestamp; an alert starts a new event
+    when it is the first of its group or comes more than `gap` after the
+    previous alert of the same group.
+
+    Parameters:
+    -----------
+    alerts : pd.DataFrame
+        Alerts with a timestamp column and the key columns
+    keys : list
+        Columns identifying a group, e.g. ['nama_sopir', 'shift']
+    gap : pd.Timedelta
+        Largest gap between alerts of the same event
+
+    Returns:
+    --------
+    pd.DataFrame
+        The alerts in (keys, timestamp) order with boolean new_event and an
+        event_id that is unique across all groups
+    """
+    ordered = alerts.dropna(subset=keys).sort_values(list(keys) + ['timestamp'], kind='mergesort')
+
+    same_group = np.ones(len(ordered), dtype=bool)
+    for key in keys:
+        values = ordered[key].to_numpy()
+        same_group[1:] &= values[1:] == values[:-1]
+    if len(ordered):
+        same_group[0] = False
+
+    gap_exceeded = (ordered['timestamp'].diff() > gap).to_numpy()
+    ordered['new_event'] = ~same_group | gap_exceeded
+    ordered['event_id'] = ordered['new_event'].cumsum()
+    return ordered
+
+
+def count_events(alerts, keys, gap=EVENT_GAP, aggregations=None):
+    """
+    Count microsleep events and alerts per group
+
+    Parameters:
+    -----------
+    alerts : pd.DataFrame
+        Alerts with a timestamp column and the key columns
+    keys : list
+        Columns identifying a group
+    gap : pd.Timedelta
+        Largest gap between alerts of the same event
+    aggregations : dict
+        Extra named aggregations for DataFrame.groupby().agg(), e.g.
+        {'armada': ('armada', 'first')}, evaluated in time order
+
+    Returns:
+    --------
+    pd.DataFrame
+        keys, the extra aggregations, events and alerts per group, ordered by keys
+    """
+    segmented = segment_events(alerts, keys, gap)
+    counts = segmented.groupby(keys, observed=True, sort=False).agg(
+        **(aggregations or {}),
+        events=('new_event', 'sum'),
+        alerts=('new_event', 'size')
+    ).reset_index()
+    counts['events'] = counts['events'].astype(int)
+    return counts.astype({key: object for key in keys}).sort_values(keys, ignore_index=True)
+
+
+def _date_bounds(start_date, end_date):
+    """Convert an inclusive date range into datetime bounds [start, end)."""
+    start = datetime.datetime.combine(start_date, datetime.time.min) if start_date else None
+    end = datetime.datetime.combine(end_date, datetime.time.min) + datetime.timedelta(days=1) if end_date else None
+    return start, end
+
+
+def _match_stage(start_date=None, end_date=None, drivers=None, armadas=None, routes=None, status=None):
+    """
+    Build the $match filter for the common dashboard filters
+
+    Parameters:
+    -----------
+    start_date, end_date : datetime.date
+        Inclusive date range, None for an open bound
+    drivers, armadas, routes : list
+        Allowed nama_sopir / armada / rute values, empty for all
+    status : str
+        Required status_alert value, None for all statuses
+
+    Returns:
+    --------
+    dict
+        MongoDB query document
+    """
+    match = {}
+    if status:
+        match["status_alert"] = status
+    if drivers:
+        match["nama_sopir"] = {"$in": list(drivers)}
+    if armadas:
+        match["armada"] = {"$in": list(armadas)}
+    if routes:
+        match["rute"] = {"$in": list(routes)}
+
+    start, end = _date_bounds(start_date, end_date)
+    if start or end:
+        match["timestamp"] = {}
+        if start:
+            match["timestamp"]["$gte"] = start
+        if end:
+            match["timestamp"]["$lt"] = end
+    return match
+
+
+def _filter_frame(df, start_date=None, end_date=None, drivers=None, armadas=None, routes=None, status=None):
+    """Apply the same filters as _match_stage to a DataFrame and add hour/shift columns."""
+    mask = pd.Series(True, index=df.index)
+    if status:
+        mask &= df['status_alert'] == status
+    if drivers:
+        mask &= df['nama_sopir'].isin(drivers)
+    if armadas:
+        mask &= df['armada'].isin(armadas)
+    if routes:
+        mask &= df['rute'].isin(routes)
+
+    start, end = _date_bounds(start_date, end_date)
+    if start:
+        mask &= df['timestamp'] >= start
+    if end:
+        mask &= df['timestamp'] < end
+
+    filtered = df[mask].copy()
+    filtered['hour'] = filtered['timestamp'].dt.hour
+    filtered['shift'] = np.select(
+        [(filtered['hour'] >= 6) & (filtered['hour'] < 14), (filtered['hour'] >= 14) & (filtered['hour'] < 22)],
+        ["Shift Pagi", "Shift Siang"],
+        default="Shift Malam"
+    )
+    return filtered
+
+
+def _is_frame(source):
+    return isinstance(source, pd.DataFrame)
+
+
+# query_filter_options reads both ends of the timestamp index with find_one
+# instead of a $group over the whole collection, plus one distinct per field
+FILTER_BOUNDS = [({"timestamp": 1, "_id": 0}, [("timestamp", 1)]),
+                 ({"timestamp": 1, "_id": 0}, [("timestamp", -1)])]
+FILTER_FIELDS = ["nama_sopir", "armada", "rute"]
+
+
+@cached_query
+def query_filter_options(source, status=None):
+    """
+    Get the date bounds and distinct values offered by the filter widgets
+
+    Parameters:
+    -----------
+    source : pymongo.collection.Collection or pd.DataFrame
+        Data source from components.mongo_utils.get_data_source
+    status : str
+        Only consider samples with this status_alert, None for all
+
+    Returns:
+    --------
+    dict
+        min_date, max_date (datetime.date or None) and sorted drivers, armadas and routes
+    """
+    if _is_frame(source):
+        df = _filter_frame(source, status=status)
+        timestamps = df['timestamp'].dropna()
+        return {
+            "min_date": timestamps.min().date() if not timestamps.empty else None,
+            "max_date": timestamps.max().date() if not timestamps.empty else None,
+            "drivers": sorted(df['nama_sopir'].dropna().unique()),
+            "armadas": sorted(df['armada'].dropna().unique()),
+            "routes": sorted(df['rute'].dropna().unique()),
+        }
+
+    match = _match_stage(status=status)
+    first, last = (source.find_one(match, projection, sort=sort) for projection, sort in FILTER_BOUNDS)
+    values = {field: sorted(v for v in source.distinct(field, match) if v is not None) for field in FILTER_FIELDS}
+    return {
+        "min_date": pd.Timestamp(first["timestamp"]).date() if first else None,
+        "max_date": pd.Timestamp(last["timestamp"]).date() if last else None,
+        "drivers": values["nama_sopir"],
+        "armadas": values["armada"],
+        "routes": values["rute"],
+    }
+
+
+@cached_query
+def query_dashboard_summary(source, start_date=None, end_date=None, drivers=None, status="ON"):
+    """
+    Get the operational summary shown on the main dashboard
+
+    Parameters:
+    -----------
+    source : pymongo.collection.Collection or pd.DataFrame
+        Data source from components.mongo_utils.get_data_source
+    start_date, end_date : datetime.date
+        Inclusive date range
+    drivers : list
+        Only include these drivers, empty for all
+    status : str
+        status_alert value counted as a microsleep
+
+    Returns:
+    --------
+    dict
+        total_microsleep, sopir_microsleep, total_armada, total_sopir, sopir_shift
+        (pd.Series of drivers per shift) and alerts_per_driver (pd.DataFrame with
+        nama_sopir and jumlah, highest first)
+    """
+    if _is_frame(source):
+        df = _filter_frame(source, start_date, end_date, drivers)
+        alerts = df[df['status_alert'] == status]
+        alerts_per_driver = alerts.groupby('nama_sopir', observed=True).size().reset_index(name='jumlah')
+        alerts_per_driver = alerts_per_driver.astype({'nama_sopir': str})
+        sopir_shift = df.groupby('shift')['nama_sopir'].nunique()
+        total_armada = df['armada'].nunique()
+        total_sopir = df['nama_sopir'].nunique()
+    else:
+        pipeline = dashboard_summary_pipeline(start_date, end_date, drivers, status)
+        result = next(source.aggregate(pipeline, allowDiskUse=True))
+        totals = result["totals"][0] if result["totals"] else {"total_sopir": 0, "total_armada": 0}
+        total_armada = totals["total_armada"]
+        total_sopir = totals["total_sopir"]
+        sopir_shift = pd.Series({row["shift"]: row["jumlah"] for row in result["shift"]}, dtype=int)
+        alerts_per_driver = pd.DataFrame(result["alerts"], columns=['nama_sopir', 'jumlah'])
+
+    alerts_per_driver = alerts_per_driver.sort_values(['jumlah', 'nama_sopir'], ascending=[False, True])
+    return {
+        "total_microsleep": int(alerts_per_driver['jumlah'].sum()),
+        "sopir_microsleep": len(alerts_per_driver),
+        "total_armada": total_armada,
+        "total_sopir": total_sopir,
+        "sopir_shift": sopir_shift.reindex(SHIFT_ORDER, fill_value=0),
+        "alerts_per_driver": alerts_per_driver.reset_index(drop=True),
+    }
+
+
+def dashboard_summary_pipeline(start_date=None, end_date=None, drivers=None, status="ON"):
+    """Aggregation pipeline behind query_dashboard_summary."""
+    return [
+        {"$match": _match_stage(start_date, end_date, drivers)},
+        {"$facet": {
+            "totals": [
+                {"$group": {"_id": None, "sopir": {"$addToSet": "$nama_sopir"}, "armada": {"$addToSet": "$armada"}}},
+                {"$project": {"_id": 0, "total_sopir": {"$size": "$sopir"}, "total_armada": {"$size": "$armada"}}}
+            ],
+            "shift": [
+                {"$group": {"_id": _shift_expr({"$hour": "$timestamp"}), "sopir": {"$addToSet": "$nama_sopir"}}},
+                {"$project": {"_id": 0, "shift": "$_id", "jumlah": {"$size": "$sopir"}}}
+            ],
+            "alerts": [
+                {"$match": {"status_alert": status}},
+                {"$group": {"_id": "$nama_sopir", "jumlah": {"$sum": 1}}},
+                {"$project": {"_id": 0, "nama_sopir": "$_id", "jumlah": 1}}
+            ]
+        }}
+    ]
+
+
+@cached_query
+def query_alert_events(source, start_date=None, end_date=None, drivers=None, armadas=None,
+                       routes=None, shifts=None, by_shift=True, status="ON"):
+    """
+    Count microsleep events and alerts per driver (and shift)
+
+    Alerts of one group are ordered by time and split into events wherever
+    the gap to the previous alert exceeds EVENT_GAP.
+
+    Parameters:
+    -----------
+    source : pymongo.collection.Collection or pd.DataFrame
+        Data source from components.mongo_utils.get_data_source
+    start_date, end_date : datetime.date
+        Inclusive date range
+    drivers, armadas, routes, shifts : list
+        Allowed values, empty for all
+    by_shift : bool
+        Group per (driver, shift) instead of per driver
+    status : str
+        status_alert value counted as an alert
+
+    Returns:
+    --------
+    pd.DataFrame
+        nama_sopir, armada, rute, shift (if by_shift), frekuensi_microsleep and
+        jumlah_alert per group; armada and rute are those of the first alert
+    """
+    columns = ['nama_sopir', 'armada', 'rute'] + (['shift'] if by_shift else []) + ['frekuensi_microsleep', 'jumlah_alert']
+
+    if _is_frame(source):
+        keys = ['nama_sopir', 'shift'] if by_shift else ['nama_sopir']
+        df = _filter_frame(source, start_date, end_date, drivers, armadas, routes, status)
+        if shifts:
+            df = df[df['shift'].isin(shifts)]
+
+        counts = count_events(df, keys, aggregations={'armada': ('armada', 'first'), 'rute': ('rute', 'first')})
+        counts = counts.rename(columns={'events': 'frekuensi_microsleep', 'alerts': 'jumlah_alert'})
+        return counts[columns]
+
+    pipeline = alert_events_pipeline(source, start_date, end_date, drivers, armadas, routes, shifts,
+                                     by_shift, status)
+    return pd.DataFrame(list(source.aggregate(pipeline, allowDiskUse=True)), columns=columns)
+
+
+def alert_events_pipeline(collection, start_date=None, end_date=None, drivers=None, armadas=None,
+                          routes=None, shifts=None, by_shift=True, status="ON"):
+    """Aggregation pipeline behind query_alert_events; collection decides how events are counted."""
+    keys = ['nama_sopir', 'shift'] if by_shift else ['nama_sopir']
+    pipeline = [
+        {"$match": _match_stage(start_date, end_date, drivers, armadas, routes, status)},
+        {"$addFields": {"shift": _shift_expr({"$hour": "$timestamp"})}},
+    ]
+    if shifts:
+        pipeline.append({"$match": {"shift": {"$in": list(shifts)}}})
+    event_stages, event_accumulators, event_fields = _event_counting(collection, keys, "frekuensi_microsleep")
+    pipeline += event_stages + [
+        {"$sort": {"nama_sopir": 1, "timestamp": 1}},
+        {"$group": {
+            "_id": {key: f"${key}" for key in keys},
+            "armada": {"$first": "$armada"},
+            "rute": {"$first": "$rute"},
+            **event_accumulators,
+            "jumlah_alert": {"$sum": 1}
+        }},
+        {"$project": {
+            "_id": 0,
+            **{key: f"$_id.{key}" for key in keys},
+            "armada": 1,
+            "rute": 1,
+            **event_fields,
+            "jumlah_alert": 1
+        }},
+        {"$sort": {key: 1 for key in keys}}
+    ]
+    return pipeline
+
+
+@cached_query
+def query_primary_shift(source, start_date=None, end_date=None):
+    """
+    Get the shift each driver has the most samples in
+
+    Parameters:
+    -----------
+    source : pymongo.collection.Collection or pd.DataFrame
+        Data source from components.mongo_utils.get_data_source
+    start_date, end_date : datetime.date
+        Inclusive date range
+
+    Returns:
+    --------
+    pd.DataFrame
+        nama_sopir and shift_terbanyak
+    """
+    columns = ['nama_sopir', 'shift_terbanyak']
+
+    if _is_frame(source):
+        df = _filter_frame(source, start_date, end_date)
+        return (
+            df.groupby(['nama_sopir', 'shift'], observed=True)
+            .size()
+            .reset_index(name='jumlah_shift')
+            .astype({'nama_sopir': str})
+            .sort_values(['nama_sopir', 'jumlah_shift', 'shift'], ascending=[True, False, True])
+            .drop_duplicates(subset='nama_sopir')
+            .rename(columns={'shift': 'shift_terbanyak'})
+        )[columns].reset_index(drop=True)
+
+    pipeline = primary_shift_pipeline(start_date, end_date)
+    return pd.DataFrame(list(source.aggregate(pipeline, allowDiskUse=True)), columns=columns)
+
+
+def primary_shift_pipeline(start_date=None, end_date=None):
+    """Aggregation pipeline behind query_primary_shift."""
+    return [
+        {"$match": _match_stage(start_date, end_date)},
+        {"$group": {
+            "_id": {"nama_sopir": "$nama_sopir", "shift": _shift_expr({"$hour": "$timestamp"})},
+            "jumlah_shift": {"$sum": 1}
+        }},
+        {"$sort": {"_id.nama_sopir": 1, "jumlah_shift": -1, "_id.shift": 1}},
+        {"$group": {"_id": "$_id.nama_sopir", "shift_terbanyak": {"$first": "$_id.shift"}}},
+        {"$project": {"_id": 0, "nama_sopir": "$_id", "shift_terbanyak": 1}},
+        {"$sort": {"nama_sopir": 1}}
+    ]
+
+
+# Columns of query_driver_shift_profile; hour blocks [start, end) are counted separately from the shifts
+PROFILE_SHIFT_COLUMNS = {'Shift Pagi': 'morning_alerts', 'Shift Siang': 'afternoon_alerts', 'Shift Malam': 'night_alerts'}
+PROFILE_HOUR_BLOCKS = {'early_morning_alert': (0, 6), 'morning_alert': (6, 12),
+                       'afternoon_alert': (12, 18), 'evening_alert': (18, 24)}
+PROFILE_COLUMNS = (['nama_sopir', 'microsleep_events', 'total_alerts'] + list(PROFILE_SHIFT_COLUMNS.values()) +
+                   list(PROFILE_HOUR_BLOCKS))
+
+
+def driver_shift_profile_pipeline(collection, start_date=None, end_date=None, status="ON"):
+    """Aggregation pipeline behind query_driver_shift_profile; collection decides how events are counted."""
+    hour = "$hour"
+    event_stages, event_accumulators, event_fields = _event_counting(
+        collection, ['nama_sopir'], "microsleep_events"
+    )
+    group_stage = {
+        "_id": "$nama_sopir",
+        **event_accumulators,
+        "total_alerts": {"$sum": 1}
+    }
+    for shift, column in PROFILE_SHIFT_COLUMNS.items():
+        group_stage[column] = {"$sum": {"$cond": [{"$eq": ["$shift", shift]}, 1, 0]}}
+    for column, (start, end) in PROFILE_HOUR_BLOCKS.items():
+        group_stage[column] = {"$sum": {"$cond": [
+            {"$and": [{"$gte": [hour, start]}, {"$lt": [hour, end]}]}, 1, 0
+        ]}}
+
+    return [
+        {"$match": _match_stage(start_date, end_date, status=status)},
+        {"$addFields": {"hour": {"$hour": "$timestamp"}}},
+        {"$addFields": {"shift": _shift_expr("$hour")}},
+        *event_stages,
+        {"$sort": {"nama_sopir": 1, "timestamp": 1}},
+        {"$group": group_stage},
+        {"$project": {
+            "_id": 0,
+            "nama_sopir": "$_id",
+            **event_fields,
+            **{column: 1 for column in PROFILE_COLUMNS[2:]}
+        }},
+        {"$sort": {"nama_sopir": 1}}
+    ]
+
+
+@cached_query
+def query_driver_shift_profile(source, start_date=None, end_date=None, status="ON"):
+    """
+    Get the per-driver alert profile used for shift recommendations
+
+    Parameters:
+    -----------
+    source : pymongo.collection.Collection or pd.DataFrame
+        Data source from components.mongo_utils.get_data_source
+    start_date, end_date : datetime.date
+        Inclusive date range
+    status : str
+        status_alert value counted as an alert
+
+    Returns:
+    --------
+    pd.DataFrame
+        One row per driver with microsleep_events, total_alerts, alerts per shift
+        (morning/afternoon/night_alerts, also as *_shift), alerts per 6-hour block
+        (early_morning/morning/afternoon/evening_alert) and current_primary_shift
+    """
+    shift_columns = PROFILE_SHIFT_COLUMNS
+    hour_blocks = PROFILE_HOUR_BLOCKS
+    columns = PROFILE_COLUMNS
+
+    if _is_frame(source):
+        df = _filter_frame(source, start_date, end_date, status=status)
+
+        flags = {column: df['shift'] == shift for shift, column in shift_columns.items()}
+        for column, (start, end) in hour_blocks.items():
+            flags[column] = (df['hour'] >= start) & (df['hour'] < end)
+        counts = count_events(
+            df.assign(**flags), ['nama_sopir'],
+            aggregations={column: (column, 'sum') for column in flags}
+        )
+        profile = counts.rename(columns={'events': 'microsleep_events', 'alerts': 'total_alerts'})[columns]
+        profile = profile.astype({column: int for column in flags})
+    else:
+        pipeline = driver_shift_profile_pipeline(source, start_date, end_date, status)
+        profile = pd.DataFrame(list(source.aggregate(pipeline, allowDiskUse=True)), columns=columns)
+
+    for shift, column in shift_columns.items():
+        profile[column.replace('_alerts', '_shift')] = profile[column]
+    profile['current_primary_shift'] = profile[list(shift_columns.values())].idxmax(axis=1).map(
+        {column: shift for shift, column in shift_columns.items()}
+    ) if not profile.empty else pd.Series(dtype=object)
+    return profile
+
+
+def hour_weekday_pipeline(start_date=None, end_date=None, status=None):
+    """Aggregation pipeline behind query_hour_weekday_counts."""
+    return [
+        {"$match": _match_stage(start_date, end_date, status=status)},
+        {"$group": {
+            "_id": {"hour": {"$hour": "$timestamp"}, "day": {"$dayOfWeek": "$timestamp"}},
+            "jumlah": {"$sum": 1}
+        }},
+        {"$project": {"_id": 0, "hour": "$_id.hour", "day": "$_id.day", "jumlah": 1}}
+    ]
+
+
+@cached_query
+def query_hour_weekday_counts(source, start_date=None, end_date=None, status=None):
+    """
+    Count samples per hour of day and weekday
+
+    Parameters:
+    -----------
+    source : pymongo.collection.Collection or pd.DataFrame
+        Data source from components.mongo_utils.get_data_source
+    start_date, end_date : datetime.date
+        Inclusive date range
+    status : str
+        Only count samples with this status_alert, None for all
+
+    Returns:
+    --------
+    pd.DataFrame
+        Hours (0-23, only those with data) as index, HARI_ORDER days as columns
+    """
+    if _is_frame(source):
+        df = _filter_frame(source, start_date, end_date, status=status)
+        counts = pd.DataFrame({
+            'hour': df['hour'],
+            'hari': df['timestamp'].dt.weekday.map(WEEKDAY_HARI),
+            'jumlah': 1
+        })
+    else:
+        pipeline = hour_weekday_pipeline(start_date, end_date, status)
+        counts = pd.DataFrame(list(source.aggregate(pipeline)), columns=['hour', 'day', 'jumlah'])
+        counts['hari'] = counts['day'].map(DAY_OF_WEEK_HARI)
+
+    heatmap = counts.pivot_table(index='hour', columns='hari', values='jumlah', aggfunc='sum', fill_value=0)
+    return heatmap.reindex(columns=HARI_ORDER, fill_value=0).sort_index()
+
+
+def daily_counts_pipeline(start_date=None, end_date=None, status=None):
+    """Aggregation pipeline behind query_daily_counts."""
+    return [
+        {"$match": _match_stage(start_date, end_date, status=status)},
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+            "jumlah": {"$sum": 1}
+        }},
+        {"$sort": {"_id": 1}},
+        {"$project": {"_id": 0, "date": "$_id", "jumlah": 1}}
+    ]
+
+
+@cached_query
+def query_daily_counts(source, start_date=None, end_date=None, status=None):
+    """
+    Count samples per calendar day
+
+    Parameters:
+    -----------
+    source : pymongo.collection.Collection or pd.DataFrame
+        Data source from components.mongo_utils.get_data_source
+    start_date, end_date : datetime.date
+        Inclusive date range
+    status : str
+        Only count samples with this status_alert, None for all
+
+    Returns:
+    --------
+    pd.DataFrame
+        date (datetime.date) and jumlah, ordered by date
+    """
+    if _is_frame(source):
+        df = _filter_frame(source, start_date, end_date, status=status)
+        trend = df.groupby(df['timestamp'].dt.date).size().reset_index(name='jumlah')
+        trend.columns = ['date', 'jumlah']
+        return trend.sort_values('date').reset_index(drop=True)
+
+    pipeline = daily_counts_pipeline(start_date, end_date, status)
+    trend = pd.DataFrame(list(source.aggregate(pipeline)), columns=['date', 'jumlah'])
+    trend['date'] = pd.to_datetime(trend['date']).dt.date
+    return trend
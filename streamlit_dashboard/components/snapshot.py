@@ -0,0 +1,195 @@
+import datetime
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+
+# String columns of the information collection, stored as category codes
+CATEGORY_COLUMNS = ['nama_sopir', 'armada', 'rute', 'status_alert']
+
+
+class ColumnarSnapshot:
+    """
+    Local, append-only columnar copy of the information collection
+
+    The first sync downloads the collection once; every later sync only asks
+    MongoDB for documents newer than the high-water mark and appends them, so
+    a refresh costs time proportional to the new data instead of the whole
+    history.
+
+    The high-water mark is the `_id` of the newest document seen, not its
+    `timestamp`: samples replayed from the detector outbox are inserted late
+    with old timestamps and would be skipped by a timestamp cursor. Because
+    several backend processes generate ObjectIds with slightly different
+    clocks, each sync re-reads a short overlap window before the mark and drops
+    the ids it already holds.
+
+    Columns live in growable NumPy arrays (timestamps as datetime64, strings
+    as int32 category codes), so appending never copies the existing rows
+    except when the capacity doubles.
+    """
+
+    def __init__(self, initial_capacity=1024, id_overlap_seconds=5):
+        """
+        Parameters:
+        -----------
+        initial_capacity : int
+            Number of rows allocated before the first resize
+        id_overlap_seconds : float
+            How far before the high-water mark each sync looks again
+        """
+        self.id_overlap = datetime.timedelta(seconds=id_overlap_seconds)
+
+        self._size = 0
+        self._capacity = initial_capacity
+        self._timestamps = np.empty(initial_capacity, dtype='datetime64[ns]')
+        self._codes = {column: np.empty(initial_capacity, dtype=np.int32) for column in CATEGORY_COLUMNS}
+        self._code_of = {column: {} for column in CATEGORY_COLUMNS}
+        self._categories = {column: [] for column in CATEGORY_COLUMNS}
+
+        self.last_id = None          # High-water mark
+        self.last_timestamp = None   # Newest sample time seen, for display
+        self.last_sync = 0.0
+        self._recent_ids = {}        # ids inside the overlap window -> generation time
+        self._stale = True
+        self._frame = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def version(self):
+        """str: Changes whenever rows are appended; used in cache keys."""
+        return f"snapshot:{self._size}:{self.last_id}"
+
+    def mark_stale(self):
+        """Force the next sync to query MongoDB regardless of its interval."""
+        self._stale = True
+
+    def sync(self, collection, min_interval=0):
+        """
+        Fetch documents newer than the high-water mark and append them
+
+        Parameters:
+        -----------
+        collection : pymongo.collection.Collection
+            The information collection
+        min_interval : float
+            Skip the query if the last sync is more recent than this many seconds
+
+        Returns:
+        --------
+        int
+            Number of rows appended
+        """
+        with self._lock:
+            if not self._stale and time.time() - self.last_sync < min_interval:
+                return 0
+
+            query = {}
+            if self.last_id is not None:
+                overlap_start = self.last_id.generation_time - self.id_overlap
+                query = {"_id": {"$gte": ObjectId.from_datetime(overlap_start)}}
+
+            projection = {column: 1 for column in CATEGORY_COLUMNS + ['timestamp']}
+            documents = [
+                doc for doc in collection.find(query, projection).sort("_id", 1)
+                if doc["_id"] not in self._recent_ids
+            ]
+            self._append(documents)
+
+            self.last_sync = time.time()
+            self._stale = False
+            return len(documents)
+
+    def _append(self, documents):
+        """
+        Append documents to the column arrays and advance the high-water mark
+
+        Parameters:
+        -----------
+        documents : list
+            Documents sorted by _id
+        """
+        if not documents:
+            return
+
+        count = len(documents)
+        self._reserve(self._size + count)
+        rows = slice(self._size, self._size + count)
+
+        batch = pd.DataFrame(documents, columns=['_id', 'timestamp'] + CATEGORY_COLUMNS)
+        timestamps = pd.to_datetime(batch['timestamp'], errors='coerce')
+        self._timestamps[rows] = timestamps.to_numpy(dtype='datetime64[ns]')
+
+        for column in CATEGORY_COLUMNS:
+            codes, uniques = pd.factorize(batch[column])
+            # Translate batch-local codes into the snapshot's global codes
+            code_of = self._code_of[column]
+            categories = self._categories[column]
+            global_codes = np.empty(len(uniques) + 1, dtype=np.int32)
+            for local_code, value in enumerate(uniques):
+                if value not in code_of:
+                    code_of[value] = len(categories)
+                    categories.append(value)
+                global_codes[local_code] = code_of[value]
+            global_codes[-1] = -1  # factorize marks missing values with -1
+            self._codes[column][rows] = global_codes[codes]
+
+        self._size += count
+        self._frame = None
+
+        self.last_id = documents[-1]["_id"]
+        newest = timestamps.max()
+        if pd.notna(newest) and (self.last_timestamp is None or newest > self.last_timestamp):
+            self.last_timestamp = newest
+
+        # Remember the ids that the next overlap window will return again
+        for doc in documents:
+            self._recent_ids[doc["_id"]] = doc["_id"].generation_time
+        horizon = self.last_id.generation_time - self.id_overlap
+        self._recent_ids = {_id: t for _id, t in self._recent_ids.items() if t >= horizon}
+
+    def _reserve(self, needed):
+        """Grow the column arrays geometrically so appends stay amortized O(new rows)."""
+        if needed <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+
+        timestamps = np.empty(capacity, dtype='datetime64[ns]')
+        timestamps[:self._size] = self._timestamps[:self._size]
+        self._timestamps = timestamps
+        for column in CATEGORY_COLUMNS:
+            codes = np.empty(capacity, dtype=np.int32)
+            codes[:self._size] = self._codes[column][:self._size]
+            self._codes[column] = codes
+        self._capacity = capacity
+
+    def frame(self):
+        """
+        Get the snapshot as a DataFrame
+
+        Returns:
+        --------
+        pd.DataFrame
+            nama_sopir, timestamp, armada, rute and status_alert; string columns
+            are categoricals. attrs["source_key"] holds the snapshot version.
+            The frame is shared, so callers must not modify it in place.
+        """
+        with self._lock:
+            if self._frame is None:
+                n = self._size
+                data = {'timestamp': self._timestamps[:n]}
+                for column in CATEGORY_COLUMNS:
+                    data[column] = pd.Categorical.from_codes(
+                        self._codes[column][:n], categories=pd.Index(self._categories[column], dtype=object)
+                    )
+                frame = pd.DataFrame(data)[['nama_sopir', 'timestamp', 'armada', 'rute', 'status_alert']]
+                frame.attrs["source_key"] = self.version
+                self._frame = frame
+            return self._frame
@@ -0,0 +1,77 @@
+import sys
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+# components/ diimpor sebagai paket dari folder streamlit_dashboard
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from components.generate_data import generate_data
+from components.queries import EVENT_GAP, _filter_frame, count_events, segment_events
+
+
+def loop_event_counts(alerts, keys):
+    """Count events per group the way the pages did before segment_events: one loop per group."""
+    rows = []
+    for values, group in alerts.groupby(keys):
+        group = group.sort_values('timestamp')
+        time_diff = group['timestamp'].diff().fillna(pd.Timedelta(minutes=16))
+        event_group = (time_diff > pd.Timedelta(minutes=15)).cumsum()
+        values = values if isinstance(values, tuple) else (values,)
+        rows.append(dict(zip(keys, values), events=event_group.nunique(), alerts=len(group)))
+    return pd.DataFrame(rows, columns=list(keys) + ['events', 'alerts'])
+
+
+class SegmentEventsTest(unittest.TestCase):
+    """segment_events/count_events must reproduce the per-group loop they replaced."""
+
+    def assert_matches_loop(self, alerts, keys):
+        counts = count_events(alerts, keys)[list(keys) + ['events', 'alerts']]
+        expected = loop_event_counts(alerts, keys).sort_values(keys, ignore_index=True)
+        pd.testing.assert_frame_equal(counts.reset_index(drop=True), expected, check_dtype=False)
+
+    def test_dummy_data_matches_the_loop(self):
+        alerts = _filter_frame(generate_data(300), status="ON")
+        for keys in (['nama_sopir'], ['nama_sopir', 'shift']):
+            with self.subTest(keys=keys):
+                self.assert_matches_loop(alerts, keys)
+
+    def test_group_boundaries_gaps_and_single_alerts(self):
+        start = pd.Timestamp("2025-01-01 08:00")
+        minutes = {
+            # A gap of exactly EVENT_GAP stays in the event, one minute more starts a new one
+            'Budi': [0, 15, 30, 46, 47],
+            # A single alert is one event
+            'Siti': [5],
+            # Interleaved with Budi in time; a close alert of another driver never joins his event
+            'Andi': [1, 16, 100],
+        }
+        alerts = pd.DataFrame(
+            [{'nama_sopir': name, 'timestamp': start + pd.Timedelta(minutes=m)}
+             for name, offsets in minutes.items() for m in offsets]
+        ).sample(frac=1, random_state=0)
+
+        self.assert_matches_loop(alerts, ['nama_sopir'])
+        counts = count_events(alerts, ['nama_sopir']).set_index('nama_sopir')
+        self.assertEqual(counts['events'].to_dict(), {'Andi': 2, 'Budi': 2, 'Siti': 1})
+        self.assertEqual(counts['alerts'].to_dict(), {'Andi': 3, 'Budi': 5, 'Siti': 1})
+
+        segmented = segment_events(alerts, ['nama_sopir'])
+        # Event ids are unique across groups and increase in (key, timestamp) order
+        self.assertEqual(segmented['event_id'].tolist(), [1, 1, 2, 3, 3, 3, 4, 4, 5])
+        self.assertTrue((segmented.groupby('event_id')['nama_sopir'].nunique() == 1).all())
+
+    def test_gap_argument(self):
+        start = pd.Timestamp("2025-01-01 08:00")
+        alerts = pd.DataFrame({'nama_sopir': ['Budi'] * 3,
+                               'timestamp': [start, start + EVENT_GAP, start + 2 * EVENT_GAP]})
+        self.assertEqual(count_events(alerts, ['nama_sopir'])['events'].tolist(), [1])
+        self.assertEqual(count_events(alerts, ['nama_sopir'], gap=EVENT_GAP / 2)['events'].tolist(), [3])
+
+    def test_no_alerts(self):
+        alerts = pd.DataFrame({'nama_sopir': pd.Series(dtype=object), 'timestamp': pd.Series(dtype='datetime64[ns]')})
+        self.assertTrue(count_events(alerts, ['nama_sopir']).empty)
+
+
+if __name__ == "__main__":
+    unittest.main()
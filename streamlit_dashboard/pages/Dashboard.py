@@ -2,7 +2,8 @@ import streamlit as st
 import pandas as pd
 import os
 from PIL import Image
-from components.mongo_utils import fetch_data_from_mongo
+from components.mongo_utils import get_data_source, render_cache_controls
+from components.queries import query_filter_options, query_dashboard_summary
 import datetime
 
 st.set_page_config(
@@ -147,6 +148,8 @@ if not st.session_state.get("logged_in"):
     st.warning("Anda harus login untuk mengakses halaman ini.")
     st.stop()
 
+render_cache_controls()
+
 st.markdown("<div class='header-space'></div>", unsafe_allow_html=True)
 logo_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'assets', 'bangun.png')
 logo_img = Image.open(logo_path) if os.path.exists(logo_path) else None
@@ -158,42 +161,13 @@ with col1:
 with col2:
     st.title("Dashboard SIGAP")
 
-data = fetch_data_from_mongo()
+source = get_data_source()
 
 try:
-    if 'date' not in data.columns and 'timestamp' in data.columns:
-        data['date'] = pd.to_datetime(data['timestamp']).dt.date
-    elif 'date' not in data.columns:
-        data['date'] = pd.to_datetime(datetime.datetime.now().date())
-    
-    if 'hour' not in data.columns and 'timestamp' in data.columns:
-        data['hour'] = pd.to_datetime(data['timestamp']).dt.hour
-    elif 'hour' not in data.columns:
-        data['hour'] = datetime.datetime.now().hour
-    
-    def tentukan_shift(jam):
-        if 6 <= jam < 14:
-            return "Shift Pagi"
-        elif 14 <= jam < 22:
-            return "Shift Siang"
-        else:
-            return "Shift Malam"
-    
-    if 'shift' not in data.columns:
-        data['shift'] = data['hour'].apply(tentukan_shift)
-    
-    data['date'] = pd.to_datetime(data['date'])
-    
+    options = query_filter_options(source)
 except Exception as e:
     st.error(f"Error processing data: {e}")
-    st.info("Attempting to recover with default values...")
-    
-    if 'date' not in data.columns:
-        data['date'] = pd.to_datetime(datetime.datetime.now().date())
-    if 'hour' not in data.columns:
-        data['hour'] = datetime.datetime.now().hour
-    if 'shift' not in data.columns:
-        data['shift'] = 'Shift Pagi'
+    options = {"min_date": None, "max_date": None, "drivers": []}
 
 st.markdown("<div class='section-container'>", unsafe_allow_html=True)
 st.markdown("<h3 class='section-title'>🔍 Filter Data</h3>", unsafe_allow_html=True)
@@ -204,14 +178,10 @@ with st.container():
     filter_col1, filter_col2 = st.columns([2, 1])
     
     with filter_col1:
-        try:
-            min_date = data['date'].min()
-            max_date = data['date'].max()
-        except:
-            min_date = datetime.datetime.now().date() - datetime.timedelta(days=30)
-            max_date = datetime.datetime.now().date()
+        min_date = options["min_date"] or datetime.datetime.now().date() - datetime.timedelta(days=30)
+        max_date = options["max_date"] or datetime.datetime.now().date()
         
-        today = pd.Timestamp(datetime.datetime.now().date())
+        today = datetime.datetime.now().date()
         default_date = today if min_date <= today <= max_date else max_date
         
         date_input = st.date_input(
@@ -227,41 +197,24 @@ with st.container():
             start_date = end_date = date_input
     
     with filter_col2:
-        try:
-            all_drivers = sorted(data['nama_sopir'].unique())
-        except:
-            all_drivers = []
+        all_drivers = options["drivers"]
             
         selected_driver = st.multiselect("Filter Pengemudi (Opsional)", options=all_drivers, default=[])
     
     st.markdown("</div>", unsafe_allow_html=True)
 st.markdown("</div>", unsafe_allow_html=True)
 
-try:
-    filtered_data = data[
-        (data['date'] >= pd.to_datetime(start_date)) &
-        (data['date'] <= pd.to_datetime(end_date))
-    ]
-
-    if selected_driver:
-        filtered_data = filtered_data[filtered_data['nama_sopir'].isin(selected_driver)]
-except Exception as e:
-    st.error(f"Error filtering data: {e}")
-    filtered_data = data 
-
 st.markdown("<div class='section-container'>", unsafe_allow_html=True)
 st.markdown("<h3 class='section-title'>📊 Ringkasan Operasional</h3>", unsafe_allow_html=True)
 
 try:
-    sopir_microsleep = filtered_data[filtered_data['status_alert'] == 'ON']['nama_sopir'].nunique() if 'status_alert' in filtered_data.columns else 0
-    total_microsleep = filtered_data[filtered_data['status_alert'] == 'ON'].shape[0] if 'status_alert' in filtered_data.columns else 0
-    total_armada = filtered_data['armada'].nunique() if 'armada' in filtered_data.columns else 0
-    total_sopir = filtered_data['nama_sopir'].nunique() if 'nama_sopir' in filtered_data.columns else 0
-    
-    if 'shift' in filtered_data.columns and 'nama_sopir' in filtered_data.columns:
-        sopir_shift = filtered_data.groupby('shift')['nama_sopir'].nunique()
-    else:
-        sopir_shift = pd.Series([0, 0, 0], index=['Shift Pagi', 'Shift Siang', 'Shift Malam'])
+    summary = query_dashboard_summary(source, start_date, end_date, selected_driver)
+    sopir_microsleep = summary["sopir_microsleep"]
+    total_microsleep = summary["total_microsleep"]
+    total_armada = summary["total_armada"]
+    total_sopir = summary["total_sopir"]
+    sopir_shift = summary["sopir_shift"]
+    driver_microsleep = summary["alerts_per_driver"]
     
 except Exception as e:
     st.error(f"Error calculating metrics: {e}")
@@ -270,6 +223,7 @@ except Exception as e:
     total_armada = 0
     total_sopir = 0
     sopir_shift = pd.Series([0, 0, 0], index=['Shift Pagi', 'Shift Siang', 'Shift Malam'])
+    driver_microsleep = pd.DataFrame(columns=['nama_sopir', 'jumlah'])
 
 metrics = [
     {"title": "Total Microsleep", "icon": "🛑", "value": total_microsleep, "color": "#ff77cd"},
@@ -322,14 +276,8 @@ st.markdown("<div class='divider'></div>", unsafe_allow_html=True)
 
 st.markdown("<div class='section-container'>", unsafe_allow_html=True)
 try:
-    if 'status_alert' in filtered_data.columns:
-        microsleep_data = filtered_data[filtered_data['status_alert'] == 'ON']
-    else:
-        microsleep_data = pd.DataFrame()  
-    
-    if not microsleep_data.empty and 'nama_sopir' in microsleep_data.columns:
-        driver_microsleep = microsleep_data.groupby('nama_sopir').size().reset_index(name='jumlah')
-        driver_microsleep = driver_microsleep.sort_values('jumlah', ascending=False).head(5)
+    if not driver_microsleep.empty:
+        driver_microsleep = driver_microsleep.head(5)
         
         st.markdown("<h3 class='section-title'>⚠️ Pengemudi Dengan Risiko Tertinggi</h3>", unsafe_allow_html=True)
         
@@ -4,7 +4,8 @@ import plotly.express as px
 import plotly.graph_objects as go
 import os
 from PIL import Image
-from components.mongo_utils import fetch_data_from_mongo
+from components.mongo_utils import get_data_source, render_cache_controls
+from components.queries import query_hour_weekday_counts, query_daily_counts
 
 st.set_page_config(page_title="Analitik Kelelahan dan Shift", layout="wide")
 
@@ -129,6 +130,8 @@ if not st.session_state.get("logged_in"):
     st.warning("Anda harus login untuk mengakses halaman ini.")
     st.stop()
 
+render_cache_controls()
+
 st.markdown("<div class='header-space'></div>", unsafe_allow_html=True)
 logo_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'assets', 'bangun.png')
 
@@ -139,33 +142,15 @@ with col1:
 with col2:
     st.title("Analitik Kelelahan dan Shift")
 
-df = fetch_data_from_mongo()
+source = get_data_source()
 
 try:
-    df['weekday'] = df['timestamp'].dt.day_name()
-    hari_mapping = {
-        'Monday': 'Senin',
-        'Tuesday': 'Selasa',
-        'Wednesday': 'Rabu',
-        'Thursday': 'Kamis',
-        'Friday': 'Jumat',
-        'Saturday': 'Sabtu',
-        'Sunday': 'Minggu'
-    }
-    df['hari'] = df['weekday'].map(hari_mapping)
-    df['hour'] = df['timestamp'].dt.hour
-
     st.markdown("<h3 class='section-title'>🕒 Distribusi Microsleep Harian</h3>", unsafe_allow_html=True)
     
     st.markdown("<div class='section-container'>", unsafe_allow_html=True)
     
-    heatmap_data = df.groupby(['hour', 'hari']).size().unstack(fill_value=0)
-    
-    ordered_days = ['Senin', 'Selasa', 'Rabu', 'Kamis', 'Jumat', 'Sabtu', 'Minggu']
-    for hari in ordered_days:
-        if hari not in heatmap_data.columns:
-            heatmap_data[hari] = 0
-    heatmap_data = heatmap_data[ordered_days]
+    heatmap_data = query_hour_weekday_counts(source)
+    hourly_counts = heatmap_data.sum(axis=1)
     
     max_val_idx = heatmap_data.stack().idxmax()
     jam_rawan = f"{max_val_idx[0]:02d}.00"
@@ -208,12 +193,12 @@ try:
             <h2 style='color: #b3127a; font-size: 2.5rem;'>{}</h2>
             <p>Jumlah microsleep terdeteksi</p>
         </div>
-        """.format(len(df)), unsafe_allow_html=True)
+        """.format(int(hourly_counts.sum())), unsafe_allow_html=True)
     
     with col2:
-        morning_count = df[(df['hour'] >= 6) & (df['hour'] < 14)].shape[0]
-        afternoon_count = df[(df['hour'] >= 14) & (df['hour'] < 22)].shape[0]
-        night_count = df[(df['hour'] < 6) | (df['hour'] >= 22)].shape[0]
+        morning_count = hourly_counts[(hourly_counts.index >= 6) & (hourly_counts.index < 14)].sum()
+        afternoon_count = hourly_counts[(hourly_counts.index >= 14) & (hourly_counts.index < 22)].sum()
+        night_count = hourly_counts[(hourly_counts.index < 6) | (hourly_counts.index >= 22)].sum()
         
         highest_count = max(morning_count, afternoon_count, night_count)
         highest_shift = "Pagi" if highest_count == morning_count else "Siang" if highest_count == afternoon_count else "Malam"
@@ -242,9 +227,7 @@ try:
     
     st.markdown("<div class='section-container'>", unsafe_allow_html=True)
     
-    df['date'] = df['timestamp'].dt.date
-    trend = df.groupby('date').size().reset_index(name='jumlah')
-    trend = trend.sort_values('date')
+    trend = query_daily_counts(source)
     
     if trend['jumlah'].iloc[-1] > trend['jumlah'].iloc[0]:
         arah_tren = "MENINGKAT 🔺"
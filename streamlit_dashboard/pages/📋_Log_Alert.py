@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
-from components.mongo_utils import fetch_data_from_mongo
-import datetime
+from components.mongo_utils import get_data_source, render_cache_controls
+from components.queries import query_filter_options, query_alert_events
 import os
 from PIL import Image
 
@@ -115,6 +115,8 @@ if not st.session_state.get("logged_in"):
     st.warning("Anda harus login untuk mengakses halaman ini.")
     st.stop()
 
+render_cache_controls()
+
 st.markdown("<div class='header-space'></div>", unsafe_allow_html=True)
 logo_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'assets', 'bangun.png')
 
@@ -125,22 +127,8 @@ with col1:
 with col2:
     st.title("Log Alert dan Riwayat Microsleep")
 
-df = fetch_data_from_mongo()
-
-df['date'] = df['timestamp'].dt.date
-df['hour'] = df['timestamp'].dt.hour
-
-def tentukan_shift(jam):
-    if 6 <= jam < 14:
-        return "Shift Pagi"
-    elif 14 <= jam < 22:
-        return "Shift Siang"
-    else:
-        return "Shift Malam"
-
-df['shift'] = df['hour'].apply(tentukan_shift)
-
-df = df[df['status_alert'] == "ON"]
+source = get_data_source()
+options = query_filter_options(source, status="ON")
 
 st.markdown("<h3 class='section-title'>🔍 Filter Riwayat Microsleep</h3>", unsafe_allow_html=True)
 
@@ -148,27 +136,15 @@ st.markdown("<div class='filter-container'>", unsafe_allow_html=True)
 col1, col2 = st.columns(2)
 
 with col1:
-    selected_sopir = st.multiselect("Nama Sopir", options=sorted(df['nama_sopir'].unique()))
-    selected_armada = st.multiselect("Armada", options=sorted(df['armada'].unique()))
+    selected_sopir = st.multiselect("Nama Sopir", options=options['drivers'])
+    selected_armada = st.multiselect("Armada", options=options['armadas'])
     selected_shift = st.multiselect("Shift", options=["Shift Pagi", "Shift Siang", "Shift Malam"])
 
 with col2:
-    selected_rute = st.multiselect("Rute", options=sorted(df['rute'].unique()))
+    selected_rute = st.multiselect("Rute", options=options['routes'])
 
-    df = df.dropna(subset=['date'])
-
-    min_date = df['date'].min()
-    max_date = df['date'].max()
-
-    if isinstance(min_date, pd.Timestamp):
-        min_date = min_date.date()
-    elif not isinstance(min_date, pd.Timestamp) and not isinstance(min_date, datetime.date):
-        min_date = None
-
-    if isinstance(max_date, pd.Timestamp):
-        max_date = max_date.date()
-    elif not isinstance(max_date, pd.Timestamp) and not isinstance(max_date, datetime.date):
-        max_date = None
+    min_date = options['min_date']
+    max_date = options['max_date']
 
     today = pd.to_datetime("today").date()
 
@@ -188,29 +164,6 @@ with col2:
         st.info("Klik dua kali tanggal jika hanya ingin memilih satu hari, atau pilih dua tanggal untuk rentang waktu.")
 st.markdown("</div>", unsafe_allow_html=True)
 
-def calculate_alert_frequency(group):
-    group = group.sort_values('timestamp')
-    group['time_diff'] = group['timestamp'].diff().fillna(pd.Timedelta(minutes=16))
-    group['new_event'] = group['time_diff'] > pd.Timedelta(minutes=15)
-    group['event_group'] = group['new_event'].cumsum()
-    return pd.DataFrame({
-        'nama_sopir': [group['nama_sopir'].iloc[0]],
-        'armada': [group['armada'].iloc[0]],
-        'rute': [group['rute'].iloc[0]],
-        'shift': [group['shift'].iloc[0]],
-        'frekuensi_microsleep': [group['event_group'].nunique()],
-        'jumlah_alert': [len(group)]
-    })
-
-if selected_sopir:
-    df = df[df['nama_sopir'].isin(selected_sopir)]
-if selected_armada:
-    df = df[df['armada'].isin(selected_armada)]
-if selected_shift:
-    df = df[df['shift'].isin(selected_shift)]
-if selected_rute:
-    df = df[df['rute'].isin(selected_rute)]
-
 if isinstance(date_input, tuple):
     start_date, end_date = date_input
 else:
@@ -219,15 +172,15 @@ else:
 start_date = pd.to_datetime(start_date)
 end_date = pd.to_datetime(end_date)
 
-df = df[
-    (df['date'] >= start_date.date()) &
-    (df['date'] <= end_date.date())
-]
-
-result_df = pd.DataFrame()
-for name, group in df.groupby(['nama_sopir', 'shift']):
-    result = calculate_alert_frequency(group)
-    result_df = pd.concat([result_df, result], ignore_index=True)
+result_df = query_alert_events(
+    source,
+    start_date=start_date.date(),
+    end_date=end_date.date(),
+    drivers=selected_sopir,
+    armadas=selected_armada,
+    routes=selected_rute,
+    shifts=selected_shift
+)
 
 st.markdown("<div class='spacer'></div>", unsafe_allow_html=True)
 
@@ -1,7 +1,8 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from components.mongo_utils import fetch_data_from_mongo
+from components.mongo_utils import get_data_source, render_cache_controls
+from components.queries import query_filter_options, query_driver_shift_profile
 import datetime
 import os
 from PIL import Image
@@ -160,6 +161,8 @@ if not st.session_state.get("logged_in"):
     st.warning("Anda harus login untuk mengakses halaman ini.")
     st.stop()
 
+render_cache_controls()
+
 st.markdown("<div class='header-space'></div>", unsafe_allow_html=True)
 logo_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'assets', 'bangun.png')
 
@@ -170,31 +173,11 @@ with col1:
 with col2:
     st.title("Rekomendasi Shift Otomatis")
 
-df = fetch_data_from_mongo()
-
-df['date'] = pd.to_datetime(df['timestamp']).dt.date
-df['hour'] = df['timestamp'].dt.hour
-
-def tentukan_shift(jam):
-    if 6 <= jam < 14:
-        return "Shift Pagi"
-    elif 14 <= jam < 22:
-        return "Shift Siang"
-    else:
-        return "Shift Malam"
-
-df['shift'] = df['hour'].apply(tentukan_shift)
-
-def calculate_alert_frequency(group):
-    group = group.sort_values('timestamp')
-    group['time_diff'] = group['timestamp'].diff().fillna(pd.Timedelta(minutes=16))
-    group['new_event'] = group['time_diff'] > pd.Timedelta(minutes=15)
-    group['event_group'] = group['new_event'].cumsum()
-    return group['event_group'].nunique()
+source = get_data_source()
+options = query_filter_options(source)
+alert_options = query_filter_options(source, status="ON")
 
-alert_df = df[df['status_alert'] == "ON"].copy()
-
-if alert_df.empty:
+if not alert_options['drivers']:
     st.error("Tidak ada data alert yang tersedia untuk analisis. Pastikan database memiliki data yang valid.")
     st.stop()
 
@@ -209,13 +192,8 @@ with col1:
                                   help="0 = Prioritaskan keamanan, 1 = Prioritaskan keseimbangan jumlah")
 
 with col2:
-    min_date = df['date'].min()
-    max_date = df['date'].max()
-    
-    if isinstance(min_date, pd.Timestamp):
-        min_date = min_date.date()
-    if isinstance(max_date, pd.Timestamp):
-        max_date = max_date.date()
+    min_date = options['min_date']
+    max_date = options['max_date']
     
     today = pd.to_datetime("today").date()
     default_date = today if min_date <= today <= max_date else max_date
@@ -237,50 +215,7 @@ with col2:
 
 st.markdown("</div>", unsafe_allow_html=True)
 
-filtered_alert_df = alert_df[
-    (alert_df['date'] >= start_date) &
-    (alert_df['date'] <= end_date)
-]
-
-driver_stats = []
-
-for driver, group in filtered_alert_df.groupby('nama_sopir'):
-    microsleep_count = calculate_alert_frequency(group)
-    total_alerts = len(group)
-    
-    shift_counts = group['shift'].value_counts()
-    morning_shift = shift_counts.get('Shift Pagi', 0)
-    afternoon_shift = shift_counts.get('Shift Siang', 0)
-    night_shift = shift_counts.get('Shift Malam', 0)
-    
-    morning_alerts = len(group[group['shift'] == 'Shift Pagi'])
-    afternoon_alerts = len(group[group['shift'] == 'Shift Siang'])
-    night_alerts = len(group[group['shift'] == 'Shift Malam'])
-    
-    hours = group['hour'].values
-    early_morning_alert = sum((hours >= 0) & (hours < 6))
-    morning_alert = sum((hours >= 6) & (hours < 12))
-    afternoon_alert = sum((hours >= 12) & (hours < 18))
-    evening_alert = sum((hours >= 18) & (hours < 24))
-    
-    driver_stats.append({
-        'nama_sopir': driver,
-        'microsleep_events': microsleep_count,
-        'total_alerts': total_alerts,
-        'morning_shift': morning_shift,
-        'afternoon_shift': afternoon_shift,
-        'night_shift': night_shift,
-        'morning_alerts': morning_alerts,
-        'afternoon_alerts': afternoon_alerts,
-        'night_alerts': night_alerts,
-        'early_morning_alert': early_morning_alert,
-        'morning_alert': morning_alert,
-        'afternoon_alert': afternoon_alert,
-        'evening_alert': evening_alert,
-        'current_primary_shift': shift_counts.idxmax() if not shift_counts.empty else 'Tidak ada data'
-    })
-
-drivers_df = pd.DataFrame(driver_stats)
+drivers_df = query_driver_shift_profile(source, start_date, end_date)
 
 if drivers_df.empty:
     st.error("Tidak ada data yang cukup untuk analisis dalam rentang waktu yang dipilih.")
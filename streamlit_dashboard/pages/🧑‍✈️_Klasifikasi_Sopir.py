@@ -1,7 +1,8 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from components.mongo_utils import fetch_data_from_mongo
+from components.mongo_utils import get_data_source, render_cache_controls
+from components.queries import query_filter_options, query_primary_shift, query_alert_events
 import datetime
 import os
 from PIL import Image
@@ -141,6 +142,8 @@ if not st.session_state.get("logged_in"):
     st.warning("Anda harus login untuk mengakses halaman ini.")
     st.stop()
 
+render_cache_controls()
+
 st.markdown("<div class='header-space'></div>", unsafe_allow_html=True)
 logo_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'assets', 'bangun.png')
 
@@ -151,15 +154,14 @@ with col1:
 with col2:
     st.title("Klasifikasi dan Evaluasi Sopir")
 
-df = fetch_data_from_mongo()
+source = get_data_source()
+options = query_filter_options(source)
 
 st.markdown("<h3 class='section-title'>🔍 Filter Data</h3>", unsafe_allow_html=True)
 
 st.markdown("<div class='filter-container'>", unsafe_allow_html=True)
-df['date'] = pd.to_datetime(df['timestamp']).dt.date
-
-min_date = df['date'].min() 
-max_date = df['date'].max() 
+min_date = options['min_date'] 
+max_date = options['max_date'] 
 
 today = pd.to_datetime("today").date()
 
@@ -186,61 +188,18 @@ if not lihat_semua:
     start_date = start_date if isinstance(start_date, datetime.date) else start_date.date()
     end_date = end_date if isinstance(end_date, datetime.date) else end_date.date()
 
-    filtered_df = df[(df['date'] >= start_date) & (df['date'] <= end_date)]
-
     st.caption(f"Menampilkan data dari {start_date.strftime('%d %b %Y')} hingga {end_date.strftime('%d %b %Y')}")
 else:
-    filtered_df = df.copy()
+    start_date = end_date = None
     st.caption("Menampilkan data untuk semua tanggal.")
 st.markdown("</div>", unsafe_allow_html=True)
 
-def tentukan_shift(jam):
-    if 6 <= jam < 14:
-        return "Shift Pagi"
-    elif 14 <= jam < 22:
-        return "Shift Siang"
-    else:
-        return "Shift Malam"
-
-filtered_df['shift'] = filtered_df['timestamp'].dt.hour.apply(tentukan_shift)
-
-shift_terbanyak = (
-    filtered_df.groupby(['nama_sopir', 'shift'])
-    .size()
-    .reset_index(name='jumlah_shift')
-    .sort_values(['nama_sopir', 'jumlah_shift'], ascending=[True, False])
-    .drop_duplicates(subset='nama_sopir')
-    .rename(columns={'shift': 'shift_terbanyak'})
-)[['nama_sopir', 'shift_terbanyak']]
-
-filtered_df = filtered_df[filtered_df['status_alert'] == "ON"]
-
-def calculate_event_frequency_for_driver(driver_data):
-    if driver_data.empty:
-        return 0
-    
-    driver_data = driver_data.sort_values('timestamp')
-    
-    driver_data['time_diff'] = driver_data['timestamp'].diff().fillna(pd.Timedelta(minutes=16))
-    
-    driver_data['new_event'] = driver_data['time_diff'] > pd.Timedelta(minutes=15)
-    
-    event_count = driver_data['new_event'].sum() + 1 
-    
-    return event_count
-
-nama_sopir_list = filtered_df['nama_sopir'].unique()
-hasil_klasifikasi = []
-
-for nama in nama_sopir_list:
-    driver_data = filtered_df[filtered_df['nama_sopir'] == nama]
-    jumlah_event = calculate_event_frequency_for_driver(driver_data)
-    hasil_klasifikasi.append({
-        'nama_sopir': nama,
-        'jumlah': jumlah_event
-    })
+shift_terbanyak = query_primary_shift(source, start_date, end_date)
 
-classification = pd.DataFrame(hasil_klasifikasi)
+classification = query_alert_events(source, start_date, end_date, by_shift=False)
+classification = classification.rename(columns={'frekuensi_microsleep': 'jumlah'})[['nama_sopir', 'jumlah']]
+# The classification has always counted one more than the driver's events
+classification['jumlah'] += 1
 
 rata2 = classification['jumlah'].mean() if not classification.empty else 0
 